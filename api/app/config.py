@@ -10,6 +10,13 @@ DB_NAME = os.getenv("MONGODB_DB_NAME", "evra")
 VECTOR_STORE_DB_URI = os.getenv("VECTOR_STORE_DB_URI", "test_vector_store_uri")
 VECTOR_COLLECTION_NAME=os.getenv("VECTOR_COLLECTION_NAME", "test_vector_collection")
 VECTOR_DB_NAME=os.getenv("VECTOR_DB_NAME", "test_vector_db")
+DOCUMENT_REGISTRY_COLLECTION_NAME = os.getenv("DOCUMENT_REGISTRY_COLLECTION_NAME", "document_registry")
+DOCUMENT_CATALOG_COLLECTION_NAME = os.getenv("DOCUMENT_CATALOG_COLLECTION_NAME", "document_catalog")
+# "atlas" uses the Atlas vector_index; "local" searches in process (dev, benchmarks, no Atlas)
+VECTOR_SEARCH_BACKEND = os.getenv("VECTOR_SEARCH_BACKEND", "atlas")
+LOCAL_SEARCH_MAX_USERS = int(os.getenv("LOCAL_SEARCH_MAX_USERS", "32"))
+TENANT_CATALOG_COLLECTION_NAME = os.getenv("TENANT_CATALOG_COLLECTION_NAME", "tenant_catalog")
+TENANT_CATALOG_TTL_SECONDS = float(os.getenv("TENANT_CATALOG_TTL_SECONDS", "60"))
 SECRET_KEY = os.getenv("SECRET_KEY", "secret")
 NUDGE_SCHEDULED_COLLECTION = os.getenv("NUDGE_SCHEDULED_COLLECTION", "nudge_scheduled_jobs")
 
@@ -29,6 +36,16 @@ NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "1234qazw0987")
 # Vector Store Configuration
 VECTOR_INDEX_PATH = os.getenv("VECTOR_INDEX_PATH", "faiss_index.bin")
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+# Large documents are embedded in batches, several at once, each stored as soon as it is ready
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+EMBEDDING_REQUESTS_PER_SECOND = float(os.getenv("EMBEDDING_REQUESTS_PER_SECOND", "8"))
+EMBEDDING_BATCH_ATTEMPTS = int(os.getenv("EMBEDDING_BATCH_ATTEMPTS", "3"))
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024"))
+QUERY_EMBEDDING_CACHE_TTL_SECONDS = float(os.getenv("QUERY_EMBEDDING_CACHE_TTL_SECONDS", "86400"))
+# Share cached query embeddings across processes through a Mongo collection
+QUERY_EMBEDDING_CACHE_PERSIST = os.getenv("QUERY_EMBEDDING_CACHE_PERSIST", "false").lower() == "true"
+QUERY_EMBEDDING_CACHE_COLLECTION_NAME = os.getenv("QUERY_EMBEDDING_CACHE_COLLECTION_NAME", "query_embedding_cache")
 
 # LLM Configuration
 OPENAI_API_KEY = os.getenv("OPENAI_KEY", "test-openai-key")  # Load from OPENAI_KEY in .env
@@ -107,11 +107,15 @@ async def stream_upload_progress(upload_id: str):
     )
 
 @upload_router.get("/files")
-async def list_uploaded_files(email: EmailStr = Query(..., description="User email to filter files")):
-    """List all unique uploaded files from the vector store for a specific user."""
+async def list_uploaded_files(
+    email: EmailStr = Query(..., description="User email to filter files"),
+    skip: int = Query(0, ge=0, description="Number of files to skip"),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of files to return")
+):
+    """List a user's uploaded files, newest first."""
     document_manager = get_document_manager()
     # Offload the synchronous database call
-    documents = await asyncio.to_thread(document_manager.get_all_documents_by_user_email, email)
+    documents = await asyncio.to_thread(document_manager.get_all_documents_by_user_email, email, skip, limit)
     return {
         "success": True,
         "files": documents,
@@ -0,0 +1,163 @@
+from langchain_openai import OpenAIEmbeddings
+from motor.motor_asyncio import AsyncIOMotorClient
+import logging
+from typing import Dict, List, Optional
+
+from ...config import VECTOR_STORE_DB_URI, VECTOR_DB_NAME, VECTOR_COLLECTION_NAME, DOCUMENT_REGISTRY_COLLECTION_NAME, DOCUMENT_CATALOG_COLLECTION_NAME, TENANT_CATALOG_COLLECTION_NAME, OPENAI_API_KEY, EMBEDDING_MODEL, VECTOR_SEARCH_BACKEND
+from app.services.ai_services.embedding_cache import CachedEmbeddings, get_query_embedding_cache
+from app.services.ai_services.local_vector_search import UserShard, local_vector_index
+from app.services.ai_services.tenant_catalog import tenant_catalog, catalog_increment, catalog_rebuild_pipeline, total_chunks
+from app.services.ai_services.mongodb_vectorstore import (
+    VECTOR_INDEX_NAME, search_result
+)
+
+logger = logging.getLogger(__name__)
+
+class AsyncMongoVectorStoreService:
+    """
+    MongoVectorStoreService for async callers: motor for every query and OpenAI's
+    async embedding calls, so embedding and vector search never block the event loop.
+    Reads and deletes over the same collections as the sync service; documents are
+    only added through the sync service, which owns batching, resume and dedup.
+    """
+
+    def __init__(self):
+        self.client = AsyncIOMotorClient(VECTOR_STORE_DB_URI)
+        self.db = self.client[VECTOR_DB_NAME]
+        self.collection = self.db[VECTOR_COLLECTION_NAME]
+        self.registry = self.db[DOCUMENT_REGISTRY_COLLECTION_NAME]
+        self.catalog = self.db[TENANT_CATALOG_COLLECTION_NAME]
+        self.documents = self.db[DOCUMENT_CATALOG_COLLECTION_NAME]
+
+        logger.info(f"Initializing OpenAIEmbeddings with model: {EMBEDDING_MODEL}")
+        self.embedding_fn = CachedEmbeddings(
+            OpenAIEmbeddings(model=EMBEDDING_MODEL, openai_api_key=OPENAI_API_KEY),
+            model=EMBEDDING_MODEL,
+            cache=get_query_embedding_cache()
+        )
+        logger.info("AsyncMongoVectorStoreService initialized successfully with OpenAI embeddings.")
+
+    async def _catalog_counts(self, user_email: str) -> Dict[str, int]:
+        counts = tenant_catalog.get(user_email)
+        if counts is not None:
+            return counts
+        entry = await self.catalog.find_one({"_id": user_email})
+        if entry is not None:
+            counts = entry.get("chunks_by_type", {})
+        else:
+            # Same seed as MongoVectorStoreService._seed_catalog, which adds also run before inserting
+            counts = {doc["_id"]: doc["chunks"] async for doc in self.collection.aggregate(catalog_rebuild_pipeline(user_email))}
+            await self.catalog.update_one({"_id": user_email}, {"$setOnInsert": {"chunks_by_type": counts}}, upsert=True)
+        tenant_catalog.put(user_email, counts)
+        return counts
+
+    async def get_all_documents_by_user_email(self, user_email: str, skip: int = 0, limit: int = 0) -> List[Dict]:
+        try:
+            cursor = self.documents.find({"user_email": user_email}, {"_id": 0}).sort("created_at", -1).skip(skip).limit(limit)
+            return await cursor.to_list(length=None)
+        except Exception as e:
+            logger.error(f"❌ Failed fetching document list for {user_email}: {e}")
+            return []
+
+    async def delete_document_by_upload_id(self, upload_id: str) -> bool:
+        try:
+            owner = await self.collection.find_one({"upload_id": upload_id}, {"user_email": 1, "type": 1})
+            result = await self.collection.delete_many({"upload_id": upload_id})
+            await self.registry.delete_many({"upload_id": upload_id})
+            await self.documents.delete_many({"upload_id": upload_id})
+            if owner and result.deleted_count:
+                await self.catalog.update_one({"_id": owner["user_email"]}, catalog_increment(owner["type"], -result.deleted_count))
+                tenant_catalog.invalidate(owner["user_email"])
+                local_vector_index.invalidate(owner["user_email"])
+            logger.info(f"Deleted {result.deleted_count} chunks for upload_id '{upload_id}'.")
+            return result.deleted_count > 0
+        except Exception as e:
+            logger.error(f"❌ Failed deleting document chunks for upload_id '{upload_id}': {e}")
+            return False
+
+    async def search(self, query: str, user_email: str, top_k: int = 5) -> List[Dict]:
+        logger.info(f"🔍 [VECTOR SEARCH] Starting vector search for query: '{query}' (User: {user_email})")
+
+        if not query or not query.strip():
+            logger.warning("🔍 [VECTOR SEARCH] Query is empty or None, returning empty list")
+            return []
+
+        try:
+            # Check if documents exist for this user
+            counts = await self._catalog_counts(user_email)
+            doc_count = total_chunks(counts)
+            logger.info(f"🔍 [VECTOR SEARCH] Found {doc_count} total documents for user {user_email} in catalog")
+
+            if doc_count == 0:
+                logger.warning(f"⚠️ [VECTOR SEARCH] No documents found for user {user_email}")
+                return []
+
+            # Check lab report count specifically
+            lab_report_count = counts.get("lab_report", 0)
+            logger.info(f"🔍 [VECTOR SEARCH] Found {lab_report_count} lab report chunks for user {user_email}")
+
+            if VECTOR_SEARCH_BACKEND == "local":
+                results = [result for result in await self._local_search(query, user_email, top_k, doc_count) if result["text"].strip()]
+                logger.info(f"✅ [VECTOR SEARCH] Local search complete, returning {len(results)} valid results.")
+                return results
+
+            query_embedding = await self.embedding_fn.aembed_query(query)
+            # The same Atlas query MongoDBAtlasVectorSearch.similarity_search runs, with the user pre-filter
+            pipeline = [
+                {"$vectorSearch": {
+                    "index": VECTOR_INDEX_NAME,
+                    "path": "embedding",
+                    "queryVector": query_embedding,
+                    "numCandidates": top_k * 10,
+                    "limit": top_k,
+                    "filter": {"user_email": {"$eq": user_email}},
+                }},
+                {"$project": {"embedding": 0}},
+            ]
+            docs = await self.collection.aggregate(pipeline).to_list(length=top_k)
+            logger.info(f"🔍 [VECTOR SEARCH] Vector search complete. Retrieved {len(docs)} document(s).")
+
+            results = []
+            for i, doc in enumerate(docs):
+                result = search_result(doc)
+                if not result["text"].strip():
+                    logger.warning(f"⚠️ [VECTOR SEARCH] Skipping document {i} - empty text content")
+                    continue
+                results.append(result)
+                logger.info(f"✅ [VECTOR SEARCH] Doc {i}: type={result.get('type')}, filename={result.get('filename')}, text_len={len(result['text'])}")
+
+            logger.info(f"✅ [VECTOR SEARCH] Completed successfully, returning {len(results)} valid results.")
+            return results
+
+        except Exception as e:
+            logger.error(f"❌ [VECTOR SEARCH] A critical error occurred during the search operation: {e}", exc_info=True)
+            # Fall back to exact search over the user's embeddings if the index isn't working
+            try:
+                logger.info("🔄 [VECTOR SEARCH] Attempting fallback: local exact vector search")
+                results = await self._local_search(query, user_email, top_k)
+                logger.info(f"🔄 [VECTOR SEARCH] Fallback retrieved {len(results)} documents")
+                return results
+            except Exception as fallback_error:
+                logger.error(f"❌ [VECTOR SEARCH] Fallback search also failed: {fallback_error}")
+                return []
+
+    async def _local_search(self, query: str, user_email: str, top_k: int, chunks: Optional[int] = None) -> List[Dict]:
+        query_embedding = await self.embedding_fn.aembed_query(query)
+        shard = local_vector_index.get(user_email, chunks)
+        if shard is None:
+            docs = await self.collection.find({"user_email": user_email}, {"_id": 0}).to_list(length=None)
+            shard = UserShard(docs)
+            local_vector_index.put(user_email, shard)
+            logger.info(f"🔍 [VECTOR SEARCH] Loaded {shard.chunks} embeddings for user {user_email} into the local index")
+        return [search_result(doc) for doc in shard.top_k(query_embedding, top_k)]
+
+    async def get_stats(self):
+        return {"total_nodes": await self.collection.count_documents({}), "query_embedding_cache": self.embedding_fn.cache.stats()}
+
+async_vector_store = None
+
+def get_async_vector_store() -> AsyncMongoVectorStoreService:
+    global async_vector_store
+    if async_vector_store is None:
+        async_vector_store = AsyncMongoVectorStoreService()
+    return async_vector_store
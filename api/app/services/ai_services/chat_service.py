@@ -8,7 +8,7 @@ import logging
 from datetime import datetime, date
 
 from ...config import OPENAI_API_KEY, LLM_MODEL, LLM_TEMPERATURE
-from app.services.ai_services.mongodb_vectorstore import get_vector_store
+from app.services.ai_services.async_mongodb_vectorstore import get_async_vector_store
 from app.utils.ai.prompts import ChatPrompts
 from app.services.backend_services.db import get_db
 
@@ -30,7 +30,7 @@ class ChatService:
             openai_api_key=OPENAI_API_KEY,
             temperature=float(LLM_TEMPERATURE)
         )
-        self.vector_store = get_vector_store()
+        self.vector_store = get_async_vector_store()
         self.db = get_db()
         self.user_collection = self.db["users"]
         self.graph = self._build_graph()
@@ -50,7 +50,7 @@ class ChatService:
         if isinstance(state, dict): state = ChatState(**state)
         logger.info(f"🔍 [CONTEXT RETRIEVAL] Starting context retrieval for query: '{state.query}'")
         try:
-            relevant_docs = self.vector_store.search(
+            relevant_docs = await self.vector_store.search(
                 query=state.query,
                 user_email=state.user_email,
                 top_k=10
@@ -0,0 +1,48 @@
+import hashlib
+import re
+from typing import List, Union
+
+SHINGLE_WORDS = 5
+# Bottom-k sketch size; similarity estimates are within a few percent at this size
+SKETCH_SIZE = 128
+# Hashes are kept below 2**63 so sketches fit BSON's signed 64-bit ints
+HASH_MASK = 2 ** 63 - 1
+# Sketch similarity at or above which two documents count as versions of each other
+NEAR_DUPLICATE_THRESHOLD = 0.5
+
+
+def content_hash(content: Union[str, bytes]) -> str:
+    """sha256 of an uploaded file's exact bytes"""
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    return hashlib.sha256(content).hexdigest()
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase words only, so whitespace, punctuation and case changes don't count as edits"""
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+
+def shingle_sketch(text: str) -> List[int]:
+    """
+    Bottom-k sketch of a text's word shingles: the SKETCH_SIZE smallest 63-bit
+    hashes of its SHINGLE_WORDS-word windows. Two sketches estimate the Jaccard
+    similarity of the full shingle sets without storing them.
+    """
+    words = normalize_text(text).split()
+    windows = max(len(words) - SHINGLE_WORDS + 1, 1)
+    hashes = {
+        int.from_bytes(hashlib.blake2b(" ".join(words[i:i + SHINGLE_WORDS]).encode("utf-8"), digest_size=8).digest(), "big") & HASH_MASK
+        for i in range(windows)
+    } if words else set()
+    return sorted(hashes)[:SKETCH_SIZE]
+
+
+def sketch_similarity(a: List[int], b: List[int]) -> float:
+    """Estimated Jaccard similarity of the texts two shingle sketches were built from"""
+    if not a or not b:
+        return 0.0
+    a, b = set(a), set(b)
+    # The smallest k hashes of the union are a uniform sample of it; count those in both texts
+    sample = sorted(a | b)[:SKETCH_SIZE]
+    return sum(1 for h in sample if h in a and h in b) / len(sample)
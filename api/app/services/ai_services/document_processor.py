@@ -62,6 +62,7 @@ class DocumentProcessor:
         print(f"Processing markdown file: {filename} for user {user_email}")
 
         try:
+            on_batch_committed = None
             if progress_callback:
                 progress_callback(
                     percentage=60,
@@ -70,7 +71,15 @@ class DocumentProcessor:
                 )
                 time.sleep(0.5)
 
-            chunks_count = self.vector_store.add_document(content, user_email, filename, type, upload_id=upload_id)
+                # Embedding and storing chunks spans 60-95%
+                def on_batch_committed(stored: int, total: int):
+                    progress_callback(
+                        percentage=60 + 35 * stored // total,
+                        message=f"Stored {stored} of {total} document chunks...",
+                        status="processing"
+                    )
+
+            chunks_count = self.vector_store.add_document(content, user_email, filename, type, upload_id=upload_id, on_batch_committed=on_batch_committed)
 
             if progress_callback:
                 progress_callback(
@@ -0,0 +1,28 @@
+import threading
+import time
+from typing import Iterator, List, Sequence
+
+from ...config import EMBEDDING_REQUESTS_PER_SECOND
+
+def batches(items: Sequence, size: int) -> Iterator[List]:
+    for start in range(0, len(items), size):
+        yield list(items[start:start + size])
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart, across every thread that shares it"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+# OpenAI rate limits are per API key, so every ingest in the process shares one limiter
+embedding_rate_limiter = RateLimiter(EMBEDDING_REQUESTS_PER_SECOND)
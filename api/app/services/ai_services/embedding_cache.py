@@ -0,0 +1,153 @@
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+from pymongo import MongoClient
+
+from ...config import (
+    VECTOR_STORE_DB_URI, VECTOR_DB_NAME, QUERY_EMBEDDING_CACHE_SIZE, QUERY_EMBEDDING_CACHE_TTL_SECONDS,
+    QUERY_EMBEDDING_CACHE_PERSIST, QUERY_EMBEDDING_CACHE_COLLECTION_NAME
+)
+
+def normalize_query(text: str) -> str:
+    """Whitespace-insensitive form of a query, so retries and re-sends hit the cache"""
+    return " ".join(text.split())
+
+class QueryEmbeddingCache:
+    """
+    LRU of query embeddings keyed by (model, normalized text). Entries expire
+    after the TTL. With a collection, misses fall through to it and new
+    embeddings are written to it, so processes share each other's work.
+    """
+
+    def __init__(self, max_entries: int = QUERY_EMBEDDING_CACHE_SIZE, ttl: float = QUERY_EMBEDDING_CACHE_TTL_SECONDS, collection=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.collection = collection
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\n{normalize_query(text)}".encode("utf-8")).hexdigest()
+
+    def _get_local(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() < entry[1]:
+                self._entries.move_to_end(key)
+                return entry[0]
+            self._entries.pop(key, None)
+            return None
+
+    def _put_local(self, key: str, embedding: List[float]) -> None:
+        with self._lock:
+            self._entries[key] = (embedding, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _load(self, key: str) -> Optional[List[float]]:
+        doc = self.collection.find_one({"_id": key, "expires_at": {"$gt": datetime.now(timezone.utc)}}, {"embedding": 1})
+        return doc["embedding"] if doc else None
+
+    def _store(self, key: str, embedding: List[float]) -> None:
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.ttl)
+        self.collection.update_one({"_id": key}, {"$set": {"embedding": embedding, "expires_at": expires_at}}, upsert=True)
+
+    def get(self, key: str) -> Optional[List[float]]:
+        embedding = self._get_local(key)
+        if embedding is None and self.collection is not None:
+            embedding = self._load(key)
+            if embedding is not None:
+                self._put_local(key, embedding)
+        self._count(embedding is not None)
+        return embedding
+
+    def put(self, key: str, embedding: List[float]) -> None:
+        self._put_local(key, embedding)
+        if self.collection is not None:
+            self._store(key, embedding)
+
+    async def aget(self, key: str) -> Optional[List[float]]:
+        embedding = self._get_local(key)
+        if embedding is None and self.collection is not None:
+            embedding = await asyncio.to_thread(self._load, key)
+            if embedding is not None:
+                self._put_local(key, embedding)
+        self._count(embedding is not None)
+        return embedding
+
+    async def aput(self, key: str, embedding: List[float]) -> None:
+        self._put_local(key, embedding)
+        if self.collection is not None:
+            await asyncio.to_thread(self._store, key, embedding)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "persisted": self.collection is not None,
+            }
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings whose query embeddings go through a QueryEmbeddingCache; document embeddings pass straight through"""
+
+    def __init__(self, embeddings: Embeddings, model: str, cache: QueryEmbeddingCache):
+        self.embeddings = embeddings
+        self.model = model
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self.cache.key(self.model, text)
+        embedding = self.cache.get(key)
+        if embedding is None:
+            embedding = self.embeddings.embed_query(text)
+            self.cache.put(key, embedding)
+        return embedding
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = self.cache.key(self.model, text)
+        embedding = await self.cache.aget(key)
+        if embedding is None:
+            embedding = await self.embeddings.aembed_query(text)
+            await self.cache.aput(key, embedding)
+        return embedding
+
+query_embedding_cache = None
+
+def get_query_embedding_cache() -> QueryEmbeddingCache:
+    """One cache per process, shared by the sync and async vector stores"""
+    global query_embedding_cache
+    if query_embedding_cache is None:
+        collection = None
+        if QUERY_EMBEDDING_CACHE_PERSIST:
+            collection = MongoClient(VECTOR_STORE_DB_URI)[VECTOR_DB_NAME][QUERY_EMBEDDING_CACHE_COLLECTION_NAME]
+            # Mongo removes each entry once its expires_at passes
+            collection.create_index("expires_at", expireAfterSeconds=0)
+        query_embedding_cache = QueryEmbeddingCache(collection=collection)
+    return query_embedding_cache
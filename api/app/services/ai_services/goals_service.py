@@ -10,7 +10,7 @@ from ...schemas.backend.action_completions import (
     ActionItemCompletion, ActionItemCompletionCreate, ActionItemCompletionUpdate,
     DailyCompletionStats, WeeklyCompletionStats
 )
-from app.services.ai_services.mongodb_vectorstore import get_vector_store
+from app.services.ai_services.async_mongodb_vectorstore import get_async_vector_store
 from ..backend_services.db import get_db
 from ..backend_services.nudge_service import NudgeService
 from app.prompts import (
@@ -34,7 +34,7 @@ class GoalsService:
         self.action_items_collection = self.db["action_items"]
         self.reflections_collection = self.db["weekly_reflections"]
         self.encryption_service = get_encryption_service()
-        self.vector_store = get_vector_store()
+        self.vector_store = get_async_vector_store()
         self.nudge_service = get_nudge_service()
 
     async def _invoke_structured_llm(
@@ -338,7 +338,7 @@ class GoalsService:
 
 
             try:
-                search_results = self.vector_store.search(
+                search_results = await self.vector_store.search(
                     query=goal_text, user_email=user_email, top_k=5
                 )
                 context_list = [
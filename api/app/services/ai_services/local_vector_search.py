@@ -0,0 +1,70 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from ...config import LOCAL_SEARCH_MAX_USERS
+
+class UserShard:
+    """One user's chunks with their embeddings as a row-normalized matrix, for exact cosine search"""
+
+    def __init__(self, docs: Iterable[Dict]):
+        records, vectors = [], []
+        # Every stored chunk, so the shard can be checked against the tenant catalog's count
+        self.chunks = 0
+        for doc in docs:
+            self.chunks += 1
+            embedding = doc.pop("embedding", None)
+            if embedding:
+                records.append(doc)
+                vectors.append(embedding)
+        self.records = records
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1) if vectors else np.zeros((0, 0), dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.matrix = matrix / norms
+
+    def top_k(self, query_embedding: List[float], k: int) -> List[Dict]:
+        if not self.records or k <= 0:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        scores = self.matrix @ (query / norm if norm else query)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        return [self.records[i] for i in top[np.argsort(-scores[top])]]
+
+class LocalVectorIndex:
+    """
+    Per-user shards, loaded lazily and evicted least recently used first. A
+    shard whose size no longer matches the user's chunk count is reloaded, so
+    writes from other processes are picked up once the catalog sees them.
+    """
+
+    def __init__(self, max_users: int = LOCAL_SEARCH_MAX_USERS):
+        self.max_users = max_users
+        self._shards: "OrderedDict[str, UserShard]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_email: str, chunks: Optional[int] = None) -> Optional[UserShard]:
+        with self._lock:
+            shard = self._shards.get(user_email)
+            if shard is None or (chunks is not None and shard.chunks != chunks):
+                return None
+            self._shards.move_to_end(user_email)
+            return shard
+
+    def put(self, user_email: str, shard: UserShard) -> None:
+        with self._lock:
+            self._shards[user_email] = shard
+            self._shards.move_to_end(user_email)
+            while len(self._shards) > self.max_users:
+                self._shards.popitem(last=False)
+
+    def invalidate(self, user_email: str) -> None:
+        with self._lock:
+            self._shards.pop(user_email, None)
+
+# Shared by the sync and async vector stores, like the tenant catalog cache
+local_vector_index = LocalVectorIndex()
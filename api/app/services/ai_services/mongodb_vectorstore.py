@@ -4,56 +4,136 @@ from langchain_core.documents import Document
 from pymongo import MongoClient
 import logging
 import json
-from typing import Dict, List
+from typing import Callable, Dict, Iterable, List, Optional
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from uuid import uuid4
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
 
-from ...config import VECTOR_STORE_DB_URI, VECTOR_DB_NAME, VECTOR_COLLECTION_NAME, OPENAI_API_KEY, EMBEDDING_MODEL
+from ...config import (
+    VECTOR_STORE_DB_URI, VECTOR_DB_NAME, VECTOR_COLLECTION_NAME, DOCUMENT_REGISTRY_COLLECTION_NAME, DOCUMENT_CATALOG_COLLECTION_NAME, TENANT_CATALOG_COLLECTION_NAME,
+    OPENAI_API_KEY, EMBEDDING_MODEL, EMBEDDING_BATCH_SIZE, EMBEDDING_CONCURRENCY, EMBEDDING_BATCH_ATTEMPTS, VECTOR_SEARCH_BACKEND
+)
 from app.schemas.backend.documents import DocumentType
+from app.services.ai_services.document_fingerprint import content_hash, shingle_sketch, sketch_similarity, NEAR_DUPLICATE_THRESHOLD
+from app.services.ai_services.embedding_batches import batches, embedding_rate_limiter
+from app.services.ai_services.embedding_cache import CachedEmbeddings, get_query_embedding_cache
+from app.services.ai_services.local_vector_search import UserShard, local_vector_index
+from app.services.ai_services.tenant_catalog import tenant_catalog, catalog_increment, catalog_rebuild_pipeline, total_chunks
 
 logger = logging.getLogger(__name__)
 
+VECTOR_INDEX_NAME = "vector_index"
+
+def split_document(content: str, user_email: str, filename: str, type: DocumentType, upload_id: str, chunk_size: int, chunk_overlap: int) -> List[Document]:
+    doc = Document(
+        page_content=content,
+        metadata={
+            "user_email": user_email,
+            "filename": filename,
+            "size": len(content),
+            "upload_id": upload_id,
+            "type": type.value 
+        },
+    )
+
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap
+    )
+    return splitter.split_documents([doc])
+
+def build_chunk_records(chunks: List[Document], chunk_hashes: List[str], embeddings_by_hash: Dict[str, List[float]], indexes: Optional[Iterable[int]] = None) -> List[Dict]:
+    records_to_insert = []
+    for i in (range(len(chunks)) if indexes is None else indexes):
+        record = {
+            "text": chunks[i].page_content,
+            "embedding": embeddings_by_hash[chunk_hashes[i]],
+            "chunk_hash": chunk_hashes[i],
+            # Position in the document; a resumed ingest skips the chunks already stored
+            "chunk_index": i,
+            **chunks[i].metadata
+        }
+        records_to_insert.append(record)
+    return records_to_insert
+
+def registry_entry(user_email: str, filename: str, sketch: List[int], chunks_count: int, previous: Optional[Dict]) -> Dict:
+    return {
+        "user_email": user_email,
+        "filename": filename,
+        "sketch": sketch,
+        "chunks_count": chunks_count,
+        "near_duplicate_of": previous["upload_id"] if previous else None,
+        "created_at": time.time(),
+    }
+
+def document_catalog_update(user_email: str, filename: str, type: DocumentType, size: int, chunks_count: int) -> Dict:
+    """Upsert for an upload's document catalog entry; created_at is kept from the first write"""
+    return {
+        "$set": {
+            "user_email": user_email,
+            "filename": filename,
+            "type": type.value,
+            "size": size,
+            "chunks_count": chunks_count,
+        },
+        "$setOnInsert": {"created_at": time.time()},
+    }
+
+def closest_document(entries: Iterable[Dict], sketch: List[int]) -> Optional[Dict]:
+    """The registry entry most similar to this sketch, if it is similar enough"""
+    best, best_similarity = None, NEAR_DUPLICATE_THRESHOLD
+    for entry in entries:
+        similarity = sketch_similarity(sketch, entry["sketch"])
+        if similarity >= best_similarity:
+            best, best_similarity = entry, similarity
+    return best
+
+def search_result(doc: Dict) -> Dict:
+    return {"text": doc.get("text", ""), **{k: v for k, v in doc.items() if k != "_id" and k != "text"}}
+
 class MongoVectorStoreService:
     def __init__(self):
         self.client = MongoClient(VECTOR_STORE_DB_URI)
         self.db = self.client[VECTOR_DB_NAME]
         self.collection = self.db[VECTOR_COLLECTION_NAME]
+        # One entry per uploaded document: content hash and shingle sketch, per user
+        self.registry = self.db[DOCUMENT_REGISTRY_COLLECTION_NAME]
+        # Chunk counts by type, per user, so searches don't count the chunk collection
+        self.catalog = self.db[TENANT_CATALOG_COLLECTION_NAME]
+        # One entry per stored upload, so listing a user's files doesn't read their chunks
+        self.documents = self.db[DOCUMENT_CATALOG_COLLECTION_NAME]
+        self.documents.create_index([("user_email", 1), ("created_at", -1)])
+        self.documents.create_index("upload_id", unique=True)
 
         logger.info(f"Initializing OpenAIEmbeddings with model: {EMBEDDING_MODEL}")
-        self.embedding_fn = OpenAIEmbeddings(
+        self.embedding_fn = CachedEmbeddings(
+            OpenAIEmbeddings(model=EMBEDDING_MODEL, openai_api_key=OPENAI_API_KEY),
             model=EMBEDDING_MODEL,
-            openai_api_key=OPENAI_API_KEY
+            cache=get_query_embedding_cache()
         )
 
         self.vector_store = MongoDBAtlasVectorSearch(
             collection=self.collection,
             embedding=self.embedding_fn,
-            index_name="vector_index",
+            index_name=VECTOR_INDEX_NAME,
             text_key="text",
             embedding_key="embedding",
         )
         logger.info("MongoVectorStoreService initialized successfully with OpenAI embeddings.")
 
-    def add_document(self, content: str, user_email: str, filename: str, type: DocumentType, upload_id: str = None, chunk_size: int = 1500, chunk_overlap: int = 150) -> int:
+    def add_document(self, content: str, user_email: str, filename: str, type: DocumentType, upload_id: str = None, chunk_size: int = 1500, chunk_overlap: int = 150, on_batch_committed: Optional[Callable[[int, int], None]] = None) -> int:
+        """
+        Split, embed and store a document. Chunks are embedded in batches of
+        EMBEDDING_BATCH_SIZE, EMBEDDING_CONCURRENCY at a time, and each batch is
+        inserted as soon as its embeddings arrive; on_batch_committed(stored, total)
+        is called after each. Calling again with the same upload_id after a failure
+        resumes: chunks already stored are not embedded again.
+        """
         if upload_id is None:
             upload_id = str(uuid4())
         
-        doc = Document(
-            page_content=content,
-            metadata={
-                "user_email": user_email,
-                "filename": filename,
-                "size": len(content),
-                "upload_id": upload_id,
-                "type": type.value 
-            },
-        )
-
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap
-        )
-        chunks = splitter.split_documents([doc])
+        chunks = split_document(content, user_email, filename, type, upload_id, chunk_size, chunk_overlap)
         logger.info(f"Document '{filename}' split into {len(chunks)} chunks.")
 
         if not chunks:
@@ -61,43 +141,169 @@ class MongoVectorStoreService:
             return 0
         
         try:
-            # OpenAIEmbeddings can handle batching internally, but for clarity and control,
-            # we'll still do it this way.
-            texts_to_embed = [chunk.page_content for chunk in chunks]
-            embeddings = self.embedding_fn.embed_documents(texts_to_embed)
-            
-            records_to_insert = []
-            for i, chunk in enumerate(chunks):
-                record = {
-                    "text": chunk.page_content,
-                    "embedding": embeddings[i],
-                    **chunk.metadata
-                }
-                records_to_insert.append(record)
-            
-            self.collection.insert_many(records_to_insert)
-            logger.info(f"Successfully inserted {len(records_to_insert)} chunks for '{filename}' into collection '{VECTOR_COLLECTION_NAME}'.")
+            sketch = shingle_sketch(content)
+            previous = self.find_near_duplicate(user_email, sketch)
+            if previous and previous["upload_id"] == upload_id:
+                previous = None
+            chunk_hashes = [content_hash(chunk.page_content) for chunk in chunks]
+            # Chunks unchanged from an earlier version of this document keep their embeddings
+            embeddings_by_hash = self._embeddings_by_chunk_hash(previous["upload_id"], chunk_hashes) if previous else {}
+            reused = sum(1 for h in chunk_hashes if h in embeddings_by_hash)
+
+            # Before any insert, so the seed counts only chunks the batches below don't add to
+            self._seed_catalog(user_email)
+            stored = self._stored_chunk_indexes(upload_id, range(len(chunks)))
+            if stored:
+                logger.info(f"Resuming '{filename}': {len(stored)} of {len(chunks)} chunks already stored.")
+            pending = [i for i in range(len(chunks)) if i not in stored]
+
+            committed = len(stored)
+            with ThreadPoolExecutor(max_workers=EMBEDDING_CONCURRENCY) as pool:
+                futures = [
+                    pool.submit(self._commit_batch, batch, chunks, chunk_hashes, embeddings_by_hash, user_email, type)
+                    for batch in batches(pending, EMBEDDING_BATCH_SIZE)
+                ]
+                try:
+                    for future in as_completed(futures):
+                        committed += future.result()
+                        if on_batch_committed:
+                            on_batch_committed(committed, len(chunks))
+                except Exception:
+                    # Batches already running still commit, so a retry has less to redo
+                    for future in futures:
+                        future.cancel()
+                    raise
+            logger.info(f"Successfully inserted {len(pending)} chunks for '{filename}' into collection '{VECTOR_COLLECTION_NAME}' ({reused} reused from an earlier version).")
+
+            self.registry.update_one(
+                {"upload_id": upload_id},
+                {"$set": registry_entry(user_email, filename, sketch, len(chunks), previous)},
+                upsert=True
+            )
+            self.documents.update_one(
+                {"upload_id": upload_id},
+                document_catalog_update(user_email, filename, type, len(content), len(chunks)),
+                upsert=True
+            )
         except Exception as e:
             logger.error(f"❌ Failed to insert document chunks for '{filename}': {e}", exc_info=True)
             raise
 
         return len(chunks)
+
+    def _stored_chunk_indexes(self, upload_id: str, indexes: Iterable[int]) -> set:
+        return set(self.collection.distinct("chunk_index", {"upload_id": upload_id, "chunk_index": {"$in": list(indexes)}}))
+
+    def _commit_batch(self, batch: List[int], chunks: List[Document], chunk_hashes: List[str], embeddings_by_hash: Dict[str, List[float]], user_email: str, type: DocumentType) -> int:
+        """Embed and insert one batch of chunks, retrying with backoff; returns the number of chunks stored"""
+        upload_id = chunks[batch[0]].metadata["upload_id"]
+        stored = 0
+        for attempt in range(1, EMBEDDING_BATCH_ATTEMPTS + 1):
+            try:
+                batch_embeddings = {chunk_hashes[i]: embeddings_by_hash[chunk_hashes[i]] for i in batch if chunk_hashes[i] in embeddings_by_hash}
+                to_embed = {chunk_hashes[i]: chunks[i].page_content for i in batch if chunk_hashes[i] not in batch_embeddings}
+                if to_embed:
+                    embedding_rate_limiter.acquire()
+                    batch_embeddings.update(zip(to_embed.keys(), self.embedding_fn.embed_documents(list(to_embed.values()))))
+                # Unordered, so one rejected record doesn't stop the rest of the batch
+                self.collection.insert_many(build_chunk_records(chunks, chunk_hashes, batch_embeddings, batch), ordered=False)
+                remaining, error = [], None
+            except Exception as e:
+                # Part of an unordered insert may have landed; only the rest is retried
+                stored_now = self._stored_chunk_indexes(upload_id, batch)
+                remaining, error = [i for i in batch if i not in stored_now], e
+            self._count_chunks(user_email, type, len(batch) - len(remaining))
+            stored += len(batch) - len(remaining)
+            if not remaining:
+                return stored
+            if attempt == EMBEDDING_BATCH_ATTEMPTS:
+                raise error
+            logger.warning(f"⚠️ Embedding batch failed (attempt {attempt}/{EMBEDDING_BATCH_ATTEMPTS}), retrying {len(remaining)} chunks: {error}")
+            time.sleep(2 ** (attempt - 1))
+            batch = remaining
+        return stored
+
+    def _count_chunks(self, user_email: str, type: DocumentType, chunks: int) -> None:
+        if chunks:
+            self.catalog.update_one({"_id": user_email}, catalog_increment(type.value, chunks), upsert=True)
+            tenant_catalog.invalidate(user_email)
+            local_vector_index.invalidate(user_email)
+
+    def _embeddings_by_chunk_hash(self, upload_id: str, chunk_hashes: List[str]) -> Dict[str, List[float]]:
+        cursor = self.collection.find(
+            {"upload_id": upload_id, "chunk_hash": {"$in": chunk_hashes}},
+            {"chunk_hash": 1, "embedding": 1, "_id": 0}
+        )
+        return {doc["chunk_hash"]: doc["embedding"] for doc in cursor}
+
+    def _catalog_counts(self, user_email: str) -> Dict[str, int]:
+        """The user's chunk counts by type, from memory, the catalog, or (once per user) the chunks themselves"""
+        counts = tenant_catalog.get(user_email)
+        if counts is None:
+            counts = self._seed_catalog(user_email)
+            tenant_catalog.put(user_email, counts)
+        return counts
+
+    def _seed_catalog(self, user_email: str) -> Dict[str, int]:
+        """
+        The user's catalog counts, creating the entry from their stored chunks if
+        it doesn't exist yet. add_document seeds before inserting anything, so
+        the entry always includes chunks stored before the catalog existed.
+        """
+        entry = self.catalog.find_one({"_id": user_email})
+        if entry is not None:
+            return entry.get("chunks_by_type", {})
+        counts = {doc["_id"]: doc["chunks"] for doc in self.collection.aggregate(catalog_rebuild_pipeline(user_email))}
+        # A search and an add may both seed; neither has inserted yet, so either count is complete
+        self.catalog.update_one({"_id": user_email}, {"$setOnInsert": {"chunks_by_type": counts}}, upsert=True)
+        return counts
+
+    def find_near_duplicate(self, user_email: str, sketch: List[int]) -> Optional[Dict]:
+        """The user's registered document most similar to this sketch, if it is similar enough"""
+        return closest_document(self.registry.find({"user_email": user_email, "sketch": {"$exists": True}}, {"_id": 0}), sketch)
+
+    def find_document_by_hash(self, user_email: str, file_hash: str) -> Optional[Dict]:
+        """Registry entry of a completed upload of this exact file by the user"""
+        return self.registry.find_one(
+            {"user_email": user_email, "content_hash": file_hash, "chunks_count": {"$exists": True}},
+            {"_id": 0, "sketch": 0}
+        )
+
+    def find_incomplete_document(self, user_email: str, file_hash: str) -> Optional[Dict]:
+        """Registry entry of an earlier upload of this exact file that failed before all its chunks were stored"""
+        return self.registry.find_one(
+            {"user_email": user_email, "content_hash": file_hash, "chunks_count": {"$exists": False}},
+            {"_id": 0, "upload_id": 1}
+        )
+
+    def set_document_hash(self, upload_id: str, user_email: str, file_hash: str) -> None:
+        """Record the hash of the uploaded file's bytes before ingesting it, so a failed upload can be resumed"""
+        self.registry.update_one(
+            {"upload_id": upload_id},
+            {"$set": {"user_email": user_email, "content_hash": file_hash}},
+            upsert=True
+        )
     
-    def get_all_documents_by_user_email(self, user_email: str) -> List[Dict]:
+    def get_all_documents_by_user_email(self, user_email: str, skip: int = 0, limit: int = 0) -> List[Dict]:
+        """The user's stored uploads, newest first; limit=0 returns all of them"""
         try:
-            cursor = self.collection.find(
-                {"user_email": user_email}, 
-                {"embedding": 0, "_id": 0}
-            )
-            unique_docs = {doc['filename']: doc for doc in cursor}
-            return list(unique_docs.values())
+            cursor = self.documents.find({"user_email": user_email}, {"_id": 0}).sort("created_at", -1).skip(skip).limit(limit)
+            return list(cursor)
         except Exception as e:
             logger.error(f"❌ Failed fetching document list for {user_email}: {e}")
             return []
 
     def delete_document_by_upload_id(self, upload_id: str) -> bool:
         try:
+            # All of an upload's chunks share its owner and type
+            owner = self.collection.find_one({"upload_id": upload_id}, {"user_email": 1, "type": 1})
             result = self.collection.delete_many({"upload_id": upload_id})
+            self.registry.delete_many({"upload_id": upload_id})
+            self.documents.delete_many({"upload_id": upload_id})
+            if owner and result.deleted_count:
+                self.catalog.update_one({"_id": owner["user_email"]}, catalog_increment(owner["type"], -result.deleted_count))
+                tenant_catalog.invalidate(owner["user_email"])
+                local_vector_index.invalidate(owner["user_email"])
             logger.info(f"Deleted {result.deleted_count} chunks for upload_id '{upload_id}'.")
             return result.deleted_count > 0
         except Exception as e:
@@ -113,16 +319,22 @@ class MongoVectorStoreService:
 
         try:
             # Check if documents exist for this user
-            doc_count = self.collection.count_documents({"user_email": user_email})
-            logger.info(f"🔍 [VECTOR SEARCH] Found {doc_count} total documents for user {user_email} in collection")
+            counts = self._catalog_counts(user_email)
+            doc_count = total_chunks(counts)
+            logger.info(f"🔍 [VECTOR SEARCH] Found {doc_count} total documents for user {user_email} in catalog")
             
             if doc_count == 0:
                 logger.warning(f"⚠️ [VECTOR SEARCH] No documents found for user {user_email}")
                 return []
             
             # Check lab report count specifically
-            lab_report_count = self.collection.count_documents({"user_email": user_email, "type": "lab_report"})
+            lab_report_count = counts.get("lab_report", 0)
             logger.info(f"🔍 [VECTOR SEARCH] Found {lab_report_count} lab report chunks for user {user_email}")
+
+            if VECTOR_SEARCH_BACKEND == "local":
+                results = [result for result in self._local_search(query, user_email, top_k, doc_count) if result["text"].strip()]
+                logger.info(f"✅ [VECTOR SEARCH] Local search complete, returning {len(results)} valid results.")
+                return results
             
             search_filter = {"user_email": {"$eq": user_email}}
             logger.info(f"🔍 [VECTOR SEARCH] Stage 1: Constructed search filter: {json.dumps(search_filter)}")
@@ -154,23 +366,28 @@ class MongoVectorStoreService:
 
         except Exception as e:
             logger.error(f"❌ [VECTOR SEARCH] A critical error occurred during the search operation: {e}", exc_info=True)
-            # Try a fallback search without vector similarity if the index isn't working
+            # Fall back to exact search over the user's embeddings if the index isn't working
             try:
-                logger.info(f"🔄 [VECTOR SEARCH] Attempting fallback: direct MongoDB text search")
-                # Fallback: just retrieve recent documents for this user
-                fallback_docs = list(self.collection.find(
-                    {"user_email": user_email},
-                    {"text": 1, "user_email": 1, "filename": 1, "type": 1, "upload_id": 1}
-                ).limit(top_k))
-                
-                logger.info(f"🔄 [VECTOR SEARCH] Fallback retrieved {len(fallback_docs)} documents")
-                return [{"text": doc.get("text", ""), **{k: v for k, v in doc.items() if k != "_id" and k != "text"}} for doc in fallback_docs]
+                logger.info("🔄 [VECTOR SEARCH] Attempting fallback: local exact vector search")
+                results = self._local_search(query, user_email, top_k)
+                logger.info(f"🔄 [VECTOR SEARCH] Fallback retrieved {len(results)} documents")
+                return results
             except Exception as fallback_error:
                 logger.error(f"❌ [VECTOR SEARCH] Fallback search also failed: {fallback_error}")
                 return []
 
+    def _local_search(self, query: str, user_email: str, top_k: int, chunks: Optional[int] = None) -> List[Dict]:
+        """Exact cosine top-k over the user's shard, loading it from the chunk collection on a miss"""
+        query_embedding = self.embedding_fn.embed_query(query)
+        shard = local_vector_index.get(user_email, chunks)
+        if shard is None:
+            shard = UserShard(self.collection.find({"user_email": user_email}, {"_id": 0}))
+            local_vector_index.put(user_email, shard)
+            logger.info(f"🔍 [VECTOR SEARCH] Loaded {shard.chunks} embeddings for user {user_email} into the local index")
+        return [search_result(doc) for doc in shard.top_k(query_embedding, top_k)]
+
     def get_stats(self):
-        return {"total_nodes": self.collection.count_documents({})}
+        return {"total_nodes": self.collection.count_documents({}), "query_embedding_cache": self.embedding_fn.cache.stats()}
 
 vector_store = None
 
@@ -0,0 +1,58 @@
+import threading
+import time
+from typing import Dict, List, Optional
+
+from ...config import TENANT_CATALOG_TTL_SECONDS
+
+# Catalog documents are keyed by user: {"_id": user_email, "chunks_by_type": {type: count}}
+
+def catalog_increment(type: str, chunks: int) -> Dict:
+    """Catalog update recording chunks added (or, if negative, removed) for a document type"""
+    return {"$inc": {f"chunks_by_type.{type}": chunks}}
+
+def catalog_rebuild_pipeline(user_email: str) -> List[Dict]:
+    """Counts a user's chunks by type; only run for users stored before the catalog existed"""
+    return [
+        {"$match": {"user_email": user_email}},
+        {"$group": {"_id": "$type", "chunks": {"$sum": 1}}},
+    ]
+
+def total_chunks(counts: Dict[str, int]) -> int:
+    return sum(max(count, 0) for count in counts.values())
+
+class TenantCatalogCache:
+    """
+    In-process copy of catalog entries, so searches don't read the catalog
+    collection on every message. Entries expire after the TTL, which bounds how
+    stale counts written by other processes can get. Users with no chunks are
+    never cached, so a fresh upload is searchable from any process at once.
+    """
+
+    def __init__(self, ttl: float = TENANT_CATALOG_TTL_SECONDS):
+        self.ttl = ttl
+        self._entries: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_email: str) -> Optional[Dict[str, int]]:
+        with self._lock:
+            entry = self._entries.get(user_email)
+            if entry is None:
+                return None
+            counts, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[user_email]
+                return None
+            return counts
+
+    def put(self, user_email: str, counts: Dict[str, int]) -> None:
+        if not total_chunks(counts):
+            return
+        with self._lock:
+            self._entries[user_email] = (counts, time.monotonic() + self.ttl)
+
+    def invalidate(self, user_email: str) -> None:
+        with self._lock:
+            self._entries.pop(user_email, None)
+
+# Shared by the sync and async vector stores: adds and deletes go through one, searches the other
+tenant_catalog = TenantCatalogCache()
@@ -5,6 +5,7 @@ from app.services.ai_services.mongodb_vectorstore import get_vector_store
 from app.services.ai_services.document_processor import get_document_processor
 from app.services.backend_services.progress_tracker import get_progress_tracker
 from app.schemas.backend.documents import DocumentType
+from app.services.ai_services.document_fingerprint import content_hash
 
 class DocumentManager:
     def __init__(self):
@@ -21,19 +22,45 @@ class DocumentManager:
             status=status
         )
         print(f"Adding document {filename} for user {user_email} with upload ID {upload_id}")
+        file_hash = content_hash(content)
+        existing = self.vector_store.find_document_by_hash(user_email, file_hash)
+        if existing:
+            # Same file uploaded before: skip conversion and embedding and return the earlier result
+            print(f"Document {filename} already uploaded as {existing['upload_id']}")
+            progress_callback(
+                percentage=100,
+                message="Document already uploaded",
+                status="completed"
+            )
+            return {
+                "success": True,
+                "filename": filename,
+                "chunks_count": existing.get("chunks_count", 0),
+                "duplicate_of": existing["upload_id"]
+            }
+
+        # An earlier upload of this file failed part way: store under its upload ID so its chunks aren't embedded again
+        incomplete = self.vector_store.find_incomplete_document(user_email, file_hash)
+        storage_id = incomplete["upload_id"] if incomplete else upload_id
+        if incomplete:
+            print(f"Resuming earlier upload {storage_id} of {filename}")
+
         file_extension = filename.split('.')[-1].lower()
         self.progress_tracker.update_progress(upload_id, 20, "Starting document analysis...")
         
         result = None
         
+        if file_extension in ('pdf', 'docx', 'doc', 'text'):
+            self.vector_store.set_document_hash(storage_id, user_email, file_hash)
+
         if file_extension == 'pdf':
-            result = self.processor.process_pdf_file(content, filename, user_email, type, upload_id, progress_callback)
+            result = self.processor.process_pdf_file(content, filename, user_email, type, storage_id, progress_callback)
         elif file_extension == 'docx':
-            result = self.processor.process_docx_file(content, filename, user_email, type, upload_id, progress_callback)
+            result = self.processor.process_docx_file(content, filename, user_email, type, storage_id, progress_callback)
         elif file_extension == 'doc':
-            result = self.processor.process_doc_file(content, filename, user_email, type, upload_id, progress_callback)
+            result = self.processor.process_doc_file(content, filename, user_email, type, storage_id, progress_callback)
         elif file_extension == 'text' and isinstance(content, str):
-            result = self.processor.process_text_file(content, filename, user_email, type, upload_id, progress_callback)
+            result = self.processor.process_text_file(content, filename, user_email, type, storage_id, progress_callback)
         else:
             error_msg = f"Unsupported file type: .{file_extension}. Supported formats: pdf, docx, doc, text"
             result = {"success": False, "error": error_msg}
@@ -51,10 +78,10 @@ class DocumentManager:
             message="Document processed successfully",
             status="completed"
         )
-        return {"success": True, "filename": filename, "chunks_count": result.get("chunks_count", 0)}
+        return {"success": True, "filename": filename, "chunks_count": result.get("chunks_count", 0), "upload_id": storage_id}
     
-    def get_all_documents_by_user_email(self, user_email: str) -> List[Dict]:
-        documents = self.vector_store.get_all_documents_by_user_email(user_email)
+    def get_all_documents_by_user_email(self, user_email: str, skip: int = 0, limit: int = 0) -> List[Dict]:
+        documents = self.vector_store.get_all_documents_by_user_email(user_email, skip=skip, limit=limit)
         return documents
 
     def delete_document_by_upload_id(self, upload_id: str) -> bool:
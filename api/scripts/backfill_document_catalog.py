@@ -0,0 +1,49 @@
+from pymongo import MongoClient
+from app.config import VECTOR_STORE_DB_URI, VECTOR_DB_NAME, VECTOR_COLLECTION_NAME, DOCUMENT_CATALOG_COLLECTION_NAME
+
+def backfill_document_catalog():
+    """Add document catalog entries for uploads stored before the catalog existed"""
+    print("Connecting to MongoDB...")
+    client = MongoClient(VECTOR_STORE_DB_URI)
+    db = client[VECTOR_DB_NAME]
+    chunks = db[VECTOR_COLLECTION_NAME]
+    documents = db[DOCUMENT_CATALOG_COLLECTION_NAME]
+
+    print("Grouping stored chunks by upload...")
+    uploads = chunks.aggregate([
+        {"$group": {
+            "_id": "$upload_id",
+            "user_email": {"$first": "$user_email"},
+            "filename": {"$first": "$filename"},
+            "type": {"$first": "$type"},
+            "size": {"$first": "$size"},
+            "chunks_count": {"$sum": 1},
+            # The earliest chunk's ObjectId holds the time the upload was stored
+            "first_chunk": {"$min": "$_id"},
+        }}
+    ], allowDiskUse=True)
+
+    added = 0
+    for upload in uploads:
+        if upload["_id"] is None:
+            continue
+        result = documents.update_one(
+            {"upload_id": upload["_id"]},
+            {"$setOnInsert": {
+                "user_email": upload["user_email"],
+                "filename": upload["filename"],
+                "type": upload["type"],
+                "size": upload["size"],
+                "chunks_count": upload["chunks_count"],
+                "created_at": upload["first_chunk"].generation_time.timestamp(),
+            }},
+            upsert=True
+        )
+        if result.upserted_id is not None:
+            added += 1
+
+    client.close()
+    print(f"Backfill complete: {added} uploads added to the document catalog")
+
+if __name__ == "__main__":
+    backfill_document_catalog()
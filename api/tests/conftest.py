@@ -2,7 +2,8 @@ import pytest
 import asyncio
 import sys
 import os
-from unittest.mock import Mock, AsyncMock, patch
+from contextlib import ExitStack
+from unittest.mock import Mock, MagicMock, AsyncMock, patch
 from datetime import datetime
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -98,6 +99,36 @@ def mock_vector_store_with_results(sample_medical_documents):
     vector_store.search = Mock(return_value=sample_medical_documents)
     return vector_store
 
+@pytest.fixture
+def vector_store_service_factory():
+    """
+    Builds a Mongo vector store service without connecting: its client and
+    embedding classes are patched while it is constructed, then its collections
+    and embedding function are MagicMocks. Defaults to the sync service; pass
+    AsyncMongoVectorStoreService for the Motor one.
+    """
+    def _create_service(service_class=None):
+        if service_class is None:
+            from app.services.ai_services.mongodb_vectorstore import MongoVectorStoreService
+            service_class = MongoVectorStoreService
+        module = sys.modules[service_class.__module__]
+        with ExitStack() as stack:
+            for name in ("MongoClient", "AsyncIOMotorClient", "OpenAIEmbeddings", "MongoDBAtlasVectorSearch"):
+                if hasattr(module, name):
+                    stack.enter_context(patch.object(module, name))
+            service = service_class()
+        service.collection = MagicMock()
+        service.collection.distinct.return_value = []
+        service.registry = MagicMock()
+        service.registry.find.return_value = []
+        service.catalog = MagicMock()
+        service.documents = MagicMock()
+        service.vector_store = MagicMock()
+        service.embedding_fn = MagicMock()
+        service.embedding_fn.embed_documents.side_effect = lambda texts: [[0.5] for _ in texts]
+        return service
+    return _create_service
+
 @pytest.fixture
 def mock_db_with_user(sample_user_data):
     db = Mock()
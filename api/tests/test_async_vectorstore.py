@@ -0,0 +1,53 @@
+import pytest
+from unittest.mock import MagicMock, AsyncMock
+from app.services.ai_services.async_mongodb_vectorstore import AsyncMongoVectorStoreService
+from app.services.ai_services.local_vector_search import local_vector_index
+from app.services.ai_services.tenant_catalog import tenant_catalog
+
+
+def cursor(docs):
+    cursor = MagicMock()
+    cursor.to_list = AsyncMock(return_value=docs)
+    cursor.limit.return_value = cursor
+    return cursor
+
+
+@pytest.mark.unit
+class TestAsyncMongoVectorStoreService:
+
+    @pytest.fixture
+    def service(self, vector_store_service_factory):
+        service = vector_store_service_factory(AsyncMongoVectorStoreService)
+        service.catalog.find_one = AsyncMock(return_value={"_id": "test@example.com", "chunks_by_type": {"lab_report": 3}})
+        service.catalog.update_one = AsyncMock()
+        tenant_catalog.invalidate("test@example.com")
+        service.embedding_fn.aembed_query = AsyncMock(return_value=[0.1, 0.2])
+        return service
+
+    @pytest.mark.asyncio
+    async def test_search_runs_filtered_vector_search(self, service):
+        service.collection.aggregate.return_value = cursor([
+            {"text": "Glucose 95 mg/dL", "filename": "labs.pdf", "type": "lab_report", "user_email": "test@example.com"},
+            {"text": "  ", "filename": "empty.pdf"},
+        ])
+
+        results = await service.search("glucose", "test@example.com", top_k=4)
+
+        assert results == [{"text": "Glucose 95 mg/dL", "filename": "labs.pdf", "type": "lab_report", "user_email": "test@example.com"}]
+        stage = service.collection.aggregate.call_args[0][0][0]["$vectorSearch"]
+        assert stage["queryVector"] == [0.1, 0.2]
+        assert stage["limit"] == 4
+        assert stage["filter"] == {"user_email": {"$eq": "test@example.com"}}
+
+    @pytest.mark.asyncio
+    async def test_search_falls_back_to_local_exact_search(self, service):
+        service.collection.aggregate.side_effect = Exception("index missing")
+        service.collection.find.return_value = cursor([
+            {"text": "Sleep notes", "filename": "sleep.md", "embedding": [-0.2, 0.1]},
+            {"text": "Glucose 95 mg/dL", "filename": "labs.pdf", "embedding": [0.2, 0.4]},
+        ])
+        local_vector_index.invalidate("test@example.com")
+
+        results = await service.search("glucose", "test@example.com", top_k=1)
+
+        assert results == [{"text": "Glucose 95 mg/dL", "filename": "labs.pdf"}]
@@ -0,0 +1,105 @@
+import pytest
+from unittest.mock import patch
+from app.schemas.backend.documents import DocumentType
+from app.services.ai_services.embedding_batches import RateLimiter, batches
+
+PARAGRAPHS = [f"Visit {i}: the patient reports sleeping {6 + i % 3} hours and walking daily." for i in range(10)]
+CONTENT = "\n\n".join(PARAGRAPHS)
+
+
+class FakeChunkCollection:
+    """Stores inserted records and answers the chunk_index lookups add_document makes"""
+
+    def __init__(self, fail_inserts=0):
+        self.records = []
+        self.insert_calls = []
+        self.fail_inserts = fail_inserts
+
+    def insert_many(self, records, ordered=True):
+        self.insert_calls.append(([r["chunk_index"] for r in records], ordered))
+        if self.fail_inserts:
+            self.fail_inserts -= 1
+            # An unordered insert that failed part way: the first record landed
+            self.records.append(records[0])
+            raise Exception("write error")
+        self.records.extend(records)
+
+    def distinct(self, key, query):
+        wanted = set(query["chunk_index"]["$in"])
+        return sorted({r[key] for r in self.records if r["upload_id"] == query["upload_id"] and r[key] in wanted})
+
+
+@pytest.fixture
+def service(vector_store_service_factory):
+    service = vector_store_service_factory()
+    with patch('app.services.ai_services.mongodb_vectorstore.EMBEDDING_BATCH_SIZE', 3), \
+         patch('app.services.ai_services.mongodb_vectorstore.embedding_rate_limiter'), \
+         patch('app.services.ai_services.mongodb_vectorstore.time.sleep'):
+        yield service
+
+
+def add(service, **kwargs):
+    # Each paragraph is its own chunk at this size
+    return service.add_document(CONTENT, "test@example.com", "visits.md", DocumentType.DOCUMENT, upload_id="u1", chunk_size=100, chunk_overlap=0, **kwargs)
+
+
+@pytest.mark.unit
+class TestBatchedIngest:
+
+    def test_batches_are_inserted_unordered_as_they_finish(self, service):
+        service.collection = FakeChunkCollection()
+        progress = []
+
+        assert add(service, on_batch_committed=lambda stored, total: progress.append((stored, total))) == 10
+
+        assert sorted(index for indexes, _ in service.collection.insert_calls for index in indexes) == list(range(10))
+        assert all(len(indexes) <= 3 and ordered is False for indexes, ordered in service.collection.insert_calls)
+        assert [stored for stored, _ in progress] == sorted(stored for stored, _ in progress)
+        assert progress[-1] == (10, 10) and len(progress) == 4
+
+    def test_resume_skips_stored_chunks(self, service):
+        service.collection = FakeChunkCollection()
+        service.collection.records = [{"upload_id": "u1", "chunk_index": i} for i in range(6)]
+        progress = []
+
+        add(service, on_batch_committed=lambda stored, total: progress.append(stored))
+
+        embedded = [text for call in service.embedding_fn.embed_documents.call_args_list for text in call[0][0]]
+        assert embedded == PARAGRAPHS[6:]
+        assert progress[-1] == 10
+
+    def test_failed_batch_retries_only_missing_chunks(self, service):
+        service.collection = FakeChunkCollection(fail_inserts=1)
+
+        assert add(service) == 10
+
+        stored = sorted(r["chunk_index"] for r in service.collection.records)
+        assert stored == list(range(10))
+        # Batches run concurrently; the failed one is the first insert, retried without its stored record
+        calls = [indexes for indexes, _ in service.collection.insert_calls]
+        assert len(calls) == 5 and calls[0][1:] in calls[1:]
+
+    def test_persistent_failure_raises_after_attempts(self, service):
+        service.collection = FakeChunkCollection()
+        service.embedding_fn.embed_documents.side_effect = Exception("rate limited")
+
+        with pytest.raises(Exception, match="rate limited"):
+            add(service)
+
+        service.registry.update_one.assert_not_called()
+
+
+@pytest.mark.unit
+class TestRateLimiter:
+
+    def test_calls_are_spaced_by_the_rate(self):
+        limiter = RateLimiter(rate=10)
+        with patch('app.services.ai_services.embedding_batches.time.monotonic', return_value=100.0), \
+             patch('app.services.ai_services.embedding_batches.time.sleep') as sleep:
+            for _ in range(3):
+                limiter.acquire()
+
+        assert [round(call.args[0], 3) for call in sleep.call_args_list] == [0.1, 0.2]
+
+    def test_batches_split_into_fixed_sizes(self):
+        assert list(batches(list(range(7)), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
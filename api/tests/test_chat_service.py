@@ -11,7 +11,7 @@ class TestChatServiceIntegration:
         mock_vector_store = MagicMock()
         mock_db = MagicMock()
 
-        mock_vector_store.search = MagicMock(return_value=[
+        mock_vector_store.search = AsyncMock(return_value=[
             {"text": "Patient has hypertension."},
             {"text": "Prescribed Lisinopril 10mg."}
         ])
@@ -36,7 +36,7 @@ class TestChatServiceIntegration:
         mock_llm.invoke = MagicMock(side_effect=[response_mock, follow_up_mock])
 
         with patch('app.services.ai_services.chat_service.ChatOpenAI', return_value=mock_llm), \
-             patch('app.services.ai_services.chat_service.get_vector_store', return_value=mock_vector_store), \
+             patch('app.services.ai_services.chat_service.get_async_vector_store', return_value=mock_vector_store), \
              patch('app.services.ai_services.chat_service.get_db', return_value=mock_db):
             
             service = ChatService()
@@ -56,7 +56,7 @@ class TestChatServiceIntegration:
         mock_vector_store = MagicMock()
         mock_db = MagicMock()
 
-        mock_vector_store.search = MagicMock(return_value=[])
+        mock_vector_store.search = AsyncMock(return_value=[])
 
         user_collection = MagicMock()
         async def mock_find_one(query):
@@ -78,7 +78,7 @@ class TestChatServiceIntegration:
         mock_llm.invoke = MagicMock(side_effect=[response_mock, follow_up_mock])
 
         with patch('app.services.ai_services.chat_service.ChatOpenAI', return_value=mock_llm), \
-             patch('app.services.ai_services.chat_service.get_vector_store', return_value=mock_vector_store), \
+             patch('app.services.ai_services.chat_service.get_async_vector_store', return_value=mock_vector_store), \
              patch('app.services.ai_services.chat_service.get_db', return_value=mock_db):
             
             service = ChatService()
@@ -94,7 +94,7 @@ class TestChatServiceIntegration:
         mock_vector_store = MagicMock()
         mock_db = MagicMock()
 
-        mock_vector_store.search = MagicMock(return_value=[{"text": "Some medical context"}])
+        mock_vector_store.search = AsyncMock(return_value=[{"text": "Some medical context"}])
 
         user_collection = MagicMock()
         async def mock_find_one(query):
@@ -111,7 +111,7 @@ class TestChatServiceIntegration:
         mock_llm.invoke = MagicMock(side_effect=[response_mock, follow_up_mock])
 
         with patch('app.services.ai_services.chat_service.ChatOpenAI', return_value=mock_llm), \
-             patch('app.services.ai_services.chat_service.get_vector_store', return_value=mock_vector_store), \
+             patch('app.services.ai_services.chat_service.get_async_vector_store', return_value=mock_vector_store), \
              patch('app.services.ai_services.chat_service.get_db', return_value=mock_db):
             
             service = ChatService()
@@ -126,7 +126,7 @@ class TestChatServiceIntegration:
         mock_vector_store = MagicMock()
         mock_db = MagicMock()
 
-        mock_vector_store.search = MagicMock(side_effect=Exception("Vector store connection failed"))
+        mock_vector_store.search = AsyncMock(side_effect=Exception("Vector store connection failed"))
 
         user_collection = MagicMock()
         async def mock_find_one(query):
@@ -148,7 +148,7 @@ class TestChatServiceIntegration:
         mock_llm.invoke = MagicMock(side_effect=[response_mock, follow_up_mock])
 
         with patch('app.services.ai_services.chat_service.ChatOpenAI', return_value=mock_llm), \
-             patch('app.services.ai_services.chat_service.get_vector_store', return_value=mock_vector_store), \
+             patch('app.services.ai_services.chat_service.get_async_vector_store', return_value=mock_vector_store), \
              patch('app.services.ai_services.chat_service.get_db', return_value=mock_db):
             
             service = ChatService()
@@ -164,7 +164,7 @@ class TestChatServiceIntegration:
         mock_vector_store = MagicMock()
         mock_db = MagicMock()
 
-        mock_vector_store.search = MagicMock(return_value=[{"text": "Medical context"}])
+        mock_vector_store.search = AsyncMock(return_value=[{"text": "Medical context"}])
 
         user_collection = MagicMock()
         async def mock_find_one(query):
@@ -181,7 +181,7 @@ class TestChatServiceIntegration:
         mock_llm.invoke = MagicMock(side_effect=[response_mock, follow_up_mock])
 
         with patch('app.services.ai_services.chat_service.ChatOpenAI', return_value=mock_llm), \
-             patch('app.services.ai_services.chat_service.get_vector_store', return_value=mock_vector_store), \
+             patch('app.services.ai_services.chat_service.get_async_vector_store', return_value=mock_vector_store), \
              patch('app.services.ai_services.chat_service.get_db', return_value=mock_db):
             
             service = ChatService()
@@ -196,7 +196,7 @@ class TestChatServiceIntegration:
         mock_vector_store = MagicMock()
         mock_db = MagicMock()
 
-        mock_vector_store.search = MagicMock(return_value=[{"text": "Context"}])
+        mock_vector_store.search = AsyncMock(return_value=[{"text": "Context"}])
 
         user_collection = MagicMock()
         async def mock_find_one(query):
@@ -207,7 +207,7 @@ class TestChatServiceIntegration:
         mock_llm.invoke = MagicMock(side_effect=Exception("API rate limit exceeded"))
 
         with patch('app.services.ai_services.chat_service.ChatOpenAI', return_value=mock_llm), \
-             patch('app.services.ai_services.chat_service.get_vector_store', return_value=mock_vector_store), \
+             patch('app.services.ai_services.chat_service.get_async_vector_store', return_value=mock_vector_store), \
              patch('app.services.ai_services.chat_service.get_db', return_value=mock_db):
             
             service = ChatService()
@@ -222,7 +222,7 @@ class TestChatServiceIntegration:
         mock_vector_store = MagicMock()
         mock_db = MagicMock()
 
-        mock_vector_store.search = MagicMock(return_value=[{"text": "Context"}])
+        mock_vector_store.search = AsyncMock(return_value=[{"text": "Context"}])
 
         user_collection = MagicMock()
         async def mock_find_one(query):
@@ -239,7 +239,7 @@ class TestChatServiceIntegration:
         mock_llm.invoke = MagicMock(side_effect=[response_mock, follow_up_mock])
 
         with patch('app.services.ai_services.chat_service.ChatOpenAI', return_value=mock_llm), \
-             patch('app.services.ai_services.chat_service.get_vector_store', return_value=mock_vector_store), \
+             patch('app.services.ai_services.chat_service.get_async_vector_store', return_value=mock_vector_store), \
              patch('app.services.ai_services.chat_service.get_db', return_value=mock_db):
             
             service = ChatService()
@@ -266,7 +266,7 @@ class TestMultipleQueries:
         mock_vector_store = MagicMock()
         mock_db = MagicMock()
 
-        mock_vector_store.search = MagicMock(return_value=[{"text": "Medical context"}])
+        mock_vector_store.search = AsyncMock(return_value=[{"text": "Medical context"}])
 
         user_collection = MagicMock()
         async def mock_find_one(query):
@@ -288,7 +288,7 @@ class TestMultipleQueries:
         mock_llm.invoke = MagicMock(side_effect=responses)
 
         with patch('app.services.ai_services.chat_service.ChatOpenAI', return_value=mock_llm), \
-             patch('app.services.ai_services.chat_service.get_vector_store', return_value=mock_vector_store), \
+             patch('app.services.ai_services.chat_service.get_async_vector_store', return_value=mock_vector_store), \
              patch('app.services.ai_services.chat_service.get_db', return_value=mock_db):
             
             service = ChatService()
@@ -0,0 +1,48 @@
+import pytest
+from unittest.mock import MagicMock
+from app.schemas.backend.documents import DocumentType
+
+
+@pytest.mark.unit
+class TestDocumentCatalog:
+
+    @pytest.fixture
+    def service(self, vector_store_service_factory):
+        return vector_store_service_factory()
+
+    def test_add_document_writes_catalog_entry(self, service):
+        content = "Blood pressure 120/80 at the annual visit."
+
+        service.add_document(content, "test@example.com", "visit.md", DocumentType.DOCUMENT, upload_id="u1")
+
+        query, update = service.documents.update_one.call_args[0]
+        assert query == {"upload_id": "u1"}
+        assert update["$set"] == {
+            "user_email": "test@example.com",
+            "filename": "visit.md",
+            "type": DocumentType.DOCUMENT.value,
+            "size": len(content),
+            "chunks_count": 1,
+        }
+        assert "created_at" in update["$setOnInsert"]
+
+    def test_listing_is_one_paginated_catalog_query(self, service):
+        cursor = service.documents.find.return_value.sort.return_value.skip.return_value.limit.return_value
+        cursor.__iter__.return_value = iter([{"upload_id": "u2", "filename": "labs.pdf"}])
+
+        documents = service.get_all_documents_by_user_email("test@example.com", skip=20, limit=10)
+
+        assert documents == [{"upload_id": "u2", "filename": "labs.pdf"}]
+        service.documents.find.assert_called_once_with({"user_email": "test@example.com"}, {"_id": 0})
+        service.documents.find.return_value.sort.assert_called_once_with("created_at", -1)
+        service.documents.find.return_value.sort.return_value.skip.assert_called_once_with(20)
+        service.documents.find.return_value.sort.return_value.skip.return_value.limit.assert_called_once_with(10)
+        service.collection.find.assert_not_called()
+
+    def test_delete_removes_catalog_entry(self, service):
+        service.collection.find_one.return_value = None
+        service.collection.delete_many.return_value = MagicMock(deleted_count=2)
+
+        service.delete_document_by_upload_id("u1")
+
+        service.documents.delete_many.assert_called_once_with({"upload_id": "u1"})
@@ -0,0 +1,82 @@
+import bson
+import pytest
+from app.schemas.backend.documents import DocumentType
+from app.services.ai_services.document_fingerprint import content_hash, shingle_sketch, sketch_similarity
+from app.services.ai_services.mongodb_vectorstore import registry_entry
+
+PARAGRAPHS = [
+    f"Visit {i}: blood pressure was {110 + i}/{70 + i} and the patient continues Lisinopril {i} mg daily."
+    for i in range(40)
+]
+
+
+@pytest.mark.unit
+class TestDocumentFingerprint:
+
+    def test_content_hash_is_the_same_for_str_and_bytes(self):
+        assert content_hash("report") == content_hash(b"report")
+        assert content_hash("report") != content_hash("report 2")
+
+    def test_identical_text_is_fully_similar(self):
+        text = "\n".join(PARAGRAPHS)
+        assert sketch_similarity(shingle_sketch(text), shingle_sketch(text.upper())) == 1.0
+
+    def test_edited_text_is_near_duplicate(self):
+        original = "\n".join(PARAGRAPHS)
+        edited = "\n".join(PARAGRAPHS[:-2] + ["Visit 40: the patient switched to Losartan."])
+        assert sketch_similarity(shingle_sketch(original), shingle_sketch(edited)) > 0.8
+
+    def test_unrelated_text_is_not_similar(self):
+        other = " ".join(f"Lab panel {i} shows glucose {90 + i} mg/dL." for i in range(40))
+        assert sketch_similarity(shingle_sketch("\n".join(PARAGRAPHS)), shingle_sketch(other)) < 0.1
+
+    def test_empty_text_is_not_similar(self):
+        assert sketch_similarity(shingle_sketch(""), shingle_sketch("\n".join(PARAGRAPHS))) == 0.0
+
+    def test_registry_entry_with_short_text_sketch_encodes_to_bson(self):
+        # A short text keeps all of its shingle hashes, including ones with the top bit set
+        sketch = shingle_sketch(PARAGRAPHS[0] + " " + PARAGRAPHS[1])
+        entry = registry_entry("test@example.com", "visits.md", sketch, 2, None)
+
+        assert bson.decode(bson.encode(entry))["sketch"] == sketch
+
+
+@pytest.mark.unit
+class TestIncrementalAddDocument:
+
+    @pytest.fixture
+    def service(self, vector_store_service_factory):
+        return vector_store_service_factory()
+
+    def test_new_document_embeds_every_chunk(self, service):
+        service.registry.find.return_value = []
+        content = "\n\n".join(PARAGRAPHS)
+
+        count = service.add_document(content, "test@example.com", "visits.md", DocumentType.DOCUMENT, upload_id="new", chunk_size=100, chunk_overlap=0)
+
+        embedded = service.embedding_fn.embed_documents.call_args[0][0]
+        assert len(embedded) == count
+        records = service.collection.insert_many.call_args[0][0]
+        assert all(record["upload_id"] == "new" and record["chunk_hash"] for record in records)
+        service.registry.update_one.assert_called_once()
+
+    def test_edited_document_only_embeds_changed_chunks(self, service):
+        original = "\n\n".join(PARAGRAPHS)
+        changed = "Visit 39: the patient switched to Losartan 50 mg daily."
+        edited = "\n\n".join(PARAGRAPHS[:-1] + [changed])
+        stored = {content_hash(paragraph) for paragraph in PARAGRAPHS}
+        service.registry.find.return_value = [{"upload_id": "old", "sketch": shingle_sketch(original)}]
+        service.collection.find.side_effect = lambda query, projection: [
+            {"chunk_hash": chunk_hash, "embedding": [0.1]}
+            for chunk_hash in query["chunk_hash"]["$in"] if chunk_hash in stored
+        ]
+
+        # Each paragraph is its own chunk at this size
+        count = service.add_document(edited, "test@example.com", "visits.md", DocumentType.DOCUMENT, upload_id="new", chunk_size=100, chunk_overlap=0)
+
+        assert count == len(PARAGRAPHS)
+        assert service.collection.find.call_args[0][0]["upload_id"] == "old"
+        service.embedding_fn.embed_documents.assert_called_once_with([changed])
+        records = service.collection.insert_many.call_args[0][0]
+        assert [record["embedding"] for record in records] == [[0.1]] * (count - 1) + [[0.5]]
+        assert service.registry.update_one.call_args[0][1]["$set"]["near_duplicate_of"] == "old"
@@ -0,0 +1,46 @@
+import sys
+import pytest
+from unittest.mock import MagicMock, patch
+from app.schemas.backend.documents import DocumentType
+
+# DocumentManager imports the PDF and DOCX converters, which these tests never call
+with patch.dict(sys.modules, {"fitz": MagicMock(), "pypandoc": MagicMock()}):
+    from app.services.backend_services.document_manager import DocumentManager
+
+
+@pytest.fixture
+def manager():
+    with patch('app.services.backend_services.document_manager.get_db'), \
+         patch('app.services.backend_services.document_manager.get_vector_store'), \
+         patch('app.services.backend_services.document_manager.get_document_processor'), \
+         patch('app.services.backend_services.document_manager.get_progress_tracker'):
+        manager = DocumentManager()
+    manager.vector_store.find_document_by_hash.return_value = None
+    manager.processor.process_pdf_file.return_value = {"success": True, "chunks_count": 12}
+    return manager
+
+
+@pytest.mark.unit
+class TestDocumentResume:
+
+    def test_new_file_is_stored_under_its_own_upload_id(self, manager):
+        manager.vector_store.find_incomplete_document.return_value = None
+
+        result = manager.add_document(b"%PDF", "labs.pdf", "test@example.com", "new-id", DocumentType.DOCUMENT)
+
+        assert result["upload_id"] == "new-id"
+        manager.vector_store.set_document_hash.assert_called_once()
+        assert manager.vector_store.set_document_hash.call_args[0][0] == "new-id"
+
+    def test_failed_upload_of_same_file_is_resumed(self, manager):
+        manager.vector_store.find_incomplete_document.return_value = {"upload_id": "failed-id"}
+
+        result = manager.add_document(b"%PDF", "labs.pdf", "test@example.com", "new-id", DocumentType.DOCUMENT)
+
+        assert result["upload_id"] == "failed-id"
+        # Chunks go under the earlier upload ID, so the stored ones are skipped
+        assert manager.processor.process_pdf_file.call_args[0][4] == "failed-id"
+        # Progress is still reported on the new upload session
+        manager.progress_tracker.update_progress.assert_any_call(
+            upload_id="new-id", percentage=100, message="Document processed successfully", status="completed"
+        )
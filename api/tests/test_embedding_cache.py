@@ -0,0 +1,90 @@
+import pytest
+from unittest.mock import MagicMock, AsyncMock, patch
+from app.services.ai_services.embedding_cache import CachedEmbeddings, QueryEmbeddingCache, get_query_embedding_cache
+
+
+@pytest.fixture
+def embeddings():
+    embeddings = MagicMock()
+    embeddings.embed_query.side_effect = lambda text: [float(len(text))]
+    embeddings.aembed_query = AsyncMock(side_effect=lambda text: [float(len(text))])
+    return embeddings
+
+
+@pytest.mark.unit
+class TestCachedEmbeddings:
+
+    def test_repeated_query_is_embedded_once(self, embeddings):
+        cached = CachedEmbeddings(embeddings, "model-a", QueryEmbeddingCache(max_entries=8, ttl=60))
+
+        assert cached.embed_query("What is my LDL?") == cached.embed_query("  What is  my LDL? ")
+
+        embeddings.embed_query.assert_called_once_with("What is my LDL?")
+        assert cached.cache.stats()["hit_rate"] == 0.5
+
+    def test_models_do_not_share_entries(self, embeddings):
+        cache = QueryEmbeddingCache(max_entries=8, ttl=60)
+        CachedEmbeddings(embeddings, "model-a", cache).embed_query("glucose")
+        CachedEmbeddings(embeddings, "model-b", cache).embed_query("glucose")
+
+        assert embeddings.embed_query.call_count == 2
+
+    def test_least_recently_used_entry_is_evicted(self, embeddings):
+        cached = CachedEmbeddings(embeddings, "model-a", QueryEmbeddingCache(max_entries=2, ttl=60))
+        for query in ["a", "b", "a", "c", "a", "b"]:
+            cached.embed_query(query)
+
+        # "b" was evicted when "c" arrived; "a" stayed hot
+        assert [call.args[0] for call in embeddings.embed_query.call_args_list] == ["a", "b", "c", "b"]
+
+    def test_entries_expire_after_ttl(self, embeddings):
+        cached = CachedEmbeddings(embeddings, "model-a", QueryEmbeddingCache(max_entries=8, ttl=60))
+        cached.embed_query("glucose")
+
+        with patch('app.services.ai_services.embedding_cache.time.monotonic', return_value=float("inf")):
+            cached.embed_query("glucose")
+
+        assert embeddings.embed_query.call_count == 2
+
+    def test_documents_are_not_cached(self, embeddings):
+        embeddings.embed_documents.return_value = [[1.0]]
+        cached = CachedEmbeddings(embeddings, "model-a", QueryEmbeddingCache(max_entries=8, ttl=60))
+
+        cached.embed_documents(["chunk"])
+        cached.embed_documents(["chunk"])
+
+        assert embeddings.embed_documents.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_async_miss_falls_through_to_collection(self, embeddings):
+        collection = MagicMock()
+        collection.find_one.return_value = {"embedding": [9.0]}
+        cached = CachedEmbeddings(embeddings, "model-a", QueryEmbeddingCache(max_entries=8, ttl=60, collection=collection))
+
+        assert await cached.aembed_query("glucose") == [9.0]
+        assert await cached.aembed_query("glucose") == [9.0]
+
+        embeddings.aembed_query.assert_not_called()
+        collection.find_one.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_async_miss_is_persisted(self, embeddings):
+        collection = MagicMock()
+        collection.find_one.return_value = None
+        cached = CachedEmbeddings(embeddings, "model-a", QueryEmbeddingCache(max_entries=8, ttl=60, collection=collection))
+
+        assert await cached.aembed_query("glucose") == [7.0]
+
+        key = cached.cache.key("model-a", "glucose")
+        assert collection.update_one.call_args[0][0] == {"_id": key}
+        assert collection.update_one.call_args[0][1]["$set"]["embedding"] == [7.0]
+
+
+@pytest.mark.unit
+def test_persisted_cache_gets_a_ttl_index():
+    with patch('app.services.ai_services.embedding_cache.QUERY_EMBEDDING_CACHE_PERSIST', True), \
+         patch('app.services.ai_services.embedding_cache.query_embedding_cache', None), \
+         patch('app.services.ai_services.embedding_cache.MongoClient'):
+        cache = get_query_embedding_cache()
+
+    cache.collection.create_index.assert_called_once_with("expires_at", expireAfterSeconds=0)
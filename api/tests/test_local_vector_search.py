@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+from unittest.mock import MagicMock, patch
+from app.services.ai_services.local_vector_search import LocalVectorIndex, UserShard, local_vector_index
+from app.services.ai_services.tenant_catalog import tenant_catalog
+
+USER = "local@example.com"
+
+
+def docs(vectors):
+    return [{"text": f"chunk {i}", "embedding": list(vector)} for i, vector in enumerate(vectors)]
+
+
+@pytest.mark.unit
+class TestUserShard:
+
+    def test_top_k_matches_brute_force_cosine(self):
+        vectors = np.random.default_rng(0).normal(size=(50, 8))
+        query = np.random.default_rng(1).normal(size=8)
+        shard = UserShard(docs(vectors))
+
+        cosine = vectors @ query / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query))
+        expected = [f"chunk {i}" for i in np.argsort(-cosine)[:5]]
+        assert [doc["text"] for doc in shard.top_k(list(query), 5)] == expected
+
+    def test_chunks_without_embeddings_are_counted_but_not_returned(self):
+        shard = UserShard([{"text": "no vector"}, {"text": "zero", "embedding": [0.0, 0.0]}, {"text": "x", "embedding": [1.0, 0.0]}])
+
+        assert shard.chunks == 3
+        assert [doc["text"] for doc in shard.top_k([1.0, 0.0], 5)] == ["x", "zero"]
+
+    def test_empty_shard_returns_nothing(self):
+        assert UserShard([]).top_k([1.0, 0.0], 3) == []
+
+
+@pytest.mark.unit
+class TestLocalVectorIndex:
+
+    def test_least_recently_used_user_is_evicted(self):
+        index = LocalVectorIndex(max_users=2)
+        for user in ["a", "b"]:
+            index.put(user, UserShard([]))
+        index.get("a")
+        index.put("c", UserShard([]))
+
+        assert index.get("b") is None
+        assert index.get("a") is not None and index.get("c") is not None
+
+    def test_shard_with_stale_count_is_not_served(self):
+        index = LocalVectorIndex(max_users=2)
+        index.put(USER, UserShard(docs([[1.0, 0.0]])))
+
+        assert index.get(USER, chunks=1) is not None
+        assert index.get(USER, chunks=2) is None
+
+
+@pytest.mark.unit
+class TestLocalSearchBackend:
+
+    @pytest.fixture
+    def service(self, vector_store_service_factory):
+        service = vector_store_service_factory()
+        service.collection.find.side_effect = lambda query, projection: docs([[1.0, 0.0], [0.0, 1.0]])
+        service.catalog.find_one.return_value = {"_id": USER, "chunks_by_type": {"document": 2}}
+        service.embedding_fn.embed_query.return_value = [0.1, 0.9]
+        tenant_catalog.invalidate(USER)
+        local_vector_index.invalidate(USER)
+        with patch('app.services.ai_services.mongodb_vectorstore.VECTOR_SEARCH_BACKEND', "local"):
+            yield service
+        tenant_catalog.invalidate(USER)
+        local_vector_index.invalidate(USER)
+
+    def test_local_backend_skips_atlas_and_loads_shard_once(self, service):
+        assert [doc["text"] for doc in service.search("sleep", USER, top_k=1)] == ["chunk 1"]
+        service.search("sleep again", USER, top_k=1)
+
+        service.vector_store.similarity_search.assert_not_called()
+        service.collection.find.assert_called_once()
+
+    def test_new_chunks_invalidate_the_shard(self, service):
+        service.search("sleep", USER)
+        service._count_chunks(USER, MagicMock(value="document"), 1)
+        service.search("sleep", USER)
+
+        assert service.collection.find.call_count == 2
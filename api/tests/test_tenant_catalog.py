@@ -0,0 +1,92 @@
+import pytest
+from unittest.mock import MagicMock, patch
+from app.schemas.backend.documents import DocumentType
+from app.services.ai_services.tenant_catalog import TenantCatalogCache, tenant_catalog
+
+USER = "catalog@example.com"
+
+
+@pytest.mark.unit
+class TestTenantCatalogCache:
+
+    def test_entries_expire_after_ttl(self):
+        cache = TenantCatalogCache(ttl=60)
+        cache.put(USER, {"lab_report": 2})
+        assert cache.get(USER) == {"lab_report": 2}
+
+        with patch('app.services.ai_services.tenant_catalog.time.monotonic', return_value=float("inf")):
+            assert cache.get(USER) is None
+
+    def test_empty_tenants_are_not_cached(self):
+        cache = TenantCatalogCache(ttl=60)
+        cache.put(USER, {"document": 0})
+        assert cache.get(USER) is None
+
+
+@pytest.mark.unit
+class TestSearchUsesCatalog:
+
+    @pytest.fixture
+    def service(self, vector_store_service_factory):
+        service = vector_store_service_factory()
+        service.vector_store.similarity_search.return_value = []
+        tenant_catalog.invalidate(USER)
+        yield service
+        tenant_catalog.invalidate(USER)
+
+    def test_empty_tenant_skips_chunk_collection(self, service):
+        service.catalog.find_one.return_value = {"_id": USER, "chunks_by_type": {}}
+
+        assert service.search("glucose", USER) == []
+
+        service.collection.count_documents.assert_not_called()
+        service.collection.aggregate.assert_not_called()
+        service.vector_store.similarity_search.assert_not_called()
+
+    def test_counts_are_served_from_memory(self, service):
+        service.catalog.find_one.return_value = {"_id": USER, "chunks_by_type": {"lab_report": 4}}
+
+        service.search("glucose", USER)
+        service.search("cholesterol", USER)
+
+        service.catalog.find_one.assert_called_once()
+        service.collection.count_documents.assert_not_called()
+        assert service.vector_store.similarity_search.call_count == 2
+
+    def test_missing_entry_is_rebuilt_once_from_chunks(self, service):
+        service.catalog.find_one.return_value = None
+        service.collection.aggregate.return_value = [{"_id": "lab_report", "chunks": 3}]
+
+        service.search("glucose", USER)
+
+        service.catalog.update_one.assert_called_once_with(
+            {"_id": USER}, {"$setOnInsert": {"chunks_by_type": {"lab_report": 3}}}, upsert=True
+        )
+        assert tenant_catalog.get(USER) == {"lab_report": 3}
+
+    def test_delete_decrements_owner_counts(self, service):
+        tenant_catalog.put(USER, {"lab_report": 3})
+        service.collection.find_one.return_value = {"user_email": USER, "type": "lab_report"}
+        service.collection.delete_many.return_value = MagicMock(deleted_count=3)
+
+        assert service.delete_document_by_upload_id("u1") is True
+
+        service.catalog.update_one.assert_called_once_with({"_id": USER}, {"$inc": {"chunks_by_type.lab_report": -3}})
+        assert tenant_catalog.get(USER) is None
+
+    def test_first_add_for_existing_user_seeds_catalog_before_inserting(self, service):
+        calls = []
+        service.catalog.find_one.return_value = None
+        service.collection.aggregate.side_effect = lambda pipeline: calls.append("seed") or [{"_id": "lab_report", "chunks": 5}]
+        service.collection.insert_many.side_effect = lambda records, ordered: calls.append("insert")
+        service.collection.distinct.return_value = []
+        service.registry.find.return_value = []
+        service.embedding_fn = MagicMock()
+        service.embedding_fn.embed_documents.side_effect = lambda texts: [[0.5] for _ in texts]
+
+        service.add_document("Blood pressure 120/80.", USER, "visit.md", DocumentType.DOCUMENT, upload_id="u1")
+
+        assert calls == ["seed", "insert"]
+        updates = [call.args for call in service.catalog.update_one.call_args_list]
+        assert updates[0] == ({"_id": USER}, {"$setOnInsert": {"chunks_by_type": {"lab_report": 5}}})
+        assert updates[1] == ({"_id": USER}, {"$inc": {"chunks_by_type.document": 1}})
@@ -1,9 +1,11 @@
 from fastapi import FastAPI, HTTPException, UploadFile, File, Query
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Dict, Union
+from typing import Iterator, List, Dict, Union, Optional
 import logging
-from core import TextProcessor, PDFProcessor, Neo4jDatabase, VectorStore, agentic_context_retrieval, agentic_context_retrieval_stream
+from core import TextProcessor, PDFProcessor, ExtractionAccumulator, Neo4jDatabase, VectorStore, agentic_context_retrieval, agentic_context_retrieval_stream, get_agentic_context_retrieval, RetrievalTrace, IngestionJobStore, IngestionWorkerPool
+from core.processing.ingestion_jobs import JOB_QUEUED, JOB_RUNNING, JOB_COMPLETED, JOB_FAILED, CHUNK_PENDING, CHUNK_INDEXED, CHUNK_COMPLETED
+from core.processing.fingerprint import content_hash, shingle_sketch
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import SystemMessage, HumanMessage
 import os
@@ -12,13 +14,12 @@ from fastapi.responses import StreamingResponse
 import asyncio
 import tempfile
 import base64
+import json
+import hashlib
 from typing import Any
 
-# Add import for PDF processing
-try:
-    from unstructured.partition.pdf import partition_pdf
-except ImportError:
-    partition_pdf = None  # Will raise error if used without install
+# PDF processing; partition_pdf is None without the unstructured library
+from core.processing.pdf_partition import partition_pdf, iter_pdf_windows, windows_in_thread
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
@@ -57,6 +58,8 @@ class UploadResponse(BaseModel):
     relationships: int
     images: int = 0  # Add image count
 
+IMAGE_SUMMARY_UNAVAILABLE = "Image summary not available."
+
 def summarize_image_with_gemini(image_b64: str) -> str:
     """
     Use Gemini Vision to generate a summary/caption for a base64-encoded image.
@@ -73,84 +76,276 @@ def summarize_image_with_gemini(image_b64: str) -> str:
         return response.content.strip()
     except Exception as e:
         logging.error(f"Error summarizing image: {e}")
-        return "Image summary not available."
+        return IMAGE_SUMMARY_UNAVAILABLE
 
-@app.post("/upload", response_model=UploadResponse)
-async def upload_file(file: UploadFile = File(...)):
-    """Process an uploaded text or PDF file and store entities/relationships/images in the graph"""
-    try:
-        filename = file.filename or "uploaded_file"
-        content = await file.read()
-        ext = filename.split(".")[-1].lower()
-        entities, relationships, image_summaries = [], [], []
-        if ext == "txt":
-            text = content.decode('utf-8')
-            entities, relationships = processor.process_text(text)
-        elif ext == "pdf":
-            if partition_pdf is None:
-                raise HTTPException(status_code=500, detail="unstructured library not installed on server.")
-            # Save PDF to temp file
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-                tmp.write(content)
-                tmp_path = tmp.name
-            # Extract elements from PDF
-            output_path = tempfile.mkdtemp()
-            elements = partition_pdf(
-                filename=tmp_path,
-                extract_images_in_pdf=True,
-                infer_table_structure=True,
-                chunking_strategy="by_title",
-                max_characters=4000,
-                new_after_n_chars=3800,
-                combine_text_under_n_chars=2000,
-                extract_image_block_output_dir=output_path,
-            )
-            # Extract text and images
-            text_chunks = []
-            for e in elements:
-                if hasattr(e, 'text') and e.text:
-                    text_chunks.append(e.text)
-            # Process all text chunks
-            for chunk in text_chunks:
-                ents, rels = processor.process_text(chunk)
-                entities.extend(ents)
-                relationships.extend(rels)
-            # Extract images and create summaries
-            import os
-            image_files = [f for f in os.listdir(output_path) if f.lower().endswith((".png", ".jpg", ".jpeg"))]
-            for img_file in image_files:
-                img_path = os.path.join(output_path, img_file)
-                with open(img_path, "rb") as f:
-                    img_b64 = base64.b64encode(f.read()).decode('utf-8')
+class UploadJobResponse(BaseModel):
+    job_id: str
+    status: str
+    duplicate: bool = False  # The file was uploaded before; job_id is the earlier job
+
+# Uploads are ingested by background workers; jobs and their finished chunks are
+# kept in SQLite so they survive restarts and retries skip completed chunks
+job_store = IngestionJobStore(os.getenv("INGESTION_JOBS_DB", "ingestion_jobs.db"))
+# Images summarized at once per job; separate from text extraction so the two overlap
+IMAGE_SUMMARY_CONCURRENCY = int(os.getenv("IMAGE_SUMMARY_CONCURRENCY", "4"))
+
+def partition_upload(content: bytes, file_type: str, workdir: str) -> Iterator[List[tuple]]:
+    """
+    Split an uploaded file into ("text", chunk) and ("image", JSON {id, base64, hash})
+    chunks, yielding them a window of PDF pages at a time; temp files go in workdir
+    """
+    if file_type == "txt":
+        yield [("text", content.decode('utf-8'))]
+        return
+    for text_chunks, images in iter_pdf_windows(content, workdir):
+        yield [("text", text) for text in text_chunks] + [("image", json.dumps(image)) for image in images]
+
+def image_hash(image: dict) -> str:
+    """Content hash of an image chunk's payload"""
+    return image.get("hash") or hashlib.sha256(base64.b64decode(image["base64"])).hexdigest()
+
+def write_ingest_results(entities: List[dict], relationships: List[dict], images: List[tuple]) -> None:
+    """Store extracted entities, relationships and summarized images in Neo4j and the vector store"""
+    vector_nodes = []
+    for image, image_summary in images:
+        # Store in graph with summary
+        db.create_entity("Image", image["id"], {"base64": image["base64"], "summary": image_summary})
+        # Store in vector store using summary
+        vector_nodes.append((image["id"], image_summary))
+    for entity in entities:
+        properties = {}
+        if entity.get('description'):
+            properties['description'] = entity['description']
+        db.create_entity(entity['type'], entity['name'], properties)
+        node_id = entity['name']
+        node_text = entity.get('description', entity['name'])
+        vector_nodes.append((node_id, node_text))
+    # One batched embedding pass and one FAISS index write for the whole upload;
+    # nodes written by the fast tier get their enriched vectors in place
+    vector_store.upsert_nodes(vector_nodes)
+    for rel in relationships:
+        db.create_relationship(rel['from'], rel['type'], rel['to'])
+
+async def reuse_near_duplicate_results(job_id: str, chunks: List[dict]) -> None:
+    """
+    If the tenant already ingested an earlier version of this document, complete
+    the text chunks that are unchanged from it with its results, so only the
+    chunks that differ are extracted.
+    """
+    sketch = shingle_sketch(" ".join(chunk["payload"] for chunk in chunks if chunk["kind"] == "text"))
+    await asyncio.to_thread(job_store.set_document_sketch, job_id, sketch)
+    previous_job_id = await asyncio.to_thread(job_store.find_near_duplicate, job_id, sketch)
+    if previous_job_id is None:
+        return
+    previous_results = await asyncio.to_thread(job_store.get_completed_results, previous_job_id, "text")
+    reused = 0
+    for chunk in chunks:
+        result = previous_results.get(chunk["payload"]) if chunk["kind"] == "text" else None
+        if result is not None:
+            await asyncio.to_thread(job_store.complete_chunk, job_id, chunk["chunk_index"], result)
+            chunk["status"], chunk["result"] = CHUNK_COMPLETED, result
+            reused += 1
+    logging.info(f"Job {job_id} is a version of job {previous_job_id}; reused {reused} unchanged chunks")
+
+def accumulate_text_results(chunks: List[dict]) -> ExtractionAccumulator:
+    """One row per entity and relationship across the text chunks that have a result"""
+    accumulator = ExtractionAccumulator()
+    for chunk in chunks:
+        if chunk["kind"] == "text" and chunk["result"] is not None:
+            accumulator.add_entities(chunk["result"]["entities"])
+            accumulator.add_relationships(chunk["result"]["relationships"])
+    return accumulator
+
+async def run_ingestion_job(job_id: str) -> dict:
+    """Run the tier the job was claimed for: the fast tier for a new job, otherwise LLM enrichment"""
+    job = await asyncio.to_thread(job_store.get_job, job_id)
+    if job["status"] == JOB_RUNNING:
+        return await index_ingestion_job(job_id, job)
+    return await enrich_ingestion_job(job_id)
+
+async def index_text_chunks(job_id: str, chunks: List[dict]) -> None:
+    """Give the text chunks that have no result yet their spaCy-only entities"""
+    pending = [chunk for chunk in chunks if chunk["kind"] == "text" and chunk["status"] == CHUNK_PENDING]
+    if not pending:
+        return
+    local_entities = await asyncio.to_thread(processor.extract_local_entities, [chunk["payload"] for chunk in pending])
+    for chunk, entities in zip(pending, local_entities):
+        chunk["status"], chunk["result"] = CHUNK_INDEXED, {"entities": entities, "relationships": []}
+        await asyncio.to_thread(job_store.complete_chunk, job_id, chunk["chunk_index"], chunk["result"], CHUNK_INDEXED)
+
+async def index_ingestion_job(job_id: str, job: dict) -> dict:
+    """
+    Fast tier: partition the file and write spaCy-only entities for every text
+    chunk, with their embeddings, so the document is searchable in seconds.
+    The worker pool then queues the job for enrichment.
+    """
+    if job["partitioned_at"] is None:
+        await asyncio.to_thread(job_store.set_stage, job_id, "partitioning")
+        content = await asyncio.to_thread(job_store.get_content, job_id)
+        next_index = 0
+        # The window's temp files are removed as it finishes, the directory when partitioning ends
+        with tempfile.TemporaryDirectory() as workdir:
+            async with windows_in_thread(partition_upload(content, job["file_type"], workdir)) as windows:
+                async for window_chunks in windows:
+                    await asyncio.to_thread(job_store.add_chunks, job_id, window_chunks, next_index)
+                    # Index this window while the next one is being partitioned
+                    window = await asyncio.to_thread(job_store.get_chunks, job_id, next_index, next_index + len(window_chunks))
+                    await index_text_chunks(job_id, window)
+                    next_index += len(window_chunks)
+        await asyncio.to_thread(job_store.mark_partitioned, job_id)
+        chunks = await asyncio.to_thread(job_store.get_chunks, job_id)
+        await reuse_near_duplicate_results(job_id, chunks)
+    else:
+        chunks = await asyncio.to_thread(job_store.get_chunks, job_id)
+
+    await asyncio.to_thread(job_store.set_stage, job_id, "indexing")
+    await index_text_chunks(job_id, chunks)
+    accumulator = accumulate_text_results(chunks)
+    # Neo4j writes and encoding block, so they run off the event loop; VectorStore
+    # locks FAISS against searches while it changes
+    await asyncio.to_thread(write_ingest_results, accumulator.entities, accumulator.relationships, [])
+    return UploadResponse(
+        entities=len(accumulator.entities),
+        relationships=len(accumulator.relationships)
+    ).model_dump()
+
+async def enrich_ingestion_job(job_id: str) -> dict:
+    """
+    Enrichment tier: LLM-extract every chunk not completed by an earlier attempt and
+    summarize the images, then write the results over the fast tier's in place
+    """
+    chunks = await asyncio.to_thread(job_store.get_chunks, job_id)
+    await asyncio.to_thread(job_store.set_stage, job_id, "extracting")
+    image_semaphore = asyncio.Semaphore(IMAGE_SUMMARY_CONCURRENCY)
+
+    async def complete(chunk: dict, result: dict) -> None:
+        await asyncio.to_thread(job_store.complete_chunk, job_id, chunk["chunk_index"], result)
+        chunk["status"], chunk["result"] = CHUNK_COMPLETED, result
+
+    async def process_text_chunks(text_chunks: List[dict]) -> None:
+        """Extract the text chunks together, so spaCy parses them in batches and packs share LLM requests"""
+        async def complete_text(i: int, result: tuple) -> None:
+            entities, relationships = result
+            await complete(text_chunks[i], {"entities": entities, "relationships": relationships})
+
+        await processor.aprocess_texts([chunk["payload"] for chunk in text_chunks], on_result=complete_text)
+
+    async def process_image_group(image_chunks: List[dict]) -> None:
+        """Summarize one distinct image once, for every chunk carrying it"""
+        image = json.loads(image_chunks[0]["payload"])
+        content_hash = image_hash(image)
+        summary = await asyncio.to_thread(job_store.get_image_summary, content_hash)
+        if summary is None:
+            async with image_semaphore:
                 # Summarize the image using Gemini Vision
-                image_summary = summarize_image_with_gemini(img_b64)
-                image_id = f"image_{img_file}"
-                # Store in graph with summary
-                db.create_entity("Image", image_id, {"base64": img_b64, "summary": image_summary})
-                # Store in vector store using summary
-                vector_store.add_node(image_id, image_summary)
-                image_summaries.append((image_id, img_b64, image_summary))
-        else:
-            raise HTTPException(status_code=400, detail="Unsupported file type. Please upload a .txt or .pdf file.")
-        # Store in Neo4j and VectorStore (for text entities)
-        for entity in entities:
-            properties = {}
-            if entity.get('description'):
-                properties['description'] = entity['description']
-            db.create_entity(entity['type'], entity['name'], properties)
-            node_id = entity['name']
-            node_text = entity.get('description', entity['name'])
-            vector_store.add_node(node_id, node_text)
-        for rel in relationships:
-            db.create_relationship(rel['from'], rel['type'], rel['to'])
-        return UploadResponse(
-            entities=len(entities),
-            relationships=len(relationships),
-            images=len(image_summaries)
-        )
-    except Exception as e:
-        logging.error(f"Error processing upload: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+                summary = await asyncio.to_thread(summarize_image_with_gemini, image["base64"])
+            if summary != IMAGE_SUMMARY_UNAVAILABLE:
+                await asyncio.to_thread(job_store.put_image_summary, content_hash, summary)
+        for chunk in image_chunks:
+            await complete(chunk, {"summary": summary})
+
+    pending = [chunk for chunk in chunks if chunk["status"] != CHUNK_COMPLETED]
+    # Identical images (logos, page headers) are summarized once per content hash
+    pending_images: Dict[str, List[dict]] = {}
+    for chunk in pending:
+        if chunk["kind"] == "image":
+            pending_images.setdefault(image_hash(json.loads(chunk["payload"])), []).append(chunk)
+    pending_texts = [chunk for chunk in pending if chunk["kind"] == "text"]
+    tasks = [process_text_chunks(pending_texts)] if pending_texts else []
+    tasks += [process_image_group(group) for group in pending_images.values()]
+    # Let every chunk finish before failing the job, so a retry only redoes the ones that failed
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    errors = [result for result in results if isinstance(result, Exception)]
+    if errors:
+        failed = sum(chunk["status"] != CHUNK_COMPLETED for chunk in pending)
+        raise RuntimeError(f"{failed} of {len(chunks)} chunks failed: {errors[0]}")
+
+    await asyncio.to_thread(job_store.set_stage, job_id, "writing")
+    accumulator = accumulate_text_results(chunks)
+    # One Image node per distinct image
+    images: Dict[str, tuple] = {}
+    for chunk in chunks:
+        if chunk["kind"] == "image":
+            image = json.loads(chunk["payload"])
+            images.setdefault(image_hash(image), (image, chunk["result"]["summary"]))
+    images = list(images.values())
+    await asyncio.to_thread(write_ingest_results, accumulator.entities, accumulator.relationships, images)
+    return UploadResponse(
+        entities=len(accumulator.entities),
+        relationships=len(accumulator.relationships),
+        images=len(images)
+    ).model_dump()
+
+ingestion_workers = IngestionWorkerPool(job_store, run_ingestion_job, workers=int(os.getenv("INGESTION_WORKERS", "2")))
+
+@app.on_event("startup")
+async def start_ingestion_workers():
+    ingestion_workers.start()
+
+@app.on_event("shutdown")
+async def stop_ingestion_workers():
+    await ingestion_workers.stop()
+
+@app.post("/upload", response_model=UploadJobResponse)
+async def upload_file(file: UploadFile = File(...), tenant: str = Query("default")):
+    """
+    Queue an uploaded text or PDF file for ingestion into the graph and return
+    its job id right away. Follow progress at /upload/jobs/{job_id}/events; the
+    document is searchable once the job is indexed, before LLM enrichment.
+    A file the tenant already uploaded is not ingested again: the earlier job
+    is returned instead, with duplicate set.
+    """
+    filename = file.filename or "uploaded_file"
+    ext = filename.split(".")[-1].lower()
+    if ext not in ("txt", "pdf"):
+        raise HTTPException(status_code=400, detail="Unsupported file type. Please upload a .txt or .pdf file.")
+    if ext == "pdf" and partition_pdf is None:
+        raise HTTPException(status_code=500, detail="unstructured library not installed on server.")
+    content = await file.read()
+    file_hash = content_hash(content)
+    job_id, created = await asyncio.to_thread(job_store.create_document_job, tenant, file_hash, filename, ext, content)
+    if not created:
+        existing = await asyncio.to_thread(job_store.get_job, job_id)
+        return UploadJobResponse(job_id=job_id, status=existing["status"], duplicate=True)
+    ingestion_workers.notify()
+    return UploadJobResponse(job_id=job_id, status=JOB_QUEUED)
+
+@app.get("/upload/jobs/{job_id}")
+async def get_upload_job(job_id: str):
+    """Status, stage, chunk progress and (once completed) result counts of an upload job"""
+    job = await asyncio.to_thread(job_store.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Upload job not found")
+    return job
+
+@app.get("/upload/jobs/{job_id}/events")
+async def upload_job_events(job_id: str):
+    """Server-sent events with the job's status whenever it changes, until it completes or fails"""
+    if await asyncio.to_thread(job_store.get_job, job_id) is None:
+        raise HTTPException(status_code=404, detail="Upload job not found")
+
+    async def event_generator():
+        last_event = None
+        while True:
+            job = await asyncio.to_thread(job_store.get_job, job_id)
+            event = json.dumps(job)
+            if event != last_event:
+                yield f"data: {event}\n\n"
+                last_event = event
+            if job["status"] in (JOB_COMPLETED, JOB_FAILED):
+                break
+            await asyncio.sleep(0.5)
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
+
+@app.post("/upload/jobs/{job_id}/retry", response_model=UploadJobResponse)
+async def retry_upload_job(job_id: str):
+    """Queue a failed upload job again; chunks it already extracted are not reprocessed"""
+    if not await asyncio.to_thread(job_store.retry_job, job_id):
+        if await asyncio.to_thread(job_store.get_job, job_id) is None:
+            raise HTTPException(status_code=404, detail="Upload job not found")
+        raise HTTPException(status_code=409, detail="Only failed upload jobs can be retried")
+    ingestion_workers.notify()
+    return UploadJobResponse(job_id=job_id, status=JOB_QUEUED)
 
 # Initialize Gemini model
 llm = ChatGoogleGenerativeAI(
@@ -159,12 +354,22 @@ llm = ChatGoogleGenerativeAI(
     convert_system_message_to_human=True  # Add this parameter to handle system messages
 )
 
+# Compile the retrieval workflow once at startup instead of on every request;
+# the text processor's flash model doubles as the depth classifier's fallback
+get_agentic_context_retrieval(llm, db, vector_store, small_llm=processor.llm)
+
 class QueryRequest(BaseModel):
     question: str
+    max_depth: Optional[int] = None  # Picked from the query's complexity if not set
+    deadline_ms: Optional[int] = None  # Latency budget for context retrieval, unbounded if not set
+    debug: bool = False  # Include per-stage retrieval timings in the response
 
 class QueryResponse(BaseModel):
     answer: str
     context: List[Union[str, Dict]]
+    budget: Optional[Dict] = None
+    cached: bool = False
+    trace: Optional[Dict] = None
 
 class GraphData(BaseModel):
     nodes: List[Dict]
@@ -231,12 +436,19 @@ async def query(request: QueryRequest):
         logging.debug(f"Processing question: {question}")
         
         # Use new agentic_context_retrieval for context
-        full_context = await agentic_context_retrieval(question, llm, db, vector_store)
+        agent = get_agentic_context_retrieval(llm, db, vector_store)
+        trace = RetrievalTrace() if request.debug else None
+        retrieval = await agent.retrieve(question, request.max_depth, request.deadline_ms, trace)
+        full_context = retrieval["context"]
+        trace_report = {**retrieval["trace"], "otel": trace.to_otel()} if trace else None
 
         if not full_context:
             return QueryResponse(
                 answer="I don't have enough information to answer that question.",
-                context=[]
+                context=[],
+                budget=retrieval["budget"],
+                cached=retrieval["cached"],
+                trace=trace_report
             )
 
         # Print all explored nodes with details before sending response
@@ -325,7 +537,10 @@ Context:
 
         return QueryResponse(
             answer=response.content,
-            context=full_context
+            context=full_context,
+            budget=retrieval["budget"],
+            cached=retrieval["cached"],
+            trace=trace_report
         )
         
     except Exception as e:
@@ -333,13 +548,25 @@ Context:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/query-stream")
-async def query_stream(question: str = Query(...)):
+async def query_stream(
+    question: str = Query(...),
+    max_depth: Optional[int] = Query(None),
+    deadline_ms: Optional[int] = Query(None),
+    debug: bool = Query(False)
+):
     async def event_generator():
-        async for step in agentic_context_retrieval_stream(question, llm, db, vector_store):
+        trace = RetrievalTrace() if debug else None
+        async for step in agentic_context_retrieval_stream(question, llm, db, vector_store, max_depth, deadline_ms, trace):
             yield f"data: {step}\n\n"
             await asyncio.sleep(0.01)
     return StreamingResponse(event_generator(), media_type="text/event-stream")
 
+@app.get("/retrieval-cache/stats")
+async def retrieval_cache_stats():
+    """Hit/miss statistics of the semantic query cache in front of agentic retrieval"""
+    query_cache = get_agentic_context_retrieval(llm, db, vector_store).query_cache
+    return query_cache.stats() if query_cache else {}
+
 @app.get("/graph", response_model=GraphData)
 async def get_graph_data():
     import logging
@@ -386,6 +613,10 @@ async def sync_vector_store():
     """Rebuild the FAISS vector store from all current Neo4j nodes."""
     try:
         vector_store.sync_from_graph(db)
+        # Retrievals cached before the resync may have seen different vector hits
+        query_cache = get_agentic_context_retrieval(llm, db, vector_store).query_cache
+        if query_cache:
+            query_cache.invalidate()
         return {"message": "Vector store synced from graph successfully."}
     except Exception as e:
         logging.error(f"Error syncing vector store: {str(e)}")
@@ -3,11 +3,14 @@
 # Text and PDF processing
 from .processing.text_processor import TextProcessor
 from .processing.pdf_processor import PDFProcessor
+from .processing.accumulator import ExtractionAccumulator
+from .processing.ingestion_jobs import IngestionJobStore, IngestionWorkerPool
 from .processing.prompts import *
 
 # Agentic context retrieval and vector store
-from .retrieval.agentic_context_retrieval import AgenticContextRetrieval, agentic_context_retrieval, agentic_context_retrieval_stream
+from .retrieval.agentic_context_retrieval import AgenticContextRetrieval, agentic_context_retrieval, agentic_context_retrieval_stream, get_agentic_context_retrieval
 from .retrieval.vector_store import VectorStore
+from .retrieval.tracing import RetrievalTrace
 
 # Graph database
 from .db.graph_db import Neo4jDatabase
@@ -7,6 +7,9 @@ class Neo4jDatabase:
             NEO4J_URI,
             auth=(NEO4J_USER, NEO4J_PASSWORD)
         )
+        # Incremented on every write made through this instance, so caches of
+        # graph reads can tell when they are stale
+        self.version: int = 0
 
     def close(self) -> None:
         self.driver.close()
@@ -49,6 +52,7 @@ class Neo4jDatabase:
             } for record in result]
 
     def create_entity(self, entity_type: str, name: str, properties: dict = None) -> None:
+        self.version += 1
         with self.driver.session() as session:
             properties = properties or {}
             cypher_query = (
@@ -59,6 +63,7 @@ class Neo4jDatabase:
             return session.run(cypher_query, name=name, properties=properties)
 
     def create_relationship(self, from_entity: str, relationship_type: str, to_entity: str, properties: dict = None) -> None:
+        self.version += 1
         with self.driver.session() as session:
             properties = properties or {}
             cypher_query = (
@@ -168,5 +173,6 @@ class Neo4jDatabase:
         return f"{start_name} {phrase} {end_name}"
 
     def clear_database(self) -> None:
+        self.version += 1
         with self.driver.session() as session:
             session.run("MATCH (n) DETACH DELETE n") 
\ No newline at end of file
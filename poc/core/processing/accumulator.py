@@ -0,0 +1,48 @@
+from typing import Dict, Iterable, List, Tuple
+
+
+class ExtractionAccumulator:
+    """
+    Collects extracted entities and relationships with one row per unique fact.
+    Entities are keyed by lowercase name and relationships by (from, type, to);
+    when an entity is seen again, its description is merged into the kept one.
+    """
+
+    # Merged descriptions stop growing past this, so frequent entities stay embeddable
+    MAX_DESCRIPTION_CHARS = 2000
+
+    def __init__(self) -> None:
+        self._entities: Dict[str, dict] = {}
+        self._relationships: Dict[Tuple[str, str, str], dict] = {}
+
+    @property
+    def entities(self) -> List[dict]:
+        return list(self._entities.values())
+
+    @property
+    def relationships(self) -> List[dict]:
+        return list(self._relationships.values())
+
+    def add_entities(self, entities: Iterable[dict]) -> None:
+        for entity in entities:
+            key = entity["name"].lower()
+            kept = self._entities.get(key)
+            if kept is None:
+                self._entities[key] = dict(entity)
+            else:
+                self._merge_description(kept, entity.get("description"))
+
+    def add_relationships(self, relationships: Iterable[dict]) -> None:
+        for rel in relationships:
+            key = (rel["from"], rel["type"], rel["to"])
+            if key not in self._relationships:
+                self._relationships[key] = dict(rel)
+
+    def _merge_description(self, kept: dict, description: str) -> None:
+        if not description:
+            return
+        current = kept.get("description")
+        if not current:
+            kept["description"] = description
+        elif description not in current and len(current) < self.MAX_DESCRIPTION_CHARS:
+            kept["description"] = f"{current} {description}"
@@ -0,0 +1,420 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+from uuid import uuid4
+
+from core.processing.fingerprint import NEAR_DUPLICATE_THRESHOLD, sketch_similarity
+
+logger = logging.getLogger(__name__)
+
+# Job lifecycle; "stage" records finer-grained progress while a job is running.
+# A job is worked on twice: the fast tier (queued -> running -> indexed) makes the
+# document searchable, then enrichment (indexed -> enriching -> completed) upgrades it.
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_INDEXED = "indexed"
+JOB_ENRICHING = "enriching"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+# A running or enriching job not touched for this long is taken to be abandoned by
+# its process; workers touch the jobs they hold well within it
+JOB_LEASE_SECONDS = int(os.getenv("INGESTION_JOB_LEASE_SECONDS", "300"))
+
+CHUNK_PENDING = "pending"
+CHUNK_INDEXED = "indexed"
+CHUNK_COMPLETED = "completed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    file_type TEXT NOT NULL,
+    content BLOB NOT NULL,
+    status TEXT NOT NULL,
+    stage TEXT,
+    error TEXT,
+    result TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    partitioned_at REAL,
+    searchable_at REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS job_chunks (
+    job_id TEXT NOT NULL,
+    chunk_index INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    PRIMARY KEY (job_id, chunk_index)
+);
+CREATE TABLE IF NOT EXISTS documents (
+    tenant TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    job_id TEXT NOT NULL,
+    sketch TEXT,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (tenant, content_hash)
+);
+CREATE INDEX IF NOT EXISTS documents_job ON documents (job_id);
+CREATE TABLE IF NOT EXISTS image_summaries (
+    content_hash TEXT PRIMARY KEY,
+    summary TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+# Columns added to jobs after its first release, created on databases that predate them
+ADDED_JOB_COLUMNS = {"searchable_at": "REAL", "partitioned_at": "REAL"}
+
+
+class IngestionJobStore:
+    """
+    Durable record of upload ingestion jobs in SQLite. A job keeps the uploaded
+    file and, once partitioned, one row per chunk with its extraction result,
+    so a retried job only reprocesses the chunks that never completed. Chunks
+    first get a fast-tier result (indexed) and then their enriched one (completed).
+    """
+
+    def __init__(self, path: str = "ingestion_jobs.db") -> None:
+        self.path = path
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, column_type in ADDED_JOB_COLUMNS.items():
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+            if "partitioned_at" not in columns:
+                # Older jobs recorded all of their chunks in one go
+                conn.execute("UPDATE jobs SET partitioned_at = updated_at WHERE id IN (SELECT job_id FROM job_chunks)")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # A connection per call keeps the store safe to use from worker threads
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def create_job(self, filename: str, file_type: str, content: bytes) -> str:
+        job_id = uuid4().hex
+        with self._connect() as conn:
+            self._insert_job(conn, job_id, filename, file_type, content)
+        return job_id
+
+    def _insert_job(self, conn: sqlite3.Connection, job_id: str, filename: str, file_type: str, content: bytes) -> None:
+        now = time.time()
+        conn.execute(
+            "INSERT INTO jobs (id, filename, file_type, content, status, stage, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, filename, file_type, content, JOB_QUEUED, JOB_QUEUED, now, now)
+        )
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Job status and chunk progress, without the file content"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, filename, file_type, status, stage, error, result, attempts, partitioned_at, searchable_at, created_at, updated_at "
+                "FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            total, indexed, completed = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(status != ?), 0), COALESCE(SUM(status = ?), 0) FROM job_chunks WHERE job_id = ?",
+                (CHUNK_PENDING, CHUNK_COMPLETED, job_id)
+            ).fetchone()
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["total_chunks"] = total
+        job["indexed_chunks"] = indexed
+        job["completed_chunks"] = completed
+        return job
+
+    def get_content(self, job_id: str) -> bytes:
+        with self._connect() as conn:
+            return conn.execute("SELECT content FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+
+    def claim_next(self) -> Optional[Tuple[str, int]]:
+        """
+        Take the oldest queued job for its fast tier (marking it running) or, when none
+        is queued, the oldest indexed job for enrichment (marking it enriching). Returns
+        its id and attempt number, or None if there is no work. The attempt number is
+        the claim: touching, completing or failing the job needs it to still match.
+        """
+        while True:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT id, status FROM jobs WHERE status IN (?, ?) ORDER BY status = ? DESC, created_at LIMIT 1",
+                    (JOB_QUEUED, JOB_INDEXED, JOB_QUEUED)
+                ).fetchone()
+                if row is None:
+                    return None
+                status = JOB_RUNNING if row["status"] == JOB_QUEUED else JOB_ENRICHING
+                # Only one worker, in any process, sees the job still in its old status
+                claimed = conn.execute(
+                    "UPDATE jobs SET status = ?, stage = ?, attempts = attempts + 1, error = NULL, updated_at = ? WHERE id = ? AND status = ?",
+                    (status, status, time.time(), row["id"], row["status"])
+                ).rowcount
+                if claimed:
+                    attempt = conn.execute("SELECT attempts FROM jobs WHERE id = ?", (row["id"],)).fetchone()["attempts"]
+            if claimed:
+                return row["id"], attempt
+
+    def set_stage(self, job_id: str, stage: str) -> None:
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET stage = ?, updated_at = ? WHERE id = ?", (stage, time.time(), job_id))
+
+    def complete_job(self, job_id: str, attempt: int, result: Dict[str, Any]) -> bool:
+        """
+        Finish the job's current tier: a fast-tier job becomes indexed (and queued for
+        enrichment), an enriching one completed. Returns False, leaving the job alone,
+        if this attempt's claim was lost, e.g. the job was requeued after its lease ran out.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            updated = conn.execute(
+                "UPDATE jobs SET status = ?, stage = ?, result = ?, searchable_at = ?, updated_at = ? "
+                "WHERE id = ? AND attempts = ? AND status = ?",
+                (JOB_INDEXED, JOB_INDEXED, json.dumps(result), now, now, job_id, attempt, JOB_RUNNING)
+            ).rowcount
+            if not updated:
+                updated = conn.execute(
+                    "UPDATE jobs SET status = ?, stage = ?, result = ?, updated_at = ? "
+                    "WHERE id = ? AND attempts = ? AND status = ?",
+                    (JOB_COMPLETED, JOB_COMPLETED, json.dumps(result), now, job_id, attempt, JOB_ENRICHING)
+                ).rowcount
+        return updated > 0
+
+    def fail_job(self, job_id: str, attempt: int, error: str) -> bool:
+        """Mark the job failed; returns False, leaving it alone, if this attempt's claim was lost"""
+        with self._connect() as conn:
+            updated = conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ? AND attempts = ? AND status IN (?, ?)",
+                (JOB_FAILED, error, time.time(), job_id, attempt, JOB_RUNNING, JOB_ENRICHING)
+            ).rowcount
+        return updated > 0
+
+    def retry_job(self, job_id: str) -> bool:
+        """
+        Queue a failed job again, for enrichment only if it was already searchable; its
+        completed chunks are kept. Returns False if the job isn't failed.
+        """
+        with self._connect() as conn:
+            updated = conn.execute(
+                "UPDATE jobs SET status = CASE WHEN searchable_at IS NULL THEN ? ELSE ? END, "
+                "stage = CASE WHEN searchable_at IS NULL THEN ? ELSE ? END, updated_at = ? WHERE id = ? AND status = ?",
+                (JOB_QUEUED, JOB_INDEXED, JOB_QUEUED, JOB_INDEXED, time.time(), job_id, JOB_FAILED)
+            ).rowcount
+        return updated > 0
+
+    def touch_job(self, job_id: str, attempt: int) -> None:
+        """Renew the lease of a job this process is still working on"""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET updated_at = ? WHERE id = ? AND attempts = ? AND status IN (?, ?)",
+                (time.time(), job_id, attempt, JOB_RUNNING, JOB_ENRICHING)
+            )
+
+    def requeue_interrupted(self, stale_after: float = JOB_LEASE_SECONDS) -> int:
+        """
+        Queue jobs left running or enriching by a process that crashed or restarted,
+        i.e. those whose lease ran out; jobs a live worker holds are left alone
+        """
+        now = time.time()
+        cutoff = now - stale_after
+        with self._connect() as conn:
+            requeued = conn.execute(
+                "UPDATE jobs SET status = ?, stage = ?, updated_at = ? WHERE status = ? AND updated_at < ?",
+                (JOB_QUEUED, JOB_QUEUED, now, JOB_RUNNING, cutoff)
+            ).rowcount
+            return requeued + conn.execute(
+                "UPDATE jobs SET status = ?, stage = ?, updated_at = ? WHERE status = ? AND updated_at < ?",
+                (JOB_INDEXED, JOB_INDEXED, now, JOB_ENRICHING, cutoff)
+            ).rowcount
+
+    def add_chunks(self, job_id: str, chunks: List[Tuple[str, str]], start: int = 0) -> None:
+        """
+        Record a job's (kind, payload) chunks, numbered from start so a file can be
+        added a window at a time; chunks already recorded under an index are kept
+        """
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO job_chunks (job_id, chunk_index, kind, payload, status) VALUES (?, ?, ?, ?, ?)",
+                [(job_id, i, kind, payload, CHUNK_PENDING) for i, (kind, payload) in enumerate(chunks, start)]
+            )
+
+    def mark_partitioned(self, job_id: str) -> None:
+        """Record that all of the job's chunks have been added"""
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET partitioned_at = ?, updated_at = ? WHERE id = ?", (time.time(), time.time(), job_id))
+
+    def get_chunks(self, job_id: str, start: int = 0, stop: Optional[int] = None) -> List[Dict[str, Any]]:
+        """The job's chunks with chunk_index in [start, stop), all of them by default"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT chunk_index, kind, payload, status, result FROM job_chunks "
+                "WHERE job_id = ? AND chunk_index >= ? AND chunk_index < COALESCE(?, chunk_index + 1) ORDER BY chunk_index",
+                (job_id, start, stop)
+            ).fetchall()
+        chunks = [dict(row) for row in rows]
+        for chunk in chunks:
+            chunk["result"] = json.loads(chunk["result"]) if chunk["result"] else None
+        return chunks
+
+    def complete_chunk(self, job_id: str, chunk_index: int, result: Any, status: str = CHUNK_COMPLETED) -> None:
+        """Record a chunk's result; status=CHUNK_INDEXED for a fast-tier result that enrichment will replace"""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE job_chunks SET status = ?, result = ? WHERE job_id = ? AND chunk_index = ?",
+                (status, json.dumps(result), job_id, chunk_index)
+            )
+            conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time(), job_id))
+
+    def create_document_job(self, tenant: str, content_hash: str, filename: str, file_type: str, content: bytes) -> Tuple[str, bool]:
+        """
+        Create a job for a tenant's upload unless the same file already has one that
+        didn't fail. Returns (job_id, created); job_id is the existing job when not
+        created. The registry upsert is the check, so concurrent identical uploads
+        create one job between them.
+        """
+        job_id = uuid4().hex
+        with self._connect() as conn:
+            registered = conn.execute(
+                "INSERT INTO documents (tenant, content_hash, job_id, created_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (tenant, content_hash) DO UPDATE SET job_id = excluded.job_id, sketch = NULL, created_at = excluded.created_at "
+                "WHERE IFNULL((SELECT status FROM jobs WHERE id = documents.job_id), ?) = ?",
+                (tenant, content_hash, job_id, time.time(), JOB_FAILED, JOB_FAILED)
+            ).rowcount
+            if not registered:
+                existing = conn.execute(
+                    "SELECT job_id FROM documents WHERE tenant = ? AND content_hash = ?", (tenant, content_hash)
+                ).fetchone()
+                return existing["job_id"], False
+            self._insert_job(conn, job_id, filename, file_type, content)
+        return job_id, True
+
+    def set_document_sketch(self, job_id: str, sketch: List[int]) -> None:
+        with self._connect() as conn:
+            conn.execute("UPDATE documents SET sketch = ? WHERE job_id = ?", (json.dumps(sketch), job_id))
+
+    def find_near_duplicate(self, job_id: str, sketch: List[int]) -> Optional[str]:
+        """Most similar completed document of the same tenant as job_id, if one is similar enough"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT d.job_id, d.sketch FROM documents d "
+                "JOIN documents this ON this.job_id = ? AND d.tenant = this.tenant "
+                "JOIN jobs j ON j.id = d.job_id "
+                "WHERE d.job_id != ? AND d.sketch IS NOT NULL AND j.status = ?",
+                (job_id, job_id, JOB_COMPLETED)
+            ).fetchall()
+        best_job_id, best_similarity = None, NEAR_DUPLICATE_THRESHOLD
+        for row in rows:
+            similarity = sketch_similarity(sketch, json.loads(row["sketch"]))
+            if similarity >= best_similarity:
+                best_job_id, best_similarity = row["job_id"], similarity
+        return best_job_id
+
+    def get_completed_results(self, job_id: str, kind: str) -> Dict[str, Any]:
+        """Completed chunk results of a job keyed by chunk payload, for reuse by an edited version of it"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT payload, result FROM job_chunks WHERE job_id = ? AND kind = ? AND status = ?",
+                (job_id, kind, CHUNK_COMPLETED)
+            ).fetchall()
+        return {row["payload"]: json.loads(row["result"]) for row in rows}
+
+    def get_image_summary(self, content_hash: str) -> Optional[str]:
+        """Summary of an image with this content hash from any earlier upload, if there is one"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT summary FROM image_summaries WHERE content_hash = ?", (content_hash,)).fetchone()
+        return row["summary"] if row else None
+
+    def put_image_summary(self, content_hash: str, summary: str) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO image_summaries (content_hash, summary, created_at) VALUES (?, ?, ?)",
+                (content_hash, summary, time.time())
+            )
+
+
+class IngestionWorkerPool:
+    """
+    Runs queued ingestion jobs on a fixed number of asyncio workers.
+    handler(job_id) does the work of the job's current tier (its status says
+    which: running or enriching) and returns the job's result; an exception
+    marks the job failed so it can be retried. Fast-tier work is claimed before
+    any enrichment, so new uploads become searchable without waiting behind it.
+    """
+
+    def __init__(self, store: IngestionJobStore, handler: Callable[[str], Awaitable[Dict[str, Any]]], workers: int = 2) -> None:
+        self.store = store
+        self.handler = handler
+        self.workers = workers
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        self._requeue_interrupted()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    def _requeue_interrupted(self) -> None:
+        requeued = self.store.requeue_interrupted()
+        if requeued:
+            logger.info(f"Requeued {requeued} interrupted ingestion jobs")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self) -> None:
+        """Wake idle workers after a job was queued"""
+        self._wakeup.set()
+
+    async def _heartbeat(self, job_id: str, attempt: int) -> None:
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            await asyncio.to_thread(self.store.touch_job, job_id, attempt)
+
+    async def _work(self) -> None:
+        while True:
+            # Cleared before claiming, so a job queued while the claim runs still wakes us
+            self._wakeup.clear()
+            claimed = await asyncio.to_thread(self.store.claim_next)
+            if claimed is None:
+                try:
+                    # Poll now and then too, in case a job was queued by another process
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=5)
+                except asyncio.TimeoutError:
+                    # and pick up jobs whose process died since this one started
+                    await asyncio.to_thread(self._requeue_interrupted)
+                continue
+            job_id, attempt = claimed
+            logger.info(f"Ingestion job {job_id} started")
+            heartbeat = asyncio.create_task(self._heartbeat(job_id, attempt))
+            try:
+                result = await self.handler(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ingestion job {job_id} failed: {e}")
+                recorded = await asyncio.to_thread(self.store.fail_job, job_id, attempt, str(e))
+            else:
+                logger.info(f"Ingestion job {job_id} completed: {result}")
+                recorded = await asyncio.to_thread(self.store.complete_job, job_id, attempt, result)
+            finally:
+                heartbeat.cancel()
+            if not recorded:
+                logger.warning(f"Ingestion job {job_id} lost its lease during attempt {attempt}; its outcome was dropped")
@@ -0,0 +1,111 @@
+import asyncio
+import base64
+import hashlib
+import io
+import os
+import shutil
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Iterator, List, Tuple
+
+try:
+    from unstructured.partition.pdf import partition_pdf
+except ImportError:
+    partition_pdf = None
+
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:
+    PdfReader = PdfWriter = None
+
+# Pages partitioned at a time; bounds the size of each window's temp files and images
+PAGES_PER_WINDOW = int(os.getenv("PDF_PAGES_PER_WINDOW", "10"))
+
+PdfWindow = Tuple[List[str], List[dict]]
+
+
+def _write_windows(file_content: bytes, workdir: str, pages_per_window: int) -> Iterator[Tuple[int, str]]:
+    """Write each window of pages to its own PDF in workdir, one at a time; yields (first page, path)"""
+    if PdfReader is None:
+        # Without pypdf the whole file is a single window
+        path = os.path.join(workdir, "window-1.pdf")
+        with open(path, "wb") as f:
+            f.write(file_content)
+        yield 1, path
+        return
+    reader = PdfReader(io.BytesIO(file_content))
+    for start in range(0, len(reader.pages), pages_per_window):
+        writer = PdfWriter()
+        for page in reader.pages[start:start + pages_per_window]:
+            writer.add_page(page)
+        path = os.path.join(workdir, f"window-{start + 1}.pdf")
+        with open(path, "wb") as f:
+            writer.write(f)
+        yield start + 1, path
+
+
+def iter_pdf_windows(file_content: bytes, workdir: str, pages_per_window: int = PAGES_PER_WINDOW) -> Iterator[PdfWindow]:
+    """
+    Partition a PDF a window of pages at a time, yielding (text_chunks, images)
+    as each window finishes. Images are {"id", "base64", "hash"} dicts. A
+    window's PDF and extracted images are deleted from workdir before the next
+    window starts, so disk use does not grow with the document.
+    """
+    if partition_pdf is None:
+        raise ImportError("unstructured library not installed. Cannot process PDFs.")
+    for first_page, window_path in _write_windows(file_content, workdir, pages_per_window):
+        image_dir = os.path.join(workdir, f"images-{first_page}")
+        os.makedirs(image_dir, exist_ok=True)
+        try:
+            elements = partition_pdf(
+                filename=window_path,
+                extract_images_in_pdf=True,
+                infer_table_structure=True,
+                chunking_strategy="by_title",
+                max_characters=4000,
+                new_after_n_chars=3800,
+                combine_text_under_n_chars=2000,
+                extract_image_block_output_dir=image_dir,
+            )
+            text_chunks = [e.text for e in elements if hasattr(e, 'text') and e.text]
+            images = []
+            for img_file in sorted(f for f in os.listdir(image_dir) if f.lower().endswith((".png", ".jpg", ".jpeg"))):
+                with open(os.path.join(image_dir, img_file), "rb") as f:
+                    img_bytes = f.read()
+                images.append({
+                    # Image file names restart with every window; the first page keeps ids unique
+                    "id": f"image_p{first_page}_{img_file}",
+                    "base64": base64.b64encode(img_bytes).decode('utf-8'),
+                    "hash": hashlib.sha256(img_bytes).hexdigest(),
+                })
+        finally:
+            os.remove(window_path)
+            shutil.rmtree(image_dir, ignore_errors=True)
+        yield text_chunks, images
+
+
+@asynccontextmanager
+async def windows_in_thread(windows: Iterator) -> AsyncIterator[AsyncIterator]:
+    """
+    Iterate a blocking window iterator from async code. Each window is produced in
+    a worker thread while the caller processes the previous one, so parsing overlaps
+    with extraction. On exit, waits for the in-flight window before closing the
+    iterator, so no thread is still writing to the caller's temp directory.
+    """
+    pending = None
+
+    async def iterate():
+        nonlocal pending
+        pending = asyncio.ensure_future(asyncio.to_thread(next, windows, None))
+        while (window := await pending) is not None:
+            pending = asyncio.ensure_future(asyncio.to_thread(next, windows, None))
+            yield window
+
+    try:
+        yield iterate()
+    finally:
+        if pending is not None:
+            await asyncio.gather(pending, return_exceptions=True)
+        # Runs the generator's cleanup, e.g. removing a half-partitioned window's files
+        close = getattr(windows, "close", None)
+        if close is not None:
+            close()
@@ -1,64 +1,51 @@
-import os
 import tempfile
-import base64
 from typing import List, Tuple
 from core.processing.text_processor import TextProcessor
+from core.processing.accumulator import ExtractionAccumulator
+from core.processing.pdf_partition import iter_pdf_windows, windows_in_thread
 from core.db.graph_db import Neo4jDatabase
 
-try:
-    from unstructured.partition.pdf import partition_pdf
-except ImportError:
-    partition_pdf = None
-
 class PDFProcessor:
     def __init__(self, text_processor: TextProcessor = None):
         self.text_processor = text_processor or TextProcessor()
         self.db = Neo4jDatabase()
 
+    def _merge(self, chunk_results: List[Tuple[List[dict], List[dict]]]) -> Tuple[List[dict], List[dict]]:
+        """Combine per-chunk results in chunk order, keeping one row per entity and relationship"""
+        accumulator = ExtractionAccumulator()
+        for ents, rels in chunk_results:
+            accumulator.add_entities(ents)
+            accumulator.add_relationships(rels)
+        return accumulator.entities, accumulator.relationships
+
+    def _image_summaries(self, images: List[dict]) -> List[dict]:
+        # Summaries are filled in by the API if needed
+        return [{"id": image["id"], "base64": image["base64"], "summary": None} for image in images]
+
     def process_pdf(self, file_content: bytes, filename: str) -> Tuple[List[dict], List[dict], List[dict]]:
         """
         Process a PDF file and extract entities, relationships, and images.
         Returns (entities, relationships, image_summaries)
         """
-        if partition_pdf is None:
-            raise ImportError("unstructured library not installed. Cannot process PDFs.")
-        # Save PDF to temp file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-            tmp.write(file_content)
-            tmp_path = tmp.name
-        # Extract elements from PDF
-        output_path = tempfile.mkdtemp()
-        elements = partition_pdf(
-            filename=tmp_path,
-            extract_images_in_pdf=True,
-            infer_table_structure=True,
-            chunking_strategy="by_title",
-            max_characters=4000,
-            new_after_n_chars=3800,
-            combine_text_under_n_chars=2000,
-            extract_image_block_output_dir=output_path,
-        )
-        # Extract text and images
-        text_chunks = []
-        for e in elements:
-            if hasattr(e, 'text') and e.text:
-                text_chunks.append(e.text)
-        # Process all text chunks
-        entities, relationships = [], []
-        for chunk in text_chunks:
-            ents, rels = self.text_processor.process_text(chunk)
-            entities.extend(ents)
-            relationships.extend(rels)
-        # Extract images and create summaries (dummy, to be filled in API)
-        image_files = [f for f in os.listdir(output_path) if f.lower().endswith((".png", ".jpg", ".jpeg"))]
-        image_summaries = []
-        for img_file in image_files:
-            img_path = os.path.join(output_path, img_file)
-            with open(img_path, "rb") as f:
-                img_b64 = base64.b64encode(f.read()).decode('utf-8')
-            image_summaries.append({
-                "id": f"image_{img_file}",
-                "base64": img_b64,
-                "summary": None  # To be filled by LLM in API if needed
-            })
-        return entities, relationships, image_summaries 
\ No newline at end of file
+        chunk_results, images = [], []
+        # Temp files live only as long as the call, whether it succeeds or not
+        with tempfile.TemporaryDirectory() as workdir:
+            for text_chunks, window_images in iter_pdf_windows(file_content, workdir):
+                chunk_results += self.text_processor.process_texts(text_chunks)
+                images += window_images
+        entities, relationships = self._merge(chunk_results)
+        return entities, relationships, self._image_summaries(images)
+
+    async def aprocess_pdf(self, file_content: bytes, filename: str, max_concurrency: int = None) -> Tuple[List[dict], List[dict], List[dict]]:
+        """
+        Async version of process_pdf that extracts up to max_concurrency chunks at once.
+        Each window of pages is extracted while the next one is being partitioned.
+        """
+        chunk_results, images = [], []
+        with tempfile.TemporaryDirectory() as workdir:
+            async with windows_in_thread(iter_pdf_windows(file_content, workdir)) as windows:
+                async for text_chunks, window_images in windows:
+                    chunk_results += await self.text_processor.aprocess_texts(text_chunks, max_concurrency)
+                    images += window_images
+        entities, relationships = self._merge(chunk_results)
+        return entities, relationships, self._image_summaries(images)
@@ -62,6 +62,80 @@ Rules:
 5. Look for relationships that might have been missed in previous iterations
 6. Return only the raw JSON array'''
 
+# Packed variants: one request covers several numbered text chunks and returns per-chunk results
+PACKED_ENTITY_EXTRACTION_SYSTEM_PROMPT = '''You are an entity extraction expert. You are given several numbered text chunks. For each chunk, identify potential entities that might have been missed.
+Focus on:
+- Technical terms and concepts
+- Product names
+- Organizations
+- Complex person names
+- Locations
+Return ONLY a JSON object mapping each chunk number to its array of entities, without any markdown formatting.'''
+
+PACKED_ENTITY_EXTRACTION_HUMAN_PROMPT = lambda chunks: "\n\n".join(
+    f'''Chunk {i}:
+Text: {text}
+
+Already identified entities: {[e["name"] for e in existing_entities]}'''
+    for i, (text, existing_entities) in enumerate(chunks, 1)
+) + '''
+
+Required JSON Format:
+{
+    "1": [{"name": "Entity Name", "type": "PERSON/ORG/PRODUCT/LOCATION/CONCEPT"}],
+    "2": []
+}
+
+Rules:
+1. Include every chunk number, with an empty array if it has no new entities
+2. Only include entities NOT in that chunk's already identified list
+3. Focus on entities that might be missed by traditional NLP
+4. Return only the raw JSON object
+5. Ensure proper JSON formatting'''
+
+PACKED_RELATIONSHIP_EXTRACTION_SYSTEM_PROMPT = '''You are a relationship extraction expert. Your task is to identify explicit and implicit relationships between entities in each of several numbered text chunks and return them in valid JSON format.
+Common relationship types include:
+- FOUNDED (person founded company)
+- LEADS/CEO_OF (person leads/manages company)
+- HEADQUARTERED_IN (company located in place)
+- ACQUIRED (company acquired company)
+- DEVELOPED (company/person created product)
+- INVESTED_IN (company invested in company)
+- PARTNERED_WITH (company partnered with company)
+- PART_OF (component is part of system)
+- USES (entity uses tool/technology)
+- RELATED_TO (general relationship)
+
+IMPORTANT: Return ONLY a raw JSON object mapping each chunk number to its array of relationships, without any markdown formatting.'''
+
+PACKED_RELATIONSHIP_EXTRACTION_HUMAN_PROMPT = lambda chunks, iteration: f'''Analyze each of the following text chunks and extract relationships between its entities. This is iteration {iteration} of the analysis.
+
+''' + "\n\n".join(
+    f'''Chunk {i}:
+Text: {text}
+
+Available Entities: {', '.join(entity_names)}
+
+Additional Context:
+{chr(10).join(context) if context else "No additional context available"}'''
+    for i, (text, entity_names, context) in enumerate(chunks, 1)
+) + '''
+
+Required JSON Format:
+{
+    "1": [{"from": "Entity1", "type": "RELATIONSHIP_TYPE", "to": "Entity2"}],
+    "2": []
+}
+
+Rules:
+1. Include every chunk number, with an empty array if it has no relationships
+2. Include both explicit and implicit relationships from each chunk's text
+3. Use UPPERCASE for relationship types
+4. Entities must be from that chunk's provided list
+5. Consider each chunk's additional context
+6. Look for relationships that might have been missed in previous iterations
+7. Return only the raw JSON object'''
+
 # --- agentic_context_retrieval.py prompts ---
 KEYWORD_EXTRACTION_SYSTEM_PROMPT = '''You are a keyword extraction expert. Extract the most important keywords, entities, and concepts from the given query. 
 Focus on names, organizations, concepts, and specific terms that would be useful for searching a knowledge graph.
@@ -75,6 +149,12 @@ RELATIONSHIP_FILTERING_SYSTEM_PROMPT = '''You are a relationship filtering exper
 identify which relationships are most relevant to answering the query. Consider the context and importance.
 Return only the relevant relationship descriptions, one per line.'''
 
+QUERY_COMPLEXITY_SYSTEM_PROMPT = '''You are a query complexity expert. Given a query against a medical knowledge graph,
+decide how many rounds of graph exploration are needed to answer it.
+0 means a direct lookup of one entity (e.g. "what is X"); higher numbers mean the answer needs
+following relationships across several entities.
+Respond with only a single integer.'''
+
 EXPLORATION_DECISION_SYSTEM_PROMPT = '''You are an exploration decision expert. Given the current context and query, 
 decide if we should continue exploring the knowledge graph for more information.
 Consider if the current context is sufficient to answer the query.
@@ -1,11 +1,17 @@
+import asyncio
+import random
+import time
 import spacy
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import SystemMessage, HumanMessage
 import json
 import os
+from bisect import bisect_right
 from dotenv import load_dotenv
 from core.db.graph_db import Neo4jDatabase
-from core.processing.prompts import ENTITY_EXTRACTION_SYSTEM_PROMPT, ENTITY_EXTRACTION_HUMAN_PROMPT, RELATIONSHIP_EXTRACTION_SYSTEM_PROMPT, RELATIONSHIP_EXTRACTION_HUMAN_PROMPT
+from core.retrieval.entity_matcher import EntityGazetteer
+from core.processing.accumulator import ExtractionAccumulator
+from core.processing.prompts import ENTITY_EXTRACTION_SYSTEM_PROMPT, ENTITY_EXTRACTION_HUMAN_PROMPT, RELATIONSHIP_EXTRACTION_SYSTEM_PROMPT, RELATIONSHIP_EXTRACTION_HUMAN_PROMPT, PACKED_ENTITY_EXTRACTION_SYSTEM_PROMPT, PACKED_ENTITY_EXTRACTION_HUMAN_PROMPT, PACKED_RELATIONSHIP_EXTRACTION_SYSTEM_PROMPT, PACKED_RELATIONSHIP_EXTRACTION_HUMAN_PROMPT
 
 # Load environment variables
 load_dotenv()
@@ -15,11 +21,26 @@ GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 if not GOOGLE_API_KEY:
     raise ValueError("GOOGLE_API_KEY not found in environment variables. Please check your .env file.")
 
+# Substrings of provider errors that mean "slow down" rather than "this request is bad"
+RATE_LIMIT_MARKERS = ("429", "resource exhausted", "resourceexhausted", "rate limit", "quota")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token), good enough for packing prompts"""
+    return len(text) // 4 + 1
+
 class TextProcessor:
     """
     Processes plain text to extract entities and relationships. For PDF, use PDFProcessor.
     """
-    def __init__(self, max_iterations: int = 3) -> None:
+    def __init__(
+        self,
+        max_iterations: int = 3,
+        max_concurrency: int = 4,
+        max_retries: int = 5,
+        backoff_seconds: float = 1.0,
+        pack_token_budget: int = 0
+    ) -> None:
         self.nlp = spacy.load("en_core_web_sm")
         self.db = Neo4jDatabase()
         self.llm = ChatGoogleGenerativeAI(
@@ -28,6 +49,16 @@ class TextProcessor:
             convert_system_message_to_human=True
         )
         self.max_iterations = max_iterations
+        # Chunks extracted at once by aprocess_texts
+        self.max_concurrency = max_concurrency
+        # Retries with exponential backoff when the LLM provider rate-limits us
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        # When > 0, process_texts/aprocess_texts put as many texts into each LLM request
+        # as fit in this many (estimated) tokens of text; 0 sends one request per text
+        self.pack_token_budget = pack_token_budget
+        # Gazetteer over the graph's entity catalog, rebuilt only when the catalog changes
+        self._gazetteer = None
 
     def get_existing_entities(self) -> list[dict]:
         """Get all existing entities from Neo4j"""
@@ -37,20 +68,54 @@ class TextProcessor:
             print(f"Warning: Failed to get existing entities: {str(e)}")
             return []
 
-    def extract_entities(self, text: str, existing_entities: list[dict] = None, iteration: int = 1) -> list[dict]:
-        """Extract entities using SpaCy and match against existing entities"""
+    def _invoke_llm(self, messages):
+        """Invoke the LLM, backing off and retrying while the provider is rate-limiting"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.llm.invoke(messages)
+            except Exception as e:
+                error = str(e).lower()
+                if attempt == self.max_retries or not any(marker in error for marker in RATE_LIMIT_MARKERS):
+                    raise
+                # Jitter keeps concurrent chunks from retrying in lockstep
+                delay = self.backoff_seconds * 2 ** attempt * (1 + random.random())
+                print(f"Rate limited by LLM provider, retrying in {delay:.1f}s (attempt {attempt + 1}/{self.max_retries})")
+                time.sleep(delay)
+
+    def _catalog_gazetteer(self, entities: list[dict]) -> EntityGazetteer:
+        names = tuple(entity["name"] for entity in entities)
+        if self._gazetteer is None or self._gazetteer.names != names:
+            self._gazetteer = EntityGazetteer(entities)
+        return self._gazetteer
+
+    def _sentence_locator(self, doc):
+        """Return a function mapping a character span of the parsed text to the text of its sentence"""
+        sentences = list(doc.sents)
+        sentence_starts = [sent.start_char for sent in sentences]
+
+        def sentence_at(start: int, end: int):
+            """Text of the sentence containing text[start:end], or None if it spans sentences"""
+            i = bisect_right(sentence_starts, start) - 1
+            if i >= 0 and end <= sentences[i].end_char:
+                return sentences[i].text.strip()
+            return None
+        return sentence_at
+
+    def extract_entities(self, text: str, existing_entities: list[dict] = None, iteration: int = 1, doc=None, identify_potential: bool = True) -> list[dict]:
+        """
+        Extract entities using SpaCy and match against existing entities. Pass doc to reuse an
+        already parsed text; with identify_potential=False the LLM pass is left to the caller.
+        """
         # Get entities from SpaCy
-        doc = self.nlp(text)
+        if doc is None:
+            doc = self.nlp(text)
         entities = []
+        seen_names = set()
+        sentence_at = self._sentence_locator(doc)
         
         # First pass: Get SpaCy entities
         for ent in doc.ents:
-            # Find the sentence containing the entity
-            entity_sentence = None
-            for sent in doc.sents:
-                if ent.start_char >= sent.start_char and ent.end_char <= sent.end_char:
-                    entity_sentence = sent.text.strip()
-                    break
+            entity_sentence = ent.sent.text.strip()
             description = entity_sentence if entity_sentence else f"Entity of type {ent.label_} found in text."
             entities.append({
                 "name": ent.text,
@@ -60,48 +125,61 @@ class TextProcessor:
                 "iteration": iteration,
                 "description": description
             })
+            seen_names.add(ent.text.lower())
         
         # Second pass: Check existing entities from Neo4j and previous iterations
-        all_existing = existing_entities or self.get_existing_entities()
-        text_lower = text.lower()
+        if existing_entities:
+            gazetteer = EntityGazetteer(existing_entities)
+        else:
+            gazetteer = self._catalog_gazetteer(self.get_existing_entities())
+        found = gazetteer.find(text)
         
-        for entity in all_existing:
+        for entity in gazetteer.entities:
             entity_lower = entity["name"].lower()
-            if entity_lower in text_lower:
-                if not any(e["name"].lower() == entity_lower for e in entities):
-                    # Find the sentence containing the entity
-                    entity_sentence = None
-                    for sent in doc.sents:
-                        if entity_lower in sent.text.lower():
-                            entity_sentence = sent.text.strip()
-                            break
-                    description = entity_sentence if entity_sentence else entity.get("description", f"Entity of type {entity['type']} found in text.")
-                    entities.append({
-                        "name": entity["name"],
-                        "type": entity["type"],
-                        "start": text_lower.find(entity_lower),
-                        "end": text_lower.find(entity_lower) + len(entity_lower),
-                        "iteration": iteration,
-                        "description": description
-                    })
+            start = found.get(entity_lower)
+            if start is not None and entity_lower not in seen_names:
+                # Find the sentence containing the entity
+                entity_sentence = sentence_at(start, start + len(entity_lower))
+                description = entity_sentence if entity_sentence else entity.get("description", f"Entity of type {entity['type']} found in text.")
+                entities.append({
+                    "name": entity["name"],
+                    "type": entity["type"],
+                    "start": start,
+                    "end": start + len(entity_lower),
+                    "iteration": iteration,
+                    "description": description
+                })
+                seen_names.add(entity_lower)
 
         # Third pass: Use LLM to identify potential entities missed by SpaCy
-        if iteration == 1:  # Only do this in first iteration to avoid redundancy
+        if iteration == 1 and identify_potential:  # Only do this in first iteration to avoid redundancy
             potential_entities = self._identify_potential_entities(text, entities)
-            for entity in potential_entities:
-                if not any(e["name"].lower() == entity["name"].lower() for e in entities):
-                    # Find the sentence containing the entity
-                    entity_lower = entity["name"].lower()
-                    entity_sentence = None
-                    for sent in doc.sents:
-                        if entity_lower in sent.text.lower():
-                            entity_sentence = sent.text.strip()
-                            break
-                    description = entity_sentence if entity_sentence else entity.get("description", f"Entity of type {entity.get('type', 'UNKNOWN')} found in text.")
-                    entities.append({**entity, "iteration": iteration, "description": description})
+            self._add_potential_entities(text, entities, potential_entities, iteration, sentence_at)
 
         return entities
 
+    def extract_local_entities(self, texts: list[str], batch_size: int = 32) -> list[list[dict]]:
+        """
+        The spaCy and known-entity passes of extract_entities for many texts, without
+        any LLM call. Fast enough to make a document searchable before enrichment.
+        """
+        docs = self.nlp.pipe(texts, batch_size=batch_size)
+        return [self.extract_entities(text, doc=doc, identify_potential=False) for text, doc in zip(texts, docs)]
+
+    def _add_potential_entities(self, text: str, entities: list[dict], potential_entities: list[dict], iteration: int, sentence_at) -> None:
+        """Append the LLM-suggested entities that aren't in entities yet, described by the sentence they appear in"""
+        seen_names = {e["name"].lower() for e in entities}
+        found = EntityGazetteer(potential_entities).find(text)
+        for entity in potential_entities:
+            entity_lower = entity["name"].lower()
+            if entity_lower not in seen_names:
+                # Find the sentence containing the entity
+                start = found.get(entity_lower)
+                entity_sentence = sentence_at(start, start + len(entity_lower)) if start is not None else None
+                description = entity_sentence if entity_sentence else entity.get("description", f"Entity of type {entity.get('type', 'UNKNOWN')} found in text.")
+                entities.append({**entity, "iteration": iteration, "description": description})
+                seen_names.add(entity_lower)
+
     def _identify_potential_entities(self, text: str, existing_entities: list[dict]) -> list[dict]:
         """Use LLM to identify potential entities missed by SpaCy"""
         try:
@@ -113,30 +191,34 @@ class TextProcessor:
                 HumanMessage(content=human_content)
             ]
 
-            response = self.llm.invoke(messages)
+            response = self._invoke_llm(messages)
             content = self._clean_llm_response(response.content)
             return json.loads(content)
         except Exception as e:
             print(f"Warning: Failed to identify potential entities: {str(e)}")
             return []
 
+    def _relationship_context(self, entity_names: list[str], existing_relationships: list[dict] = None) -> list[str]:
+        context = []
+
+        # Add context from existing relationships if available
+        if existing_relationships:
+            context.extend([
+                f"{rel['from']} {rel['type']} {rel['to']}"
+                for rel in existing_relationships
+            ])
+
+        # Get additional context from Neo4j for known entities
+        db_context = self.db.get_context(entity_names)
+        if db_context:
+            context.extend(db_context)
+        return context
+
     def identify_relationships(self, text: str, entities: list[dict], existing_relationships: list[dict] = None, iteration: int = 1) -> list[dict]:
         """Use LangChain and Gemini to identify relationships between entities"""
         try:
             entity_names = [e["name"] for e in entities]
-            context = []
-
-            # Add context from existing relationships if available
-            if existing_relationships:
-                context.extend([
-                    f"{rel['from']} {rel['type']} {rel['to']}"
-                    for rel in existing_relationships
-                ])
-
-            # Get additional context from Neo4j for known entities
-            db_context = self.db.get_context(entity_names)
-            if db_context:
-                context.extend(db_context)
+            context = self._relationship_context(entity_names, existing_relationships)
 
             system_prompt = RELATIONSHIP_EXTRACTION_SYSTEM_PROMPT
             human_content = RELATIONSHIP_EXTRACTION_HUMAN_PROMPT(text, entity_names, context, iteration)
@@ -146,7 +228,7 @@ class TextProcessor:
                 HumanMessage(content=human_content)
             ]
 
-            response = self.llm.invoke(messages)
+            response = self._invoke_llm(messages)
             content = self._clean_llm_response(response.content)
             
             relationships = json.loads(content)
@@ -161,6 +243,57 @@ class TextProcessor:
             print(f"Error in identify_relationships: {str(e)}")
             return []
 
+    def _parse_packed_response(self, response, count: int) -> list[list[dict]]:
+        """Split a packed response ({"1": [...], "2": [...]}) into one result list per chunk"""
+        results = json.loads(self._clean_llm_response(response.content))
+        if not isinstance(results, dict):
+            raise ValueError(f"Expected a JSON object keyed by chunk number, got {type(results).__name__}")
+        chunk_results = []
+        for i in range(1, count + 1):
+            chunk_result = results.get(str(i), [])
+            chunk_results.append(chunk_result if isinstance(chunk_result, list) else [])
+        return chunk_results
+
+    def _identify_potential_entities_packed(self, chunks: list[tuple[str, list[dict]]]) -> list[list[dict]]:
+        """Packed _identify_potential_entities: one LLM request for several (text, existing_entities) chunks"""
+        if len(chunks) == 1:
+            return [self._identify_potential_entities(*chunks[0])]
+        try:
+            messages = [
+                SystemMessage(content=PACKED_ENTITY_EXTRACTION_SYSTEM_PROMPT),
+                HumanMessage(content=PACKED_ENTITY_EXTRACTION_HUMAN_PROMPT(chunks))
+            ]
+            return self._parse_packed_response(self._invoke_llm(messages), len(chunks))
+        except Exception as e:
+            print(f"Warning: Packed entity extraction failed, falling back to one request per chunk: {str(e)}")
+            return [self._identify_potential_entities(text, entities) for text, entities in chunks]
+
+    def identify_relationships_packed(self, chunks: list[tuple[str, list[dict], list[dict]]], iteration: int = 1) -> list[list[dict]]:
+        """Packed identify_relationships: one LLM request for several (text, entities, existing_relationships) chunks"""
+        if len(chunks) == 1:
+            return [self.identify_relationships(*chunks[0], iteration=iteration)]
+        try:
+            prompt_chunks = []
+            for text, entities, existing_relationships in chunks:
+                entity_names = [e["name"] for e in entities]
+                prompt_chunks.append((text, entity_names, self._relationship_context(entity_names, existing_relationships)))
+            messages = [
+                SystemMessage(content=PACKED_RELATIONSHIP_EXTRACTION_SYSTEM_PROMPT),
+                HumanMessage(content=PACKED_RELATIONSHIP_EXTRACTION_HUMAN_PROMPT(prompt_chunks, iteration))
+            ]
+            chunk_relationships = self._parse_packed_response(self._invoke_llm(messages), len(chunks))
+        except Exception as e:
+            print(f"Warning: Packed relationship extraction failed, falling back to one request per chunk: {str(e)}")
+            return [
+                self.identify_relationships(text, entities, existing_relationships, iteration)
+                for text, entities, existing_relationships in chunks
+            ]
+        for relationships in chunk_relationships:
+            # Add iteration information
+            for rel in relationships:
+                rel["iteration"] = iteration
+        return chunk_relationships
+
     def _clean_llm_response(self, content: str) -> str:
         """Clean up the LLM response content"""
         content = content.strip()
@@ -172,10 +305,12 @@ class TextProcessor:
             content = content[5:].strip()
         return content
 
-    def process_text(self, text: str) -> tuple[list[dict], list[dict]]:
+    def process_text(self, text: str, doc=None) -> tuple[list[dict], list[dict]]:
         """Process text to extract entities and relationships iteratively"""
-        all_entities = []
-        all_relationships = []
+        # Parse once; every iteration works on the same Doc
+        if doc is None:
+            doc = self.nlp(text)
+        accumulator = ExtractionAccumulator()
         
         for iteration in range(1, self.max_iterations + 1):
             print(f"\nStarting iteration {iteration}...")
@@ -183,30 +318,22 @@ class TextProcessor:
             # Extract entities using current context
             new_entities = self.extract_entities(
                 text,
-                existing_entities=all_entities,
-                iteration=iteration
+                existing_entities=accumulator.entities,
+                iteration=iteration,
+                doc=doc
             )
             
             # Identify relationships using all known entities and relationships
             new_relationships = self.identify_relationships(
                 text,
-                all_entities + new_entities,
-                existing_relationships=all_relationships,
+                accumulator.entities + new_entities,
+                existing_relationships=accumulator.relationships,
                 iteration=iteration
             )
             
             # Add new findings to our collections
-            all_entities.extend([e for e in new_entities if not any(
-                existing["name"].lower() == e["name"].lower() 
-                for existing in all_entities
-            )])
-            
-            all_relationships.extend([r for r in new_relationships if not any(
-                existing["from"] == r["from"] 
-                and existing["to"] == r["to"] 
-                and existing["type"] == r["type"]
-                for existing in all_relationships
-            )])
+            accumulator.add_entities(new_entities)
+            accumulator.add_relationships(new_relationships)
             
             # If no new entities or relationships were found, we can stop early
             if not new_entities and not new_relationships and iteration > 1:
@@ -215,4 +342,107 @@ class TextProcessor:
                 
             print(f"Iteration {iteration} found {len(new_entities)} new entities and {len(new_relationships)} new relationships.")
         
-        return all_entities, all_relationships 
\ No newline at end of file
+        return accumulator.entities, accumulator.relationships 
+
+    def _process_pack(self, texts: list[str], docs: list) -> list[tuple[list[dict], list[dict]]]:
+        """
+        process_text for several texts in lockstep, sharing each iteration's LLM
+        requests between them. A text drops out once an iteration finds nothing new.
+        """
+        accumulators = [ExtractionAccumulator() for _ in texts]
+        active = list(range(len(texts)))
+
+        for iteration in range(1, self.max_iterations + 1):
+            print(f"\nStarting packed iteration {iteration} for {len(active)} texts...")
+            new_entities = {
+                i: self.extract_entities(
+                    texts[i],
+                    existing_entities=accumulators[i].entities,
+                    iteration=iteration,
+                    doc=docs[i],
+                    identify_potential=False
+                )
+                for i in active
+            }
+            if iteration == 1:
+                potential_entities = self._identify_potential_entities_packed([(texts[i], new_entities[i]) for i in active])
+                for i, potential in zip(active, potential_entities):
+                    self._add_potential_entities(texts[i], new_entities[i], potential, iteration, self._sentence_locator(docs[i]))
+
+            new_relationships = self.identify_relationships_packed(
+                [(texts[i], accumulators[i].entities + new_entities[i], accumulators[i].relationships) for i in active],
+                iteration=iteration
+            )
+
+            still_active = []
+            for i, relationships in zip(active, new_relationships):
+                accumulators[i].add_entities(new_entities[i])
+                accumulators[i].add_relationships(relationships)
+                if new_entities[i] or relationships or iteration == 1:
+                    still_active.append(i)
+            active = still_active
+            if not active:
+                print(f"No new findings in iteration {iteration}, stopping early.")
+                break
+
+        return [(accumulator.entities, accumulator.relationships) for accumulator in accumulators]
+
+    def _pack(self, texts: list[str]) -> list[list[int]]:
+        """Group consecutive texts into packs of at most pack_token_budget estimated tokens"""
+        packs, current, current_tokens = [], [], 0
+        for i, text in enumerate(texts):
+            tokens = estimate_tokens(text)
+            if current and current_tokens + tokens > self.pack_token_budget:
+                packs.append(current)
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            packs.append(current)
+        return packs
+
+    def process_texts(self, texts: list[str], batch_size: int = 32, n_process: int = 1) -> list[tuple[list[dict], list[dict]]]:
+        """
+        Process many texts (e.g. PDF chunks), parsing them in batches with nlp.pipe.
+        Returns one (entities, relationships) tuple per text, in input order.
+        With pack_token_budget set, texts share LLM requests in packs.
+        """
+        docs = list(self.nlp.pipe(texts, batch_size=batch_size, n_process=n_process))
+        if self.pack_token_budget:
+            results = [None] * len(texts)
+            for pack in self._pack(texts):
+                pack_results = self._process_pack([texts[i] for i in pack], [docs[i] for i in pack])
+                for i, result in zip(pack, pack_results):
+                    results[i] = result
+            return results
+        return [self.process_text(text, doc=doc) for text, doc in zip(texts, docs)]
+
+    async def aprocess_texts(self, texts: list[str], max_concurrency: int = None, batch_size: int = 32, on_result=None) -> list[tuple[list[dict], list[dict]]]:
+        """
+        Async version of process_texts that extracts up to max_concurrency texts (or
+        packs, with pack_token_budget set) at once, default self.max_concurrency. Each
+        runs in a worker thread, since the LLM client is synchronous. Results come back
+        in input order regardless of which text finishes first; on_result, if given, is
+        awaited with (index, result) as each text finishes, e.g. to save progress.
+        A failed text doesn't stop the rest, and the first error is raised once all finish.
+        """
+        docs = await asyncio.to_thread(lambda: list(self.nlp.pipe(texts, batch_size=batch_size)))
+        semaphore = asyncio.Semaphore(max_concurrency or self.max_concurrency)
+        packs = self._pack(texts) if self.pack_token_budget else [[i] for i in range(len(texts))]
+
+        async def process(pack: list[int]):
+            async with semaphore:
+                if len(pack) == 1:
+                    results = [await asyncio.to_thread(self.process_text, texts[pack[0]], docs[pack[0]])]
+                else:
+                    results = await asyncio.to_thread(self._process_pack, [texts[i] for i in pack], [docs[i] for i in pack])
+            if on_result is not None:
+                for i, result in zip(pack, results):
+                    await on_result(i, result)
+            return results
+
+        pack_results = await asyncio.gather(*(process(pack) for pack in packs), return_exceptions=True)
+        for results in pack_results:
+            if isinstance(results, Exception):
+                raise results
+        return [result for results in pack_results for result in results]
@@ -1,21 +1,31 @@
 import asyncio
+import time
 from typing import List, Dict, Any, Optional, Set
 from dataclasses import dataclass, asdict
 from enum import Enum
 from langchain_core.messages import SystemMessage, HumanMessage
 from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.memory import MemorySaver
 from core.db.graph_db import Neo4jDatabase
 import re
 import json
+import logging
+from uuid import uuid4
 from core.retrieval.vector_store import VectorStore
+from core.retrieval.entity_matcher import EntityNameIndex
+from core.retrieval.query_cache import SemanticQueryCache
+from core.retrieval.tracing import RetrievalTrace, record_metric
+from core.retrieval.query_complexity import QueryComplexityClassifier
+from core.retrieval.prefetch import NodePrefetcher
 from core.processing.prompts import KEYWORD_EXTRACTION_SYSTEM_PROMPT, NODE_PRIORITIZATION_SYSTEM_PROMPT, RELATIONSHIP_FILTERING_SYSTEM_PROMPT, EXPLORATION_DECISION_SYSTEM_PROMPT, CONTEXT_SYNTHESIS_SYSTEM_PROMPT
 
+logger = logging.getLogger(__name__)
+
 
 class NodeType(Enum):
     SIMILARITY_SEARCH = "similarity_search"
     NODE_EXPLORATION = "node_exploration"
     RELATIONSHIP_EXPLORATION = "relationship_exploration"
+    DECISION_MAKER = "decision_maker"
     CONTEXT_SYNTHESIS = "context_synthesis"
 
 
@@ -32,13 +42,39 @@ class AgentState:
     max_depth: int = 3
     should_continue: bool = True
     reasoning: str = ""
+    # Latency budget: deadline is a time.monotonic() timestamp, None means unbounded
+    deadline_ms: Optional[int] = None
+    started_at: float = 0.0
+    deadline: Optional[float] = None
+    budget_exhausted: bool = False
+    # How max_depth was chosen: "requested" by the caller, or the classifier stage that picked it
+    depth_source: str = "requested"
 
 
 class AgenticContextRetrieval:
-    def __init__(self, llm, db: Neo4jDatabase, vector_store: VectorStore):
+    def __init__(
+        self,
+        llm,
+        db: Neo4jDatabase,
+        vector_store: VectorStore,
+        checkpointer=None,
+        query_cache: Optional[SemanticQueryCache] = None,
+        depth_classifier: Optional[QueryComplexityClassifier] = None,
+        prefetch_limit: int = 3
+    ):
         self.llm = llm
         self.db = db
         self.vector_store = vector_store
+        # Picks max_depth for queries that don't specify one
+        self.depth_classifier = depth_classifier or QueryComplexityClassifier()
+        # Optional cache of full retrievals for near-duplicate queries
+        self.query_cache = query_cache
+        # How many newly discovered nodes to load speculatively per step; 0 disables prefetching
+        self.prefetch_limit = prefetch_limit
+        # Each retrieval runs start to finish in one call, so no checkpointer
+        # is needed by default; pass one in to inspect or resume runs
+        self.checkpointer = checkpointer
+        self._entity_index: Optional[EntityNameIndex] = None
         self.graph = self._build_graph()
     
     def _build_graph(self) -> StateGraph:
@@ -46,15 +82,23 @@ class AgenticContextRetrieval:
         workflow = StateGraph(AgentState)
         
         # Add nodes
-        workflow.add_node("similarity_search", self._similarity_search_node)
-        workflow.add_node("node_exploration", self._node_exploration_node)
-        workflow.add_node("relationship_exploration", self._relationship_exploration_node)
-        workflow.add_node("context_synthesis", self._context_synthesis_node)
-        workflow.add_node("decision_maker", self._decision_maker_node)
+        workflow.add_node("similarity_search", self._traced("similarity_search", self._similarity_search_node))
+        workflow.add_node("node_exploration", self._traced("node_exploration", self._node_exploration_node))
+        workflow.add_node("relationship_exploration", self._traced("relationship_exploration", self._relationship_exploration_node))
+        workflow.add_node("context_synthesis", self._traced("context_synthesis", self._context_synthesis_node))
+        workflow.add_node("decision_maker", self._traced("decision_maker", self._decision_maker_node))
         
         # Add edges
         workflow.set_entry_point("similarity_search")
-        workflow.add_edge("similarity_search", "node_exploration")
+        # Simple lookups (depth 0) go straight to synthesis
+        workflow.add_conditional_edges(
+            "similarity_search",
+            self._should_explore,
+            {
+                "explore": "node_exploration",
+                "synthesize": "context_synthesis"
+            }
+        )
         workflow.add_edge("node_exploration", "relationship_exploration")
         workflow.add_edge("relationship_exploration", "decision_maker")
         workflow.add_edge("context_synthesis", END)
@@ -68,137 +112,145 @@ class AgenticContextRetrieval:
             }
         )
         
-        return workflow.compile(checkpointer=MemorySaver())
+        return workflow.compile(checkpointer=self.checkpointer)
     
+    def _traced(self, name: str, node):
+        """Wrap a workflow node so it runs inside a span when the run carries a trace"""
+        async def run(state, config=None):
+            trace = ((config or {}).get("configurable") or {}).get("trace")
+            if trace is None:
+                return await node(state, config)
+            with trace.span(name):
+                return await node(state, config)
+        return run
+
+    def _prefetch(self, config: Optional[dict], node_names: List[str]) -> None:
+        """Start loading graph data for candidate nodes in the background, if the run prefetches"""
+        prefetcher = ((config or {}).get("configurable") or {}).get("prefetcher")
+        if prefetcher is not None:
+            prefetcher.prefetch(node_names)
+
+    async def _prefetched(self, config: Optional[dict], node_name: str) -> Optional[tuple]:
+        """Return (node_info, relationships) loaded ahead of time for a node, or None"""
+        prefetcher = ((config or {}).get("configurable") or {}).get("prefetcher")
+        if prefetcher is None:
+            return None
+        data = await prefetcher.get(node_name)
+        if data is not None:
+            record_metric("prefetch_hits")
+        return data
+
+    def _load_node(self, node_name: str) -> tuple:
+        """Everything an exploration round reads for one node; runs in a prefetch worker thread"""
+        return self._get_node_info(node_name), self._get_node_relationships(node_name)
+
+    def _get_all_entities(self) -> List[dict]:
+        record_metric("neo4j_queries")
+        return self.db.get_all_entities()
+
     def _query_requests_image(self, query: str) -> bool:
         image_keywords = ["image", "diagram", "picture", "figure", "visual", "graph", "chart", "photo"]
         query_lower = query.lower()
         return any(word in query_lower for word in image_keywords)
 
-    async def _similarity_search_node(self, state: AgentState, step_callback=None) -> dict:
+    async def _similarity_search_node(self, state: AgentState, config: Optional[dict] = None) -> dict:
         if isinstance(state, dict):
             state = AgentState(**state)
-        if step_callback:
-            step_callback(json.dumps({"step": "similarity_search", "status": "started"}))
-        step_info = {
-            "step": "similarity_search",
-            "query": state.query,
-            "discovered_nodes": list(state.discovered_nodes),
-            "reasoning": state.reasoning
-        }
         # Use vector store for retrieval
         top_k = 5  # You can make this configurable
         retrieved_node_ids = self.vector_store.search(state.query, top_k=top_k)
         discovered_nodes = set([nid for nid in retrieved_node_ids if nid])
         state.discovered_nodes = discovered_nodes
+        # Load the best matches while the LLM prioritizes them; a depth-0 run never explores them
+        if state.max_depth > 0:
+            self._prefetch(config, [nid for nid in retrieved_node_ids if nid])
         # --- Add image nodes if query requests image ---
         if self._query_requests_image(state.query):
-            all_entities = self.db.get_all_entities()
+            all_entities = self._get_all_entities()
             image_node_names = [e["name"] for e in all_entities if e.get("type", "").lower() == "image"]
             state.discovered_nodes.update(image_node_names)
-            print(f"[INFO] Query requests image. Added image nodes: {image_node_names}")
+            logger.debug(f"Query requests image. Added image nodes: {image_node_names}")
         state.reasoning = f"Found {len(state.discovered_nodes)} nodes using vector store RAG retrieval."
-        print(f"[STEP] similarity_search | Query: {state.query}")
-        print(f"[INFO] Discovered nodes: {state.discovered_nodes}")
-        print(f"[INFO] Reasoning: {state.reasoning}")
-        if step_callback:
-            step_callback(json.dumps({"step": "similarity_search", "status": "finished"}))
-            step_callback(json.dumps(step_info))
+        logger.info(f"similarity_search | Query: {state.query}")
+        logger.debug(f"Discovered nodes: {state.discovered_nodes}")
+        logger.debug(f"Reasoning: {state.reasoning}")
         return asdict(state)
     
-    async def _node_exploration_node(self, state: AgentState, step_callback=None) -> dict:
+    async def _node_exploration_node(self, state: AgentState, config: Optional[dict] = None) -> dict:
         if isinstance(state, dict):
             state = AgentState(**state)
-        if step_callback:
-            step_callback(json.dumps({"step": "node_exploration", "status": "started"}))
-        step_info = {
-            "step": "node_exploration",
-            "unexplored": list(state.discovered_nodes - state.explored_nodes),
-            "current_focus": state.current_focus,
-            "explored_nodes": list(state.explored_nodes),
-            "reasoning": state.reasoning
-        }
-        if step_callback:
-            step_callback(json.dumps({"step": "node_exploration", "status": "finished"}))
-            step_callback(json.dumps(step_info))
-        print(f"[STEP] node_exploration | Unexplored: {state.discovered_nodes - state.explored_nodes}")
+        logger.info(f"node_exploration | Unexplored: {state.discovered_nodes - state.explored_nodes}")
+        if self._budget_exhausted(state):
+            state.should_continue = False
+            state.reasoning = "Latency budget exhausted."
+            logger.debug("Latency budget exhausted. Stopping exploration.")
+            return asdict(state)
         # Decide which nodes to explore based on query relevance
         if not state.discovered_nodes:
             state.should_continue = False
             state.reasoning = "No discovered nodes to explore."
-            print(f"[INFO] No discovered nodes. Stopping exploration.")
+            logger.debug("No discovered nodes. Stopping exploration.")
             return asdict(state)
         unexplored_nodes = state.discovered_nodes - state.explored_nodes
         if not unexplored_nodes:
             state.should_continue = False
             state.reasoning = "No unexplored nodes left."
-            print(f"[INFO] No unexplored nodes left. Stopping exploration.")
+            logger.debug("No unexplored nodes left. Stopping exploration.")
             return asdict(state)
         # Prioritize nodes based on query relevance
-        prioritized_nodes = await self._prioritize_nodes(list(unexplored_nodes), state.query)
+        prioritized_nodes = await self._prioritize_nodes(list(unexplored_nodes), state.query, state.deadline)
         # Select the most relevant node to explore
         if prioritized_nodes:
             state.current_focus = prioritized_nodes[0]
             state.explored_nodes.add(prioritized_nodes[0])
             state.exploration_depth += 1
             # Get node description and add to context
-            node_info = await self._get_node_info(prioritized_nodes[0])
+            prefetched = await self._prefetched(config, state.current_focus)
+            node_info = prefetched[0] if prefetched is not None else self._get_node_info(state.current_focus)
             if node_info:
                 state.context_pieces.append(node_info)
-        print(f"[INFO] Current focus: {state.current_focus}")
-        print(f"[INFO] Explored nodes: {state.explored_nodes}")
-        print(f"[INFO] Reasoning: {state.reasoning}")
-
-        # Print all explored nodes with details at once
-        if state.explored_nodes:
-            all_entities = self.db.get_all_entities()
-            print("[INFO] All explored nodes so far:")
+        logger.debug(f"Current focus: {state.current_focus}")
+        logger.debug(f"Explored nodes: {state.explored_nodes}")
+        logger.debug(f"Reasoning: {state.reasoning}")
+
+        # Dump all explored nodes with details; only with debug logging on,
+        # since it costs a full entity scan
+        if state.explored_nodes and logger.isEnabledFor(logging.DEBUG):
+            # First entity wins on duplicate names
+            entities_by_name = {e["name"].lower(): e for e in reversed(self._get_all_entities())}
+            lines = ["All explored nodes so far:"]
             for i, node_name in enumerate(sorted(state.explored_nodes), 1):
-                node_details = None
-                for entity in all_entities:
-                    if entity["name"].lower() == node_name.lower():
-                        node_details = entity
-                        break
+                node_details = entities_by_name.get(node_name.lower())
                 if node_details:
-                    node_type = node_details.get("type", "Unknown")
-                    description = node_details.get("description", "No description available")
-                    print(f"  {i}. Title: {node_details['name']}")
-                    print(f"     Type: {node_type}")
-                    print(f"     Description: {description}")
+                    lines.append(f"  {i}. Title: {node_details['name']}")
+                    lines.append(f"     Type: {node_details.get('type', 'Unknown')}")
+                    lines.append(f"     Description: {node_details.get('description', 'No description available')}")
                 else:
-                    print(f"  {i}. Title: {node_name}")
-                    print(f"     Type: Unknown")
-                    print(f"     Description: Not found in database")
-            print()
+                    lines.append(f"  {i}. Title: {node_name}")
+                    lines.append(f"     Type: Unknown")
+                    lines.append(f"     Description: Not found in database")
+            logger.debug("\n".join(lines))
         return asdict(state)
     
-    async def _relationship_exploration_node(self, state: AgentState, step_callback=None) -> dict:
+    async def _relationship_exploration_node(self, state: AgentState, config: Optional[dict] = None) -> dict:
         if isinstance(state, dict):
             state = AgentState(**state)
-        if step_callback:
-            step_callback(json.dumps({"step": "relationship_exploration", "status": "started"}))
-        step_info = {
-            "step": "relationship_exploration",
-            "current_focus": state.current_focus,
-            "explored_relationships": list(state.explored_relationships)
-        }
-        if step_callback:
-            step_callback(json.dumps({"step": "relationship_exploration", "status": "finished"}))
-            step_callback(json.dumps(step_info))
-        print(f"[STEP] relationship_exploration | Current focus: {state.current_focus}")
+        logger.info(f"relationship_exploration | Current focus: {state.current_focus}")
         """Explore relationships of the current focus node"""
-        if not state.current_focus:
+        if not state.current_focus or self._budget_exhausted(state):
             return asdict(state)
         
         # Get relationships for the current node
-        relationships = await self._get_node_relationships(state.current_focus)
+        prefetched = await self._prefetched(config, state.current_focus)
+        relationships = prefetched[1] if prefetched is not None else self._get_node_relationships(state.current_focus)
         
         # Use LLM to decide which relationships are relevant
         relevant_relationships = await self._filter_relevant_relationships(
-            relationships, state.query, state.current_focus
+            relationships, state.query, state.current_focus, state.deadline
         )
         
         # Add relevant relationship information to context
+        new_nodes = []
         for rel in relevant_relationships:
             rel_key = f"{rel['from']}-{rel['type']}-{rel['to']}"
             if rel_key not in state.explored_relationships:
@@ -210,27 +262,21 @@ class AgenticContextRetrieval:
                 # Add newly discovered nodes to the discovery set
                 if rel['to'] not in state.discovered_nodes:
                     state.discovered_nodes.add(rel['to'])
+                    new_nodes.append(rel['to'])
+        # Load the new candidates while the LLM decides whether to keep exploring,
+        # unless this was the last round (node_exploration already counted it)
+        if state.exploration_depth < state.max_depth:
+            self._prefetch(config, new_nodes)
         
-        print(f"[INFO] Explored relationships: {state.explored_relationships}")
+        logger.debug(f"Explored relationships: {state.explored_relationships}")
         return asdict(state)
     
-    async def _decision_maker_node(self, state: AgentState, step_callback=None) -> dict:
+    async def _decision_maker_node(self, state: AgentState, config: Optional[dict] = None) -> dict:
         if isinstance(state, dict):
             state = AgentState(**state)
-        if step_callback:
-            step_callback(json.dumps({"step": "decision_maker", "status": "started"}))
-        step_info = {
-            "step": "decision_maker",
-            "depth": f"{state.exploration_depth}/{state.max_depth}",
-            "should_continue": state.should_continue,
-            "reasoning": state.reasoning
-        }
-        if step_callback:
-            step_callback(json.dumps({"step": "decision_maker", "status": "finished"}))
-            step_callback(json.dumps(step_info))
-        print(f"[STEP] decision_maker | Depth: {state.exploration_depth}/{state.max_depth}")
-        print(f"[INFO] Should continue: {state.should_continue}")
-        print(f"[INFO] Reasoning: {state.reasoning}")
+        logger.info(f"decision_maker | Depth: {state.exploration_depth}/{state.max_depth}")
+        logger.debug(f"Should continue: {state.should_continue}")
+        logger.debug(f"Reasoning: {state.reasoning}")
         # If should_continue is already False, don't ask LLM, just return
         if not state.should_continue:
             state.reasoning = state.reasoning or "No more nodes to explore."
@@ -242,6 +288,12 @@ class AgenticContextRetrieval:
             return asdict(state)
         # Use LLM to decide if we should continue exploring
         decision = await self._should_continue_exploration(state)
+        # Stop and synthesize what we have once the latency budget is spent,
+        # including when the decision call itself ran out of time
+        if self._budget_exhausted(state):
+            state.should_continue = False
+            state.reasoning = "Latency budget exhausted"
+            return asdict(state)
         state.should_continue = decision
         if decision:
             state.reasoning = "Decided to continue exploring for more context"
@@ -249,98 +301,74 @@ class AgenticContextRetrieval:
             state.reasoning = "Decided we have sufficient context"
         return asdict(state)
     
-    async def _context_synthesis_node(self, state: AgentState, step_callback=None) -> dict:
+    async def _context_synthesis_node(self, state: AgentState, config: Optional[dict] = None) -> dict:
         if isinstance(state, dict):
             state = AgentState(**state)
-        if step_callback:
-            step_callback(json.dumps({"step": "context_synthesis", "status": "started"}))
-        print(f"[STEP] context_synthesis | Synthesizing context...")
-        print(f"[INFO] Context pieces: {len(state.context_pieces)}")
-        
-        # Print comprehensive summary of all explored nodes at the end
-        print("\n" + "="*80)
-        print("CONTEXT RETRIEVAL SUMMARY - ALL EXPLORED NODES")
-        print("="*80)
-        print(f"Query: {state.query}")
-        print(f"Exploration Depth: {state.exploration_depth}/{state.max_depth}")
-        print(f"Total Context Pieces: {len(state.context_pieces)}")
-        print()
-        
-        print("DISCOVERED NODES:")
-        for i, node in enumerate(sorted(state.discovered_nodes), 1):
-            print(f"  {i}. {node}")
-        print()
-        
-        print("EXPLORED NODES:")
-        for i, node in enumerate(sorted(state.explored_nodes), 1):
-            print(f"  {i}. {node}")
-        print()
-        
-        print("EXPLORED RELATIONSHIPS:")
-        for i, rel in enumerate(sorted(state.explored_relationships), 1):
-            print(f"  {i}. {rel}")
-        print()
-        
-        print("CONTEXT PIECES:")
-        for i, piece in enumerate(state.context_pieces, 1):
-            if isinstance(piece, dict):
-                print(f"  {i}. [IMAGE] {piece.get('name', 'Unknown')}: {piece.get('summary', 'No summary')}")
-            else:
-                print(f"  {i}. {piece}")
-        print("="*80)
-        print()
+        logger.info(f"context_synthesis | Context pieces: {len(state.context_pieces)}")
+        
+        # Summary of everything explored; only built with debug logging on
+        if logger.isEnabledFor(logging.DEBUG):
+            lines = [
+                "CONTEXT RETRIEVAL SUMMARY - ALL EXPLORED NODES",
+                f"Query: {state.query}",
+                f"Exploration Depth: {state.exploration_depth}/{state.max_depth}",
+                f"Total Context Pieces: {len(state.context_pieces)}",
+                "DISCOVERED NODES:",
+                *(f"  {i}. {node}" for i, node in enumerate(sorted(state.discovered_nodes), 1)),
+                "EXPLORED NODES:",
+                *(f"  {i}. {node}" for i, node in enumerate(sorted(state.explored_nodes), 1)),
+                "EXPLORED RELATIONSHIPS:",
+                *(f"  {i}. {rel}" for i, rel in enumerate(sorted(state.explored_relationships), 1)),
+                "CONTEXT PIECES:",
+            ]
+            for i, piece in enumerate(state.context_pieces, 1):
+                if isinstance(piece, dict):
+                    lines.append(f"  {i}. [IMAGE] {piece.get('name', 'Unknown')}: {piece.get('summary', 'No summary')}")
+                else:
+                    lines.append(f"  {i}. {piece}")
+            logger.debug("\n".join(lines))
         
         # Add descriptions for all discovered nodes if not already present
-        def normalize_name(name):
-            return name.lower().replace("dr. ", "").strip()
-        all_entities = self.db.get_all_entities()
+        entity_index = self._get_entity_index(self._get_all_entities())
         existing_descriptions = set(
-            c for c in state.context_pieces if c.startswith("ENTITY DESCRIPTION: ")
+            c for c in state.context_pieces if isinstance(c, str) and c.startswith("ENTITY DESCRIPTION: ")
         )
         added_entity_names = set()
+        matches = entity_index.match(state.discovered_nodes)
         for node in state.discovered_nodes:
-            node_norm = normalize_name(node)
-            for entity in all_entities:
-                entity_name_norm = normalize_name(entity["name"])
-                print(f"[DEBUG] Comparing node '{node}' ({node_norm}) with entity '{entity['name']}' ({entity_name_norm})")
-                if node_norm in entity_name_norm or entity_name_norm in node_norm:
-                    if entity["name"] in added_entity_names:
-                        continue  # Skip duplicate entity descriptions
-                    entity_type = entity.get("type", "entity")
-                    description = entity.get("description", "")
-                    if entity_type == "Image":
-                        # Add image as a dict for frontend rendering
-                        desc_obj = {
-                            "type": "image",
-                            "name": entity["name"],
-                            "summary": description,
-                            "base64": entity.get("base64", "")
-                        }
-                        # Only add the image object if not already present
-                        if not any(
-                            isinstance(piece, dict) and piece.get("type") == "image" and piece.get("name") == entity["name"]
-                            for piece in state.context_pieces
-                        ):
-                            print(f"[DEBUG] Adding image context: {desc_obj}")
-                            state.context_pieces.append(desc_obj)
-                            added_entity_names.add(entity["name"])
+            for entity in matches.get(node, []):
+                logger.debug(f"Node '{node}' matched entity '{entity['name']}'")
+                if entity["name"] in added_entity_names:
+                    continue  # Skip duplicate entity descriptions
+                entity_type = entity.get("type", "entity")
+                description = entity.get("description", "")
+                if entity_type == "Image":
+                    # Add image as a dict for frontend rendering
+                    desc_obj = {
+                        "type": "image",
+                        "name": entity["name"],
+                        "summary": description,
+                        "base64": entity.get("base64", "")
+                    }
+                    # Only add the image object if not already present
+                    if not any(
+                        isinstance(piece, dict) and piece.get("type") == "image" and piece.get("name") == entity["name"]
+                        for piece in state.context_pieces
+                    ):
+                        logger.debug(f"Adding image context: {entity['name']}")
+                        state.context_pieces.append(desc_obj)
+                        added_entity_names.add(entity["name"])
+                else:
+                    if description:
+                        desc_str = f"ENTITY DESCRIPTION: {entity['name']}: {description}"
                     else:
-                        if description:
-                            desc_str = f"ENTITY DESCRIPTION: {entity['name']}: {description}"
-                        else:
-                            desc_str = f"ENTITY DESCRIPTION: {entity['name']} is a {entity_type}"
-                        if desc_str not in state.context_pieces and desc_str not in existing_descriptions:
-                            print(f"[DEBUG] Adding description: {desc_str}")
-                            state.context_pieces.append(desc_str)
-                            added_entity_names.add(entity["name"])
+                        desc_str = f"ENTITY DESCRIPTION: {entity['name']} is a {entity_type}"
+                    if desc_str not in existing_descriptions:
+                        logger.debug(f"Adding description: {desc_str}")
+                        state.context_pieces.append(desc_str)
+                        existing_descriptions.add(desc_str)
+                        added_entity_names.add(entity["name"])
         # TEMP: Skip LLM synthesis to debug
-        step_info = {
-            "step": "context_synthesis",
-            "context_pieces": len(state.context_pieces)
-        }
-        if step_callback:
-            step_callback(json.dumps({"step": "context_synthesis", "status": "finished"}))
-            step_callback(json.dumps(step_info))
         return asdict(state)
         # --- original code below ---
         # if not state.context_pieces:
@@ -352,6 +380,20 @@ class AgenticContextRetrieval:
         # state.context_pieces = synthesized_context
         # return asdict(state)
     
+    def _get_entity_index(self, entities: List[dict]) -> EntityNameIndex:
+        """Return the name index for the current entity catalog, rebuilding it only when the catalog changed"""
+        names = tuple(entity["name"] for entity in entities)
+        if self._entity_index is None or self._entity_index.names != names:
+            self._entity_index = EntityNameIndex(entities)
+        else:
+            record_metric("cache_hits")
+        return self._entity_index
+
+    def _should_explore(self, state: AgentState) -> str:
+        if isinstance(state, dict):
+            state = AgentState(**state)
+        return "explore" if state.max_depth > 0 else "synthesize"
+
     def _should_continue_exploring(self, state: AgentState) -> str:
         if isinstance(state, dict):
             state = AgentState(**state)
@@ -360,6 +402,26 @@ class AgenticContextRetrieval:
             return "synthesize"
         return "continue"
     
+    def _budget_exhausted(self, state: AgentState) -> bool:
+        """Check the request's latency budget, remembering once it has run out"""
+        if state.deadline is not None and time.monotonic() >= state.deadline:
+            state.budget_exhausted = True
+        return state.budget_exhausted
+
+    async def _invoke_llm(self, messages, deadline: Optional[float] = None):
+        """Invoke the LLM, giving up with TimeoutError once the deadline passes"""
+        record_metric("llm_calls")
+        if deadline is None:
+            response = self.llm.invoke(messages)
+        else:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("Latency budget exhausted")
+            response = await asyncio.wait_for(self.llm.ainvoke(messages), timeout=remaining)
+        usage = getattr(response, "usage_metadata", None) or {}
+        record_metric("llm_tokens", usage.get("total_tokens", 0))
+        return response
+
     async def _extract_keywords(self, query: str) -> List[str]:
         """Extract relevant keywords from the query"""
         messages = [
@@ -368,7 +430,7 @@ class AgenticContextRetrieval:
         ]
         
         try:
-            response = self.llm.invoke(messages)
+            response = await self._invoke_llm(messages)
             keywords = [k.strip() for k in response.content.split(',') if k.strip()]
             return keywords
         except Exception:
@@ -393,12 +455,12 @@ class AgenticContextRetrieval:
         
         return intersection / union if union > 0 else 0.0
     
-    async def _prioritize_nodes(self, nodes: List[str], query: str) -> List[str]:
+    async def _prioritize_nodes(self, nodes: List[str], query: str, deadline: Optional[float] = None) -> List[str]:
         if not nodes:
             return []
         # --- Prefer image nodes if query requests image ---
         if self._query_requests_image(query):
-            all_entities = self.db.get_all_entities()
+            all_entities = self._get_all_entities()
             image_nodes = [n for n in nodes if any(e["name"] == n and e.get("type", "").lower() == "image" for e in all_entities)]
             other_nodes = [n for n in nodes if n not in image_nodes]
             # Optionally, you can return image_nodes first, then LLM-prioritized others
@@ -409,16 +471,16 @@ class AgenticContextRetrieval:
             HumanMessage(content=f"Query: {query}\nNodes: {', '.join(nodes)}")
         ]
         try:
-            response = self.llm.invoke(messages)
+            response = await self._invoke_llm(messages, deadline)
             ranked_nodes = [n.strip() for n in response.content.split(',') if n.strip()]
             # Filter to only include nodes that were in the original list
             return [n for n in ranked_nodes if n in nodes]
         except Exception:
             return nodes
     
-    async def _get_node_info(self, node_name: str) -> Optional[str]:
+    def _get_node_info(self, node_name: str) -> Optional[str]:
         """Get information about a specific node"""
-        all_entities = self.db.get_all_entities()
+        all_entities = self._get_all_entities()
         
         for entity in all_entities:
             if entity["name"].lower() == node_name.lower():
@@ -432,8 +494,9 @@ class AgenticContextRetrieval:
         
         return None
     
-    async def _get_node_relationships(self, node_name: str) -> List[Dict[str, str]]:
+    def _get_node_relationships(self, node_name: str) -> List[Dict[str, str]]:
         """Get all relationships for a specific node"""
+        record_metric("neo4j_queries")
         with self.db.driver.session() as session:
             query = """
             MATCH (from {name: $node_name})-[r]->(to)
@@ -456,7 +519,7 @@ class AgenticContextRetrieval:
             return relationships
     
     async def _filter_relevant_relationships(
-        self, relationships: List[Dict[str, str]], query: str, current_node: str
+        self, relationships: List[Dict[str, str]], query: str, current_node: str, deadline: Optional[float] = None
     ) -> List[Dict[str, str]]:
         """Filter relationships based on relevance to the query"""
         if not relationships:
@@ -474,7 +537,7 @@ class AgenticContextRetrieval:
         ]
         
         try:
-            response = self.llm.invoke(messages)
+            response = await self._invoke_llm(messages, deadline)
             relevant_descriptions = [line.strip() for line in response.content.split('\n') if line.strip()]
             
             # Map descriptions back to relationship objects
@@ -504,7 +567,7 @@ class AgenticContextRetrieval:
         ]
         
         try:
-            response = self.llm.invoke(messages)
+            response = await self._invoke_llm(messages, state.deadline)
             return response.content.lower().strip() == "yes"
         except Exception:
             # Default to continuing if we haven't reached max depth
@@ -521,100 +584,235 @@ class AgenticContextRetrieval:
         ]
         
         try:
-            response = self.llm.invoke(messages)
+            response = await self._invoke_llm(messages)
             synthesized = [line.strip() for line in response.content.split('\n') if line.strip()]
             return synthesized
         except Exception:
             return context_pieces
     
-    async def retrieve_context(self, query: str, max_depth: int = 3) -> List[str]:
-        """Main method to retrieve context using the agentic workflow"""
-        # Initialize state as dict
-        initial_state = asdict(AgentState(
+    def _initial_state(self, query: str, max_depth: Optional[int], deadline_ms: Optional[int] = None) -> dict:
+        """Build the initial workflow state as a dict, starting the latency budget clock"""
+        started_at = time.monotonic()
+        depth_source = "requested"
+        if max_depth is None:
+            max_depth, depth_source = self.depth_classifier.default_depth, "default"
+        return asdict(AgentState(
             query=query,
             discovered_nodes=set(),
             explored_nodes=set(),
             explored_relationships=set(),
             context_pieces=[],
-            max_depth=max_depth
+            max_depth=max_depth,
+            deadline_ms=deadline_ms,
+            depth_source=depth_source,
+            started_at=started_at,
+            deadline=started_at + deadline_ms / 1000 if deadline_ms is not None else None
         ))
+
+    def _graph_version(self):
+        return getattr(self.db, "version", None)
+
+    def _cache_lookup(self, query: str, max_depth: Optional[int], trace: Optional[RetrievalTrace] = None) -> Optional[List[Any]]:
+        if self.query_cache is None:
+            return None
+        if trace is None:
+            return self.query_cache.lookup(query, max_depth, self._graph_version())
+        with trace.span("query_cache"):
+            cached = self.query_cache.lookup(query, max_depth, self._graph_version())
+            if cached is not None:
+                record_metric("cache_hits")
+        return cached
+
+    def _cache_store(self, query: str, max_depth: Optional[int], state: dict) -> None:
+        # A run cut short by its latency budget is not the full answer, so don't reuse it
+        if self.query_cache is None or state["budget_exhausted"]:
+            return
+        self.query_cache.store(query, max_depth, self._graph_version(), state["context_pieces"])
+
+    async def _resolve_depth(self, state: dict, max_depth: Optional[int], trace: Optional[RetrievalTrace] = None) -> None:
+        """Classify the query to pick its exploration depth when the caller didn't"""
+        if max_depth is not None:
+            return
+        if trace is None:
+            state["max_depth"], state["depth_source"] = await self.depth_classifier.classify(state["query"], state["deadline"])
+        else:
+            with trace.span("depth_classification"):
+                state["max_depth"], state["depth_source"] = await self.depth_classifier.classify(state["query"], state["deadline"])
+        logger.info(f"Picked max_depth={state['max_depth']} ({state['depth_source']}) for query: {state['query']}")
+
+    def _budget_report(self, state: dict) -> Dict[str, Any]:
+        """Summarize how much of the latency budget a finished run used"""
+        return {
+            "deadline_ms": state["deadline_ms"],
+            "elapsed_ms": round((time.monotonic() - state["started_at"]) * 1000),
+            "exhausted": state["budget_exhausted"],
+            "exploration_depth": state["exploration_depth"],
+            "max_depth": state["max_depth"],
+            "depth_source": state["depth_source"]
+        }
+
+    def _step_details(self, step: str, state: dict) -> dict:
+        """Summarize the state a workflow step produced, for the step stream"""
+        if step == NodeType.SIMILARITY_SEARCH.value:
+            return {
+                "step": step,
+                "query": state["query"],
+                "discovered_nodes": list(state["discovered_nodes"]),
+                "reasoning": state["reasoning"]
+            }
+        if step == NodeType.NODE_EXPLORATION.value:
+            return {
+                "step": step,
+                "unexplored": list(set(state["discovered_nodes"]) - set(state["explored_nodes"])),
+                "current_focus": state["current_focus"],
+                "explored_nodes": list(state["explored_nodes"]),
+                "reasoning": state["reasoning"]
+            }
+        if step == NodeType.RELATIONSHIP_EXPLORATION.value:
+            return {
+                "step": step,
+                "current_focus": state["current_focus"],
+                "explored_relationships": list(state["explored_relationships"])
+            }
+        if step == NodeType.DECISION_MAKER.value:
+            return {
+                "step": step,
+                "depth": f"{state['exploration_depth']}/{state['max_depth']}",
+                "should_continue": state["should_continue"],
+                "reasoning": state["reasoning"]
+            }
+        return {
+            "step": step,
+            "context_pieces": len(state["context_pieces"])
+        }
+
+    def _run_config(self, trace: Optional[RetrievalTrace] = None) -> dict:
+        """Per-request config so concurrent retrievals never share a checkpoint thread or prefetches"""
+        config = {"configurable": {"thread_id": f"context_retrieval-{uuid4().hex}"}}
+        if self.prefetch_limit > 0:
+            config["configurable"]["prefetcher"] = NodePrefetcher(self._load_node, self.prefetch_limit)
+        if trace is not None:
+            config["configurable"]["trace"] = trace
+        return config
+
+    def _release_thread(self, config: dict) -> None:
+        """Drop a finished request's checkpoints and any prefetched data it never used"""
+        prefetcher = config["configurable"].get("prefetcher")
+        if prefetcher is not None:
+            prefetcher.close()
+        delete_thread = getattr(self.checkpointer, "delete_thread", None)
+        if delete_thread:
+            delete_thread(config["configurable"]["thread_id"])
+
+    async def retrieve(
+        self,
+        query: str,
+        max_depth: Optional[int] = None,
+        deadline_ms: Optional[int] = None,
+        trace: Optional[RetrievalTrace] = None
+    ) -> Dict[str, Any]:
+        """
+        Run the agentic workflow and return the context pieces together with a
+        report of the latency budget. Without max_depth, the depth classifier
+        picks one from the query; depth 0 skips graph exploration. Once
+        deadline_ms runs out, exploration stops and whatever context was
+        gathered so far is synthesized. With a trace, every workflow step is
+        recorded as a span in it.
+        """
+        initial_state = self._initial_state(query, max_depth, deadline_ms)
+        cached = self._cache_lookup(query, max_depth, trace)
+        if cached is not None:
+            return self._result(cached, initial_state, trace, cached=True)
+        await self._resolve_depth(initial_state, max_depth, trace)
         
         # Run the workflow
-        config = {"configurable": {"thread_id": "context_retrieval"}}
-        result = await self.graph.ainvoke(initial_state, config)
+        config = self._run_config(trace)
+        try:
+            result = await self.graph.ainvoke(initial_state, config)
+        finally:
+            self._release_thread(config)
         
-        return result["context_pieces"]
+        self._cache_store(query, max_depth, result)
+        return self._result(result["context_pieces"], result, trace, cached=False)
 
-    async def retrieve_context_stream(self, query: str, max_depth: int = 3):
-        """Generator version: yields each step as a string (JSON) as it happens."""
-        initial_state = asdict(AgentState(
-            query=query,
-            discovered_nodes=set(),
-            explored_nodes=set(),
-            explored_relationships=set(),
-            context_pieces=[],
-            max_depth=max_depth
-        ))
-        
-        # Custom runner to yield steps as they happen
+    def _result(self, context: List[Any], state: dict, trace: Optional[RetrievalTrace], cached: bool) -> Dict[str, Any]:
+        result = {"context": context, "budget": self._budget_report(state), "cached": cached}
+        if trace is not None:
+            trace.finish()
+            result["trace"] = trace.summary()
+        return result
+
+    async def retrieve_context(self, query: str, max_depth: Optional[int] = None, deadline_ms: Optional[int] = None) -> List[str]:
+        """Main method to retrieve context using the agentic workflow"""
+        result = await self.retrieve(query, max_depth, deadline_ms)
+        return result["context"]
+
+    async def retrieve_context_stream(
+        self,
+        query: str,
+        max_depth: Optional[int] = None,
+        deadline_ms: Optional[int] = None,
+        trace: Optional[RetrievalTrace] = None
+    ):
+        """
+        Generator version: yields each step as a string (JSON) as it happens.
+        Drives the compiled graph, so the stream follows the same exploration
+        loop as retrieve_context and "started" is sent before a step runs.
+        """
+        initial_state = self._initial_state(query, max_depth, deadline_ms)
+        cached = self._cache_lookup(query, max_depth, trace)
+        if cached is not None:
+            yield json.dumps({"step": "final_context", **self._result(cached, initial_state, trace, cached=True)})
+            return
+        await self._resolve_depth(initial_state, max_depth, trace)
+        config = self._run_config(trace)
+        step_names = {node.value for node in NodeType}
         state = initial_state
+        # Steps run one at a time; track the run id of the active one so
+        # nested runnables that reuse a step name are ignored
+        active_run_id = None
         
-        # similarity_search
-        state = await self._similarity_search_node(state, step_callback=lambda x: None)
-        # Manually yield the events that would have been sent by step_callback
-        yield json.dumps({"step": "similarity_search", "status": "started"})
-        yield json.dumps({
-            "step": "similarity_search",
-            "query": state["query"],
-            "discovered_nodes": list(state["discovered_nodes"]),
-            "reasoning": state["reasoning"]
-        })
-        yield json.dumps({"step": "similarity_search", "status": "finished"})
-        
-        # node_exploration
-        state = await self._node_exploration_node(state, step_callback=lambda x: None)
-        yield json.dumps({"step": "node_exploration", "status": "started"})
-        yield json.dumps({
-            "step": "node_exploration",
-            "unexplored": list(state["discovered_nodes"] - state["explored_nodes"]),
-            "current_focus": state["current_focus"],
-            "explored_nodes": list(state["explored_nodes"]),
-            "reasoning": state["reasoning"]
-        })
-        yield json.dumps({"step": "node_exploration", "status": "finished"})
-        
-        # relationship_exploration
-        state = await self._relationship_exploration_node(state, step_callback=lambda x: None)
-        yield json.dumps({"step": "relationship_exploration", "status": "started"})
-        yield json.dumps({
-            "step": "relationship_exploration",
-            "current_focus": state["current_focus"],
-            "explored_relationships": list(state["explored_relationships"])
-        })
-        yield json.dumps({"step": "relationship_exploration", "status": "finished"})
-        
-        # decision_maker
-        state = await self._decision_maker_node(state, step_callback=lambda x: None)
-        yield json.dumps({"step": "decision_maker", "status": "started"})
-        yield json.dumps({
-            "step": "decision_maker",
-            "depth": f"{state['exploration_depth']}/{state['max_depth']}",
-            "should_continue": state["should_continue"],
-            "reasoning": state["reasoning"]
-        })
-        yield json.dumps({"step": "decision_maker", "status": "finished"})
-        
-        # context_synthesis
-        state = await self._context_synthesis_node(state, step_callback=lambda x: None)
-        yield json.dumps({"step": "context_synthesis", "status": "started"})
-        yield json.dumps({
-            "step": "context_synthesis",
-            "context_pieces": len(state["context_pieces"])
-        })
-        yield json.dumps({"step": "context_synthesis", "status": "finished"})
-        
+        try:
+            async for event in self.graph.astream_events(initial_state, config, version="v2"):
+                step = event.get("name")
+                if step not in step_names:
+                    continue
+                if event["event"] == "on_chain_start" and active_run_id is None:
+                    active_run_id = event["run_id"]
+                    yield json.dumps({"step": step, "status": "started"})
+                elif event["event"] == "on_chain_end" and event["run_id"] == active_run_id:
+                    active_run_id = None
+                    output = event["data"].get("output")
+                    if isinstance(output, dict):
+                        state = {**state, **output}
+                        yield json.dumps(self._step_details(step, state))
+                    yield json.dumps({"step": step, "status": "finished"})
+        finally:
+            self._release_thread(config)
+        
+        self._cache_store(query, max_depth, state)
         # Final context
-        yield json.dumps({"step": "final_context", "context": state["context_pieces"]})
+        yield json.dumps({"step": "final_context", **self._result(state["context_pieces"], state, trace, cached=False)})
+
+
+_agent: Optional[AgenticContextRetrieval] = None
+
+
+def get_agentic_context_retrieval(llm, db: Neo4jDatabase, vector_store, small_llm=None) -> AgenticContextRetrieval:
+    """
+    Return the process-wide agent, compiling its workflow only on first use
+    or when it is asked for with a different llm, db or vector store.
+    small_llm, if given when the agent is built, is the depth classifier's fallback model.
+    """
+    global _agent
+    if _agent is None or not (_agent.llm is llm and _agent.db is db and _agent.vector_store is vector_store):
+        embed_fn = getattr(vector_store, "embed_query", None)
+        _agent = AgenticContextRetrieval(
+            llm, db, vector_store,
+            query_cache=SemanticQueryCache(embed_fn) if embed_fn else None,
+            depth_classifier=QueryComplexityClassifier(embed_fn=embed_fn, llm=small_llm)
+        )
+    return _agent
 
 
 # Convenience function for backward compatibility
@@ -623,22 +821,25 @@ async def agentic_context_retrieval(
     llm,
     db: Neo4jDatabase,
     vector_store,
-    max_depth: int = 3
+    max_depth: Optional[int] = None,
+    deadline_ms: Optional[int] = None
 ) -> List[str]:
     """
     Agentic workflow to retrieve context from the graph database using LangGraph.
     Implements similarity search, node exploration, relationship traversal, and iterative context gathering.
     """
-    agent = AgenticContextRetrieval(llm, db, vector_store)
-    return await agent.retrieve_context(question, max_depth) 
+    agent = get_agentic_context_retrieval(llm, db, vector_store)
+    return await agent.retrieve_context(question, max_depth, deadline_ms)
 
 async def agentic_context_retrieval_stream(
     question: str,
     llm,
     db: Neo4jDatabase,
     vector_store,
-    max_depth: int = 3
+    max_depth: Optional[int] = None,
+    deadline_ms: Optional[int] = None,
+    trace: Optional[RetrievalTrace] = None
 ):
-    agent = AgenticContextRetrieval(llm, db, vector_store)
-    async for step in agent.retrieve_context_stream(question, max_depth):
+    agent = get_agentic_context_retrieval(llm, db, vector_store)
+    async for step in agent.retrieve_context_stream(question, max_depth, deadline_ms, trace):
         yield step 
\ No newline at end of file
@@ -0,0 +1,138 @@
+from bisect import bisect_right
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+
+def normalize_entity_name(name: str) -> str:
+    """Normalize an entity or node name for fuzzy matching"""
+    return name.lower().replace("dr. ", "").strip()
+
+
+class AhoCorasick:
+    """Multi-pattern matcher: finds every occurrence of every pattern in one pass over a text"""
+
+    def __init__(self, patterns: Iterable[str]) -> None:
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        for pattern_id, pattern in enumerate(patterns):
+            self._insert(pattern, pattern_id)
+        self._build_failure_links()
+
+    def _insert(self, pattern: str, pattern_id: int) -> None:
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = next_state
+        self._out[state].append(pattern_id)
+
+    def _build_failure_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int]]:
+        """Yield (end_index, pattern_id) for every pattern occurrence in text"""
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for pattern_id in self._out[state]:
+                yield i, pattern_id
+
+
+class EntityNameIndex:
+    """
+    Precomputed index over the entity catalog that resolves node names to the
+    entities whose normalized name contains, or is contained in, the node name.
+    """
+
+    # Separates names in the joined catalog text; never part of a normalized name
+    _SEPARATOR = "\x00"
+
+    def __init__(self, entities: List[dict]) -> None:
+        self.entities = entities
+        self.names = tuple(entity["name"] for entity in entities)
+        # Normalized name -> positions of the entities carrying it, in catalog order
+        self._entity_ids: Dict[str, List[int]] = {}
+        for i, name in enumerate(self.names):
+            name_norm = normalize_entity_name(name)
+            if name_norm:
+                self._entity_ids.setdefault(name_norm, []).append(i)
+        self._patterns = list(self._entity_ids)
+        self._automaton = AhoCorasick(self._patterns)
+        # All normalized names joined, to find node names inside entity names in one scan
+        self._catalog_text = self._SEPARATOR.join(self._patterns)
+        self._offsets = []
+        offset = 0
+        for pattern in self._patterns:
+            self._offsets.append(offset)
+            offset += len(pattern) + 1
+
+    def match(self, node_names: Iterable[str]) -> Dict[str, List[dict]]:
+        """Map each node name to its matching entities, in catalog order"""
+        node_norms = {}
+        for node in node_names:
+            node_norm = normalize_entity_name(node)
+            if node_norm and self._SEPARATOR not in node_norm:
+                node_norms[node] = node_norm
+        matched: Dict[str, set] = {node: set() for node in node_norms}
+
+        # Entity names contained in a node name
+        for node, node_norm in node_norms.items():
+            for _, pattern_id in self._automaton.iter_matches(node_norm):
+                matched[node].add(pattern_id)
+
+        # Node names contained in an entity name
+        norms = list(dict.fromkeys(node_norms.values()))
+        nodes_by_norm: Dict[str, List[str]] = {}
+        for node, node_norm in node_norms.items():
+            nodes_by_norm.setdefault(node_norm, []).append(node)
+        for end, norm_id in AhoCorasick(norms).iter_matches(self._catalog_text):
+            pattern_id = bisect_right(self._offsets, end) - 1
+            for node in nodes_by_norm[norms[norm_id]]:
+                matched[node].add(pattern_id)
+
+        return {
+            node: [
+                self.entities[i]
+                for i in sorted(i for pattern_id in pattern_ids for i in self._entity_ids[self._patterns[pattern_id]])
+            ]
+            for node, pattern_ids in matched.items()
+        }
+
+
+class EntityGazetteer:
+    """
+    Precompiled matcher over a fixed set of entity names that finds which of
+    them occur in a text (case-insensitive substring match) in one pass.
+    """
+
+    def __init__(self, entities: List[dict]) -> None:
+        self.entities = entities
+        self.names = tuple(entity["name"] for entity in entities)
+        self._patterns = list(dict.fromkeys(name.lower() for name in self.names if name))
+        self._automaton = AhoCorasick(self._patterns)
+
+    def find(self, text: str) -> Dict[str, int]:
+        """Map each lowercased name occurring in text to the start index of its first occurrence"""
+        first_starts: Dict[str, int] = {}
+        for end, pattern_id in self._automaton.iter_matches(text.lower()):
+            pattern = self._patterns[pattern_id]
+            if pattern not in first_starts:
+                first_starts[pattern] = end - len(pattern) + 1
+        return first_starts
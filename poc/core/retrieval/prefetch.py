@@ -0,0 +1,54 @@
+import asyncio
+import logging
+from typing import Any, Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class NodePrefetcher:
+    """
+    Speculatively loads graph data for nodes a retrieval may explore next.
+    Lookups run in worker threads (the Neo4j driver is synchronous), so they
+    overlap with LLM turns; whatever is still unused when the run ends is
+    dropped by close().
+    """
+
+    def __init__(self, fetch: Callable[[str], Any], limit: int = 3) -> None:
+        self._fetch = fetch
+        self.limit = limit
+        self._tasks: Dict[str, asyncio.Future] = {}
+
+    def prefetch(self, names: Iterable[str]) -> None:
+        """Start loading up to `limit` of the given nodes, in order, that aren't loaded yet"""
+        started = 0
+        for name in names:
+            if started >= self.limit:
+                break
+            if not name or name in self._tasks:
+                continue
+            task = asyncio.ensure_future(asyncio.to_thread(self._fetch, name))
+            task.add_done_callback(self._discard_result)
+            self._tasks[name] = task
+            started += 1
+
+    @staticmethod
+    def _discard_result(task: asyncio.Future) -> None:
+        # Retrieve the outcome so failed or cancelled prefetches are never reported as unhandled
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"Prefetch failed: {task.exception()}")
+
+    async def get(self, name: str) -> Optional[Any]:
+        """Return the prefetched data for a node, or None if it wasn't prefetched or the lookup failed"""
+        task = self._tasks.get(name)
+        if task is None:
+            return None
+        try:
+            return await task
+        except Exception:
+            return None
+
+    def close(self) -> None:
+        """Drop every pending prefetch; running lookups finish in their thread and are discarded"""
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
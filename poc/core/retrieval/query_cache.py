@@ -0,0 +1,81 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+
+class SemanticQueryCache:
+    """
+    Cache of full agentic retrieval results keyed by query embedding.
+    A lookup hits when a stored query with the same max_depth has cosine
+    similarity >= threshold and was answered from the current graph version.
+    """
+
+    def __init__(self, embed_fn: Callable[[str], np.ndarray], threshold: float = 0.95, max_entries: int = 256) -> None:
+        self.embed_fn = embed_fn
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._next_key = 0
+        self._graph_version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _embed(self, query: str) -> np.ndarray:
+        embedding = np.asarray(self.embed_fn(query), dtype=np.float32).ravel()
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm else embedding
+
+    def _sync_version(self, graph_version) -> None:
+        """Drop every entry computed against an older graph"""
+        if graph_version != self._graph_version:
+            self._entries.clear()
+            self._graph_version = graph_version
+
+    def lookup(self, query: str, max_depth: Optional[int], graph_version) -> Optional[List[Any]]:
+        """Return the cached context pieces for a near-duplicate query, or None"""
+        embedding = self._embed(query)
+        with self._lock:
+            self._sync_version(graph_version)
+            candidates = [(key, entry) for key, entry in self._entries.items() if entry["max_depth"] == max_depth]
+            if candidates:
+                scores = np.stack([entry["embedding"] for _, entry in candidates]) @ embedding
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    key, entry = candidates[best]
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return list(entry["context"])
+            self.misses += 1
+            return None
+
+    def store(self, query: str, max_depth: Optional[int], graph_version, context: List[Any]) -> None:
+        embedding = self._embed(query)
+        with self._lock:
+            self._sync_version(graph_version)
+            self._entries[self._next_key] = {
+                "query": query,
+                "embedding": embedding,
+                "max_depth": max_depth,
+                "context": list(context),
+            }
+            self._next_key += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "graph_version": self._graph_version,
+            "threshold": self.threshold,
+        }
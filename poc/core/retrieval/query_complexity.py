@@ -0,0 +1,131 @@
+import asyncio
+import re
+import time
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.messages import SystemMessage, HumanMessage
+
+from core.processing.prompts import QUERY_COMPLEXITY_SYSTEM_PROMPT
+from core.retrieval.tracing import record_metric
+
+# "what is X" style lookups that one entity description answers
+SIMPLE_QUERY_PATTERN = re.compile(
+    r"^\s*(what|who)\s*(is|are|was|were|'s)\b|^\s*(define|definition of|meaning of|tell me about)\b",
+    re.IGNORECASE,
+)
+
+# Phrases that mean the answer spans relationships between entities
+MULTI_HOP_CUES = (
+    "relationship", "related", "relate", "between", "affect", "interact", "cause", "lead to",
+    "compare", "difference", "why", "how does", "how do", "connected", "associated", "impact",
+    "mechanism", "pathway", "risk", "contraindicat", "side effect", "treat",
+)
+
+SIMPLE_EXAMPLES = [
+    "What is hypertension?",
+    "Who is Dr. Smith?",
+    "Define metformin",
+    "What is an MRI?",
+]
+
+COMPLEX_EXAMPLES = [
+    "How does diabetes affect kidney function and which drugs treat both?",
+    "What is the relationship between hypertension, stroke and diet?",
+    "Compare the side effects of lisinopril and losartan in elderly patients",
+    "Why does chronic inflammation increase cardiovascular risk?",
+]
+
+
+class QueryComplexityClassifier:
+    """
+    Picks an exploration depth for a query before retrieval starts.
+    Keyword heuristics settle clear cases; ambiguous queries go to the nearest
+    set of example queries by embedding, then to a small LLM, and otherwise
+    get default_depth.
+    """
+
+    def __init__(
+        self,
+        max_depth: int = 5,
+        default_depth: int = 3,
+        embed_fn: Optional[Callable[[str], np.ndarray]] = None,
+        llm=None,
+        embedding_margin: float = 0.05,
+    ) -> None:
+        self.max_depth = max_depth
+        self.default_depth = default_depth
+        self.embed_fn = embed_fn
+        self.llm = llm
+        self.embedding_margin = embedding_margin
+        self._centroids: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    def _keyword_depth(self, query: str) -> Optional[int]:
+        query_lower = query.lower()
+        words = query_lower.split()
+        cues = sum(cue in query_lower for cue in MULTI_HOP_CUES)
+        cues += query_lower.count(" and ") + (len(words) > 15)
+        if cues == 0 and len(words) <= 8 and SIMPLE_QUERY_PATTERN.search(query):
+            return 0
+        if cues >= 2:
+            return self.max_depth
+        return None
+
+    def _embed(self, text: str) -> np.ndarray:
+        embedding = np.asarray(self.embed_fn(text), dtype=np.float32).ravel()
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm else embedding
+
+    def _embedding_depth(self, query: str) -> Optional[int]:
+        if self.embed_fn is None:
+            return None
+        if self._centroids is None:
+            simple = np.mean([self._embed(q) for q in SIMPLE_EXAMPLES], axis=0)
+            complex_ = np.mean([self._embed(q) for q in COMPLEX_EXAMPLES], axis=0)
+            self._centroids = (simple / np.linalg.norm(simple), complex_ / np.linalg.norm(complex_))
+        embedding = self._embed(query)
+        simple_score = float(embedding @ self._centroids[0])
+        complex_score = float(embedding @ self._centroids[1])
+        if simple_score - complex_score > self.embedding_margin:
+            return 0
+        if complex_score - simple_score > self.embedding_margin:
+            return self.max_depth
+        return None
+
+    async def _model_depth(self, query: str, deadline: Optional[float] = None) -> Optional[int]:
+        if self.llm is None:
+            return None
+        messages = [
+            SystemMessage(content=QUERY_COMPLEXITY_SYSTEM_PROMPT),
+            HumanMessage(content=f"Query: {query}\nMaximum depth: {self.max_depth}")
+        ]
+        timeout = None
+        if deadline is not None:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                return None
+        try:
+            record_metric("llm_calls")
+            response = await asyncio.wait_for(self.llm.ainvoke(messages), timeout=timeout)
+            match = re.search(r"\d+", response.content)
+            return min(int(match.group()), self.max_depth) if match else None
+        except Exception:
+            return None
+
+    async def classify(self, query: str, deadline: Optional[float] = None) -> Tuple[int, str]:
+        """
+        Return (depth, source), where source names the stage that decided. The
+        model stage gives up at deadline, a time.monotonic() timestamp.
+        """
+        stages: List[Tuple[str, Callable[[str], Optional[int]]]] = [
+            ("keywords", self._keyword_depth),
+            ("embedding", self._embedding_depth),
+        ]
+        for source, stage in stages:
+            depth = stage(query)
+            if depth is not None:
+                return depth, source
+        depth = await self._model_depth(query, deadline)
+        if depth is not None:
+            return depth, "model"
+        return self.default_depth, "default"
@@ -0,0 +1,119 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+# Counters every span reports, so summaries have the same shape for every stage
+SPAN_COUNTERS = ("llm_calls", "llm_tokens", "neo4j_queries", "cache_hits")
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("retrieval_span", default=None)
+
+
+def _new_id(num_bytes: int) -> str:
+    return os.urandom(num_bytes).hex()
+
+
+@dataclass
+class Span:
+    """One timed stage of a retrieval, with counters for the work done inside it"""
+    name: str
+    trace_id: str
+    span_id: str
+    parent_span_id: Optional[str]
+    start_ns: int
+    end_ns: Optional[int] = None
+    counters: Dict[str, int] = field(default_factory=lambda: dict.fromkeys(SPAN_COUNTERS, 0))
+
+    @property
+    def duration_ms(self) -> float:
+        end_ns = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end_ns - self.start_ns) / 1e6
+
+
+def record_metric(counter: str, amount: int = 1) -> None:
+    """Add to a counter on the active span; a no-op when the retrieval isn't traced"""
+    span = _current_span.get()
+    if span is not None:
+        span.counters[counter] = span.counters.get(counter, 0) + amount
+
+
+class RetrievalTrace:
+    """Collects the spans of one agentic retrieval run"""
+
+    def __init__(self, name: str = "agentic_retrieval", service_name: str = "agentic-context-retrieval") -> None:
+        self.service_name = service_name
+        self.trace_id = _new_id(16)
+        # Root span covering the whole run; stage spans without an enclosing span hang off it
+        self.root = Span(name=name, trace_id=self.trace_id, span_id=_new_id(8), parent_span_id=None, start_ns=time.time_ns())
+        self.spans: List[Span] = [self.root]
+
+    def finish(self) -> None:
+        if self.root.end_ns is None:
+            self.root.end_ns = time.time_ns()
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[Span]:
+        """Time a stage; counters recorded while it is active are attributed to it"""
+        parent = _current_span.get()
+        if parent is None or parent.trace_id != self.trace_id:
+            parent = self.root
+        span = Span(
+            name=name,
+            trace_id=self.trace_id,
+            span_id=_new_id(8),
+            parent_span_id=parent.span_id,
+            start_ns=time.time_ns(),
+        )
+        self.spans.append(span)
+        token = _current_span.set(span)
+        try:
+            yield span
+        finally:
+            span.end_ns = time.time_ns()
+            _current_span.reset(token)
+
+    def summary(self) -> Dict[str, Any]:
+        """Wall time and counters per stage, summed over all runs of that stage"""
+        stages: Dict[str, Dict[str, Any]] = {}
+        for span in self.spans:
+            stage = stages.setdefault(span.name, {"runs": 0, "wall_ms": 0.0, **dict.fromkeys(SPAN_COUNTERS, 0)})
+            stage["runs"] += 1
+            stage["wall_ms"] += span.duration_ms
+            for counter, value in span.counters.items():
+                stage[counter] = stage.get(counter, 0) + value
+        for stage in stages.values():
+            stage["wall_ms"] = round(stage["wall_ms"], 2)
+        return {"trace_id": self.trace_id, "stages": stages}
+
+    def to_otel(self) -> Dict[str, Any]:
+        """Export the spans in the OpenTelemetry OTLP/JSON trace format"""
+        return {
+            "resourceSpans": [{
+                "resource": {
+                    "attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]
+                },
+                "scopeSpans": [{
+                    "scope": {"name": __name__},
+                    "spans": [self._otel_span(span) for span in self.spans]
+                }]
+            }]
+        }
+
+    def _otel_span(self, span: Span) -> Dict[str, Any]:
+        otel_span = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns if span.end_ns is not None else time.time_ns()),
+            "attributes": [
+                {"key": f"retrieval.{counter}", "value": {"intValue": str(value)}}
+                for counter, value in span.counters.items()
+            ]
+        }
+        if span.parent_span_id:
+            otel_span["parentSpanId"] = span.parent_span_id
+        return otel_span
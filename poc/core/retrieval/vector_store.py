@@ -2,7 +2,8 @@ import faiss
 from sentence_transformers import SentenceTransformer
 import numpy as np
 import os
-from typing import List, Dict, Optional
+import threading
+from typing import List, Dict, Optional, Tuple
 from core.db.graph_db import Neo4jDatabase
 import logging
 
@@ -14,6 +15,9 @@ class VectorStore:
         self.id_map = {}  # Maps FAISS index to Neo4j node ID
         self.rev_id_map = {}  # Maps Neo4j node ID to FAISS index
         self.next_idx = 0
+        # Held while the index or id maps change and while searching, so ingestion
+        # can write from a worker thread; encoding happens outside it
+        self._lock = threading.RLock()
         self._load_index()
 
     def _load_index(self):
@@ -32,54 +36,101 @@ class VectorStore:
             logging.warning(f"Skipping node '{node_id}' with empty or None text for embedding.")
             return
         embedding = self.model.encode([text])[0].astype(np.float32)
-        self.index.add(np.array([embedding]))
-        self.id_map[self.next_idx] = node_id
-        self.rev_id_map[node_id] = self.next_idx
-        self.next_idx += 1
-        self.save_index()
+        with self._lock:
+            self._add_embeddings([node_id], np.array([embedding]))
+            self.save_index()
+
+    def _add_embeddings(self, node_ids: List[str], embeddings: np.ndarray):
+        self.index.add(embeddings)
+        for node_id in node_ids:
+            self.id_map[self.next_idx] = node_id
+            self.rev_id_map[node_id] = self.next_idx
+            self.next_idx += 1
+
+    def add_nodes(self, nodes: List[Tuple[str, str]]):
+        """Add many (node_id, text) pairs with one batched encode and a single index write"""
+        nodes = [(node_id, text) for node_id, text in nodes if text]
+        if not nodes:
+            return
+        embeddings = self.model.encode([text for _, text in nodes]).astype(np.float32)
+        with self._lock:
+            self._add_embeddings([node_id for node_id, _ in nodes], embeddings)
+            self.save_index()
+
+    def upsert_nodes(self, nodes: List[Tuple[str, str]]):
+        """add_nodes, replacing the vectors of nodes that are already indexed instead of duplicating them"""
+        nodes = [(node_id, text) for node_id, text in nodes if text]
+        if not nodes:
+            return
+        embeddings = self.model.encode([text for _, text in nodes]).astype(np.float32)
+        node_ids = {node_id for node_id, _ in nodes}
+        with self._lock:
+            stale = [idx for idx, node_id in self.id_map.items() if node_id in node_ids]
+            if stale:
+                self.index.remove_ids(np.array(stale, dtype=np.int64))
+                # Removal shifts the remaining vectors down; renumber the maps to match
+                stale = set(stale)
+                kept = [self.id_map[idx] for idx in sorted(self.id_map) if idx not in stale]
+                self.id_map = dict(enumerate(kept))
+                self.rev_id_map = {node_id: idx for idx, node_id in self.id_map.items()}
+                self.next_idx = len(kept)
+            self._add_embeddings([node_id for node_id, _ in nodes], embeddings)
+            self.save_index()
 
     def update_node(self, node_id: str, text: str):
         # For simplicity, remove and re-add
-        self.delete_node(node_id)
-        self.add_node(node_id, text)
+        with self._lock:
+            self.delete_node(node_id)
+            self.add_node(node_id, text)
 
     def delete_node(self, node_id: str):
-        idx = self.rev_id_map.get(node_id)
-        if idx is not None:
-            mask = np.ones(self.index.ntotal, dtype=bool)
-            mask[idx] = False
-            self.index = faiss.IndexFlatL2(384)
-            # Re-add all except the deleted one
-            for i, nid in self.id_map.items():
-                if i != idx:
-                    # In a real system, you'd store the text or embedding for each node
-                    pass
-            # For now, just clear all
-            self.id_map = {}
-            self.rev_id_map = {}
-            self.next_idx = 0
-            self.save_index()
+        with self._lock:
+            idx = self.rev_id_map.get(node_id)
+            if idx is not None:
+                mask = np.ones(self.index.ntotal, dtype=bool)
+                mask[idx] = False
+                self.index = faiss.IndexFlatL2(384)
+                # Re-add all except the deleted one
+                for i, nid in self.id_map.items():
+                    if i != idx:
+                        # In a real system, you'd store the text or embedding for each node
+                        pass
+                # For now, just clear all
+                self.id_map = {}
+                self.rev_id_map = {}
+                self.next_idx = 0
+                self.save_index()
+
+    def embed_query(self, query: str) -> np.ndarray:
+        return self.model.encode([query])[0].astype(np.float32)
 
     def search(self, query: str, top_k: int = 5) -> List[str]:
-        embedding = self.model.encode([query])[0].astype(np.float32)
-        D, I = self.index.search(np.array([embedding]), top_k)
-        return [self.id_map.get(idx) for idx in I[0] if idx in self.id_map]
+        embedding = self.embed_query(query)
+        with self._lock:
+            D, I = self.index.search(np.array([embedding]), top_k)
+            return [self.id_map.get(idx) for idx in I[0] if idx in self.id_map]
 
     def sync_from_graph(self, db: Optional[Neo4jDatabase] = None):
         logging.info("Starting sync of vector store from graph database...")
         if db is None:
             db = Neo4jDatabase()
         entities = db.get_all_entities()
-        self.index = faiss.IndexFlatL2(384)
-        self.id_map = {}
-        self.rev_id_map = {}
-        self.next_idx = 0
+        nodes = []
         for ent in entities:
             node_id = ent.get('name')  # Use name as ID for now
             text = ent.get('description', ent.get('name'))
-            logging.info(f"Adding node to vector store: {node_id}")
-            self.add_node(node_id, text)
-        self.save_index()
+            if not text:
+                logging.warning(f"Skipping node '{node_id}' with empty or None text for embedding.")
+                continue
+            nodes.append((node_id, text))
+        logging.info(f"Adding {len(nodes)} nodes to vector store")
+        with self._lock:
+            self.index = faiss.IndexFlatL2(384)
+            self.id_map = {}
+            self.rev_id_map = {}
+            self.next_idx = 0
+            self.add_nodes(nodes)
+            self.save_index()
         logging.info("Finished syncing vector store from graph database.")
 
     def debug_print_nodes(self):
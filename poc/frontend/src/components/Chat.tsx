@@ -28,7 +28,8 @@ import {
   FiInfo,
   FiUpload,
 } from "react-icons/fi";
-import type { Message } from "../types";
+import type { Message, UploadJobResponse } from "../types";
+import { uploadJobProgress, waitForUploadJob } from "../uploadJob";
 import axios from "axios";
 import { CSSTransition, TransitionGroup } from "react-transition-group";
 import "./AgentStepFade.css"; // You will need to create this CSS for fade animations
@@ -208,7 +209,7 @@ export const Chat: React.FC<ChatProps> = ({
       setIsUploading(true);
       setUploadProgress(0);
 
-      const response = await axios.post(
+      const response = await axios.post<UploadJobResponse>(
         "http://localhost:8000/upload",
         formData,
         {
@@ -224,7 +225,12 @@ export const Chat: React.FC<ChatProps> = ({
         }
       );
 
-      const { entities, relationships, images } = response.data;
+      // The server processes the file in the background; follow its progress
+      setUploadProgress(0);
+      const { entities, relationships, images } = await waitForUploadJob(
+        response.data.job_id,
+        (job) => setUploadProgress(uploadJobProgress(job))
+      );
       let msg = `Upload successful! Processed ${entities} entities and ${relationships} relationships`;
       if (images !== undefined && images > 0) {
         msg += `, and ${images} images`;
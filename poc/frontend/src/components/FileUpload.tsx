@@ -9,7 +9,8 @@ import {
 } from "@chakra-ui/react";
 import { FiUpload } from "react-icons/fi";
 import axios from "axios";
-import type { UploadResponse } from "../types";
+import type { UploadJobResponse } from "../types";
+import { uploadJobProgress, waitForUploadJob } from "../uploadJob";
 
 interface FileUploadProps {
   onUploadSuccess: () => void;
@@ -33,7 +34,7 @@ export const FileUpload: React.FC<FileUploadProps> = ({ onUploadSuccess }) => {
       setIsUploading(true);
       setUploadProgress(0);
 
-      const response = await axios.post<UploadResponse>(
+      const response = await axios.post<UploadJobResponse>(
         "http://localhost:8000/upload",
         formData,
         {
@@ -49,7 +50,12 @@ export const FileUpload: React.FC<FileUploadProps> = ({ onUploadSuccess }) => {
         }
       );
 
-      const { entities, relationships, images } = response.data;
+      // The server processes the file in the background; follow its progress
+      setUploadProgress(0);
+      const { entities, relationships, images } = await waitForUploadJob(
+        response.data.job_id,
+        (job) => setUploadProgress(uploadJobProgress(job))
+      );
       let msg = `Upload successful! Processed ${entities} entities and ${relationships} relationships`;
       if (images !== undefined && images > 0) {
         msg += `, and ${images} images`;
@@ -11,9 +11,29 @@ export interface QueryResponse {
 }
 
 export interface UploadResponse {
-  message: string;
   entities: number;
   relationships: number;
+  images?: number;
+}
+
+export interface UploadJobResponse {
+  job_id: string;
+  status: string;
+  duplicate?: boolean;
+}
+
+export interface UploadJob {
+  id: string;
+  filename: string;
+  // "indexed": searchable with fast-tier entities; LLM enrichment still to come
+  status: "queued" | "running" | "indexed" | "enriching" | "completed" | "failed";
+  stage: string | null;
+  error: string | null;
+  result: UploadResponse | null;
+  searchable_at: number | null;
+  total_chunks: number;
+  indexed_chunks: number;
+  completed_chunks: number;
 }
 
 export interface ImageResult {
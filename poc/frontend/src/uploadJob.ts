@@ -0,0 +1,36 @@
+import type { UploadJob, UploadResponse } from "./types";
+
+// Follows an ingestion job's server-sent events until the document is searchable
+// (LLM enrichment then continues in the background) or the job fails
+export const waitForUploadJob = (
+  jobId: string,
+  onProgress: (job: UploadJob) => void
+): Promise<UploadResponse> =>
+  new Promise((resolve, reject) => {
+    const eventSource = new EventSource(
+      `http://localhost:8000/upload/jobs/${jobId}/events`
+    );
+
+    eventSource.onmessage = (event) => {
+      const job: UploadJob = JSON.parse(event.data);
+      onProgress(job);
+      if (job.searchable_at !== null && job.result) {
+        eventSource.close();
+        resolve(job.result);
+      } else if (job.status === "failed") {
+        eventSource.close();
+        reject(new Error(job.error || "Processing the upload failed"));
+      }
+    };
+
+    eventSource.onerror = () => {
+      eventSource.close();
+      reject(new Error("Lost connection while processing the upload"));
+    };
+  });
+
+// Percentage of the job's chunks that have been indexed
+export const uploadJobProgress = (job: UploadJob): number =>
+  job.total_chunks
+    ? Math.round((job.indexed_chunks * 100) / job.total_chunks)
+    : 0;
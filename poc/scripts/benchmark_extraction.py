@@ -0,0 +1,174 @@
+"""
+Offline cost/latency comparison of per-chunk and packed LLM extraction.
+
+Generates synthetic document chunks, runs TextProcessor.aprocess_texts once
+with one LLM request per chunk and once per packing budget, and answers every
+request with a fake chat model whose latency grows with prompt size. The
+report gives request counts, prompt tokens, estimated cost and wall time per
+mode, plus each packed mode's savings relative to per-chunk extraction.
+spaCy's en_core_web_sm model must be installed; no LLM or Neo4j is called.
+
+Usage (from the poc directory):
+    python -m scripts.benchmark_extraction --chunks 40 --chunk-chars 3000 \
+        --pack-budgets 4000 8000 16000 --concurrency 4 --output extraction.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+# core imports TextProcessor, which requires a key at import time; no LLM is called here
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+
+from core.processing.text_processor import TextProcessor, estimate_tokens
+from core.processing.prompts import PACKED_ENTITY_EXTRACTION_SYSTEM_PROMPT, PACKED_RELATIONSHIP_EXTRACTION_SYSTEM_PROMPT
+from scripts.benchmark_retrieval import git_commit
+
+TERMS = [
+    "hypertension", "diabetes", "metformin", "lisinopril", "kidney", "insulin resistance",
+    "stroke", "atrial fibrillation", "warfarin", "statin therapy", "cholesterol", "retinopathy",
+]
+PEOPLE = ["Dr. Alice Moreno", "Dr. Rahul Mehta", "Dr. Chen Wei", "Dr. Sara Lind"]
+PLACES = ["Boston", "Toronto", "Geneva", "Singapore"]
+
+
+class InMemoryGraph:
+    """Empty stand-in for Neo4jDatabase with the calls TextProcessor makes"""
+
+    def get_all_entities(self) -> List[dict]:
+        return []
+
+    def get_context(self, query_entities: List[str], max_hops: int = 2) -> List[str]:
+        return []
+
+
+class FakeResponse:
+    def __init__(self, content: str) -> None:
+        self.content = content
+
+
+class FakeChatModel:
+    """Answers extraction prompts with empty results after a latency that grows with prompt size"""
+
+    def __init__(self, base_latency_ms: float, ms_per_1k_tokens: float) -> None:
+        self.base_latency_ms = base_latency_ms
+        self.ms_per_1k_tokens = ms_per_1k_tokens
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self._lock = threading.Lock()
+
+    def invoke(self, messages) -> FakeResponse:
+        system, human = messages[0].content, messages[-1].content
+        tokens = estimate_tokens(system) + estimate_tokens(human)
+        if system in (PACKED_ENTITY_EXTRACTION_SYSTEM_PROMPT, PACKED_RELATIONSHIP_EXTRACTION_SYSTEM_PROMPT):
+            chunks = len(re.findall(r"^Chunk \d+:$", human, re.MULTILINE))
+            content = json.dumps({str(i): [] for i in range(1, chunks + 1)})
+        else:
+            content = "[]"
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += tokens
+            self.output_tokens += estimate_tokens(content)
+        # Like the real client's invoke, this blocks its (worker) thread
+        time.sleep((self.base_latency_ms + self.ms_per_1k_tokens * tokens / 1000) / 1000)
+        return FakeResponse(content)
+
+
+def build_chunks(num_chunks: int, chunk_chars: int, seed: int) -> List[str]:
+    """Synthetic clinical-notes style chunks mentioning people, places and medical terms"""
+    rng = random.Random(seed)
+    chunks = []
+    for _ in range(num_chunks):
+        sentences = []
+        while sum(len(sentence) + 1 for sentence in sentences) < chunk_chars:
+            a, b = rng.sample(TERMS, 2)
+            sentences.append(
+                f"{rng.choice(PEOPLE)} in {rng.choice(PLACES)} reported that {a} is associated with {b} "
+                f"in a cohort of {rng.randint(20, 900)} patients."
+            )
+        chunks.append(" ".join(sentences))
+    return chunks
+
+
+async def run_mode(processor: TextProcessor, chunks: List[str], pack_token_budget: int, concurrency: int, args) -> dict:
+    llm = FakeChatModel(args.base_latency_ms, args.ms_per_1k_tokens)
+    processor.llm = llm
+    processor.pack_token_budget = pack_token_budget
+    started = time.perf_counter()
+    # TextProcessor reports progress with print; keep stdout for the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        await processor.aprocess_texts(chunks, max_concurrency=concurrency)
+    wall_s = time.perf_counter() - started
+    cost = (llm.prompt_tokens * args.input_price_per_1k + llm.output_tokens * args.output_price_per_1k) / 1000
+    return {
+        "mode": f"packed_{pack_token_budget}" if pack_token_budget else "per_chunk",
+        "pack_token_budget": pack_token_budget,
+        "concurrency": concurrency,
+        "llm_requests": llm.requests,
+        "prompt_tokens": llm.prompt_tokens,
+        "output_tokens": llm.output_tokens,
+        "estimated_cost_usd": round(cost, 4),
+        "wall_s": round(wall_s, 2),
+    }
+
+
+def compare(baseline: dict, result: dict) -> Dict[str, Optional[float]]:
+    def ratio(key: str) -> Optional[float]:
+        return round(baseline[key] / result[key], 2) if result[key] else None
+    return {
+        "request_reduction": ratio("llm_requests"),
+        "prompt_token_reduction": ratio("prompt_tokens"),
+        "cost_reduction": ratio("estimated_cost_usd"),
+        "speedup": ratio("wall_s"),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Cost/latency comparison of per-chunk and packed LLM extraction")
+    parser.add_argument("--chunks", type=int, default=40)
+    parser.add_argument("--chunk-chars", type=int, default=3000)
+    parser.add_argument("--pack-budgets", type=int, nargs="+", default=[4000, 8000, 16000], help="estimated text tokens per request")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--max-iterations", type=int, default=3)
+    parser.add_argument("--base-latency-ms", type=float, default=400.0, help="fixed latency per LLM request")
+    parser.add_argument("--ms-per-1k-tokens", type=float, default=40.0, help="added latency per 1k prompt tokens")
+    parser.add_argument("--input-price-per-1k", type=float, default=0.000075)
+    parser.add_argument("--output-price-per-1k", type=float, default=0.0003)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    chunks = build_chunks(args.chunks, args.chunk_chars, args.seed)
+    processor = TextProcessor(max_iterations=args.max_iterations)
+    processor.db = InMemoryGraph()
+
+    baseline = await run_mode(processor, chunks, 0, args.concurrency, args)
+    results = [baseline]
+    for budget in args.pack_budgets:
+        result = await run_mode(processor, chunks, budget, args.concurrency, args)
+        result["vs_per_chunk"] = compare(baseline, result)
+        results.append(result)
+
+    report = {
+        "commit": git_commit(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
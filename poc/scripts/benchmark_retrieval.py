@@ -0,0 +1,263 @@
+"""
+Offline latency benchmark for the agentic retrieval path.
+
+Builds a synthetic in-memory graph, answers every LLM turn with a
+deterministic fake chat model of configurable latency, and runs
+retrieve_context at several depths and concurrency levels. Results are
+written as JSON so runs from different commits can be diffed.
+
+Usage (from the poc directory):
+    python -m scripts.benchmark_retrieval --nodes 2000 --degree powerlaw \
+        --depths 1 3 5 --concurrency 1 8 --llm-latency-ms 50 --output bench.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import subprocess
+import time
+from typing import Dict, List, Optional
+
+# core imports TextProcessor, which requires a key at import time; no LLM is called here
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+
+from core.retrieval.agentic_context_retrieval import AgenticContextRetrieval
+from core.retrieval.tracing import RetrievalTrace
+from core.processing.prompts import NODE_PRIORITIZATION_SYSTEM_PROMPT, RELATIONSHIP_FILTERING_SYSTEM_PROMPT, EXPLORATION_DECISION_SYSTEM_PROMPT
+
+ENTITY_TYPES = ["Disease", "Drug", "Symptom", "Person", "Organ", "Procedure"]
+RELATIONSHIP_TYPES = ["TREATS", "CAUSES", "AFFECTS", "STUDIES", "RELATED_TO", "PART_OF"]
+
+
+class InMemoryGraph:
+    """Stands in for Neo4jDatabase with the calls the retrieval agent makes"""
+
+    def __init__(self, entities: List[dict], relationships: List[dict], latency_ms: float = 0.0) -> None:
+        self.entities = entities
+        self.latency_ms = latency_ms
+        self.version = 0
+        self.round_trips = 0
+        self._relationships_by_node: Dict[str, List[dict]] = {}
+        for rel in relationships:
+            self._relationships_by_node.setdefault(rel["from"], []).append(rel)
+            if rel["to"] != rel["from"]:
+                self._relationships_by_node.setdefault(rel["to"], []).append(rel)
+        self.driver = self
+
+    def _round_trip(self) -> None:
+        self.round_trips += 1
+        if self.latency_ms:
+            # The Neo4j driver is synchronous, so block like it does
+            time.sleep(self.latency_ms / 1000)
+
+    def get_all_entities(self) -> List[dict]:
+        self._round_trip()
+        return [dict(entity) for entity in self.entities]
+
+    # driver.session() protocol used by _get_node_relationships
+    def session(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        return None
+
+    def run(self, query: str, node_name: str = None, **params) -> List[dict]:
+        self._round_trip()
+        return list(self._relationships_by_node.get(node_name, []))
+
+
+class FakeVectorStore:
+    """Deterministic stand-in for VectorStore: the same query always finds the same nodes"""
+
+    def __init__(self, node_names: List[str], seed: int) -> None:
+        self.node_names = node_names
+        self.seed = seed
+
+    def search(self, query: str, top_k: int = 5) -> List[str]:
+        rng = random.Random(f"{self.seed}:{query}")
+        return rng.sample(self.node_names, min(top_k, len(self.node_names)))
+
+
+class FakeResponse:
+    def __init__(self, content: str, prompt_chars: int) -> None:
+        self.content = content
+        # Rough 4-characters-per-token estimate, so token counters have realistic scale
+        self.usage_metadata = {"total_tokens": (prompt_chars + len(content)) // 4}
+
+
+class FakeChatModel:
+    """Deterministic chat model that answers the retrieval prompts after a fixed latency"""
+
+    def __init__(self, latency_ms: float = 0.0, continue_probability: float = 0.7, keep_relationships: float = 0.5, seed: int = 0) -> None:
+        self.latency_ms = latency_ms
+        self.continue_probability = continue_probability
+        self.keep_relationships = keep_relationships
+        self.seed = seed
+        self.calls = 0
+
+    def _respond(self, messages) -> FakeResponse:
+        self.calls += 1
+        system, human = messages[0].content, messages[-1].content
+        rng = random.Random(f"{self.seed}:{human}")
+        if system == NODE_PRIORITIZATION_SYSTEM_PROMPT:
+            nodes = human.split("Nodes: ", 1)[1].split(", ")
+            rng.shuffle(nodes)
+            content = ", ".join(nodes)
+        elif system == RELATIONSHIP_FILTERING_SYSTEM_PROMPT:
+            lines = human.split("Relationships:\n", 1)[1].split("\n")
+            content = "\n".join(line for line in lines if rng.random() < self.keep_relationships)
+        elif system == EXPLORATION_DECISION_SYSTEM_PROMPT:
+            content = "yes" if rng.random() < self.continue_probability else "no"
+        else:
+            content = ""
+        return FakeResponse(content, len(system) + len(human))
+
+    def invoke(self, messages) -> FakeResponse:
+        if self.latency_ms:
+            # Like the real client's invoke, this blocks the event loop
+            time.sleep(self.latency_ms / 1000)
+        return self._respond(messages)
+
+    async def ainvoke(self, messages) -> FakeResponse:
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        return self._respond(messages)
+
+
+def build_graph(num_nodes: int, avg_degree: float, distribution: str, seed: int) -> tuple[List[dict], List[dict]]:
+    """Synthetic entity catalog and relationships with a uniform or power-law degree distribution"""
+    rng = random.Random(seed)
+    names = [f"Entity {i:06d}" for i in range(num_nodes)]
+    entities = [{
+        "type": rng.choice(ENTITY_TYPES),
+        "name": name,
+        "description": f"{name} is a synthetic entity used for retrieval benchmarks.",
+        "base64": None,
+        "summary": None,
+    } for name in names]
+
+    num_edges = int(num_nodes * avg_degree / 2)
+    relationships = []
+    if distribution == "uniform":
+        for _ in range(num_edges):
+            a, b = rng.sample(names, 2)
+            relationships.append({"from": a, "type": rng.choice(RELATIONSHIP_TYPES), "to": b})
+    else:
+        # Preferential attachment: endpoints are picked in proportion to current degree
+        endpoints = names[:2]
+        edges_per_node = max(1, round(avg_degree / 2))
+        for name in names[2:]:
+            for target in {rng.choice(endpoints) for _ in range(edges_per_node)}:
+                relationships.append({"from": name, "type": rng.choice(RELATIONSHIP_TYPES), "to": target})
+                endpoints.extend((name, target))
+    return entities, relationships
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def run_level(agent: AgenticContextRetrieval, queries: List[str], max_depth: int, concurrency: int, deadline_ms: Optional[int]) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, traces = [], []
+
+    async def run_query(query: str) -> None:
+        async with semaphore:
+            trace = RetrievalTrace()
+            started = time.perf_counter()
+            await agent.retrieve(query, max_depth, deadline_ms, trace)
+            latencies.append((time.perf_counter() - started) * 1000)
+            traces.append(trace.summary()["stages"])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run_query(query) for query in queries))
+    wall_s = time.perf_counter() - started
+
+    totals: Dict[str, int] = {}
+    stage_ms: Dict[str, float] = {}
+    for stages in traces:
+        for stage, stats in stages.items():
+            stage_ms[stage] = stage_ms.get(stage, 0.0) + stats["wall_ms"]
+            for counter in ("llm_calls", "llm_tokens", "neo4j_queries", "prefetch_hits"):
+                totals[counter] = totals.get(counter, 0) + stats.get(counter, 0)
+    return {
+        "max_depth": max_depth,
+        "concurrency": concurrency,
+        "queries": len(queries),
+        "latency_ms": {
+            "p50": round(statistics.median(latencies), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "mean": round(statistics.fmean(latencies), 2),
+            "max": round(max(latencies), 2),
+        },
+        "throughput_qps": round(len(queries) / wall_s, 2),
+        "llm_calls_per_query": round(totals.get("llm_calls", 0) / len(queries), 2),
+        "llm_tokens_per_query": round(totals.get("llm_tokens", 0) / len(queries), 1),
+        "db_round_trips_per_query": round(totals.get("neo4j_queries", 0) / len(queries), 2),
+        "prefetch_hits_per_query": round(totals.get("prefetch_hits", 0) / len(queries), 2),
+        "stage_ms_per_query": {stage: round(ms / len(queries), 2) for stage, ms in stage_ms.items()},
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline latency benchmark for agentic context retrieval")
+    parser.add_argument("--nodes", type=int, default=1000)
+    parser.add_argument("--avg-degree", type=float, default=4.0)
+    parser.add_argument("--degree", choices=["uniform", "powerlaw"], default="powerlaw")
+    parser.add_argument("--depths", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--queries", type=int, default=32, help="queries per depth/concurrency level")
+    parser.add_argument("--llm-latency-ms", type=float, default=20.0)
+    parser.add_argument("--db-latency-ms", type=float, default=0.0)
+    parser.add_argument("--deadline-ms", type=int, default=None)
+    parser.add_argument("--prefetch-limit", type=int, default=3, help="0 disables speculative prefetching")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    entities, relationships = build_graph(args.nodes, args.avg_degree, args.degree, args.seed)
+    db = InMemoryGraph(entities, relationships, args.db_latency_ms)
+    vector_store = FakeVectorStore([entity["name"] for entity in entities], args.seed)
+    llm = FakeChatModel(args.llm_latency_ms, seed=args.seed)
+    agent = AgenticContextRetrieval(llm, db, vector_store, prefetch_limit=args.prefetch_limit)
+    queries = [f"What is known about {entities[i % len(entities)]['name']}?" for i in range(args.queries)]
+
+    results = []
+    for max_depth in args.depths:
+        for concurrency in args.concurrency:
+            results.append(await run_level(agent, queries, max_depth, concurrency, args.deadline_ms))
+
+    report = {
+        "commit": git_commit(),
+        "config": {
+            **{key: value for key, value in vars(args).items() if key != "output"},
+            "relationships": len(relationships),
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
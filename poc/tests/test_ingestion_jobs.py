@@ -0,0 +1,99 @@
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from core.processing.ingestion_jobs import (
+    IngestionJobStore, JOB_COMPLETED, JOB_ENRICHING, JOB_FAILED, JOB_INDEXED, JOB_QUEUED, JOB_RUNNING
+)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return IngestionJobStore(str(tmp_path / "jobs.db"))
+
+
+def expire_lease(store, job_id):
+    with sqlite3.connect(store.path) as conn:
+        conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time() - 3600, job_id))
+
+
+class TestClaims:
+
+    def test_claim_returns_the_attempt(self, store):
+        job_id = store.create_job("notes.txt", "txt", b"Alice treats hypertension.")
+
+        assert store.claim_next() == (job_id, 1)
+        assert store.claim_next() is None
+
+    def test_live_job_is_not_requeued(self, store):
+        job_id = store.create_job("notes.txt", "txt", b"Alice treats hypertension.")
+        store.claim_next()
+
+        assert store.requeue_interrupted() == 0
+        assert store.get_job(job_id)["status"] == JOB_RUNNING
+
+    def test_stale_worker_cannot_complete_a_requeued_job(self, store):
+        job_id = store.create_job("notes.txt", "txt", b"Alice treats hypertension.")
+        _, stale_attempt = store.claim_next()
+        expire_lease(store, job_id)
+        assert store.requeue_interrupted() == 1
+
+        assert store.complete_job(job_id, stale_attempt, {"entities": 1}) is False
+        assert store.get_job(job_id)["status"] == JOB_QUEUED
+
+        # Nor once another worker has claimed it again
+        _, attempt = store.claim_next()
+        assert store.complete_job(job_id, stale_attempt, {"entities": 1}) is False
+        assert store.fail_job(job_id, stale_attempt, "lease lost") is False
+        assert store.get_job(job_id)["status"] == JOB_RUNNING
+
+        assert store.complete_job(job_id, attempt, {"entities": 2}) is True
+        job = store.get_job(job_id)
+        assert job["status"] == JOB_INDEXED
+        assert job["result"] == {"entities": 2}
+
+    def test_stale_enrichment_does_not_complete_a_failed_job(self, store):
+        job_id = store.create_job("notes.txt", "txt", b"Alice treats hypertension.")
+        _, attempt = store.claim_next()
+        store.complete_job(job_id, attempt, {"entities": 1})
+        _, enrich_attempt = store.claim_next()
+        assert store.get_job(job_id)["status"] == JOB_ENRICHING
+        expire_lease(store, job_id)
+        store.requeue_interrupted()
+        _, retry_attempt = store.claim_next()
+        store.fail_job(job_id, retry_attempt, "LLM unavailable")
+
+        assert store.complete_job(job_id, enrich_attempt, {"entities": 3}) is False
+        assert store.get_job(job_id)["status"] == JOB_FAILED
+
+        assert store.retry_job(job_id) is True
+        _, attempt = store.claim_next()
+        assert store.complete_job(job_id, attempt, {"entities": 3}) is True
+        assert store.get_job(job_id)["status"] == JOB_COMPLETED
+
+
+class TestDocumentRegistry:
+
+    def test_concurrent_identical_uploads_create_one_job(self, store):
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(
+                lambda _: store.create_document_job("clinic", "hash-1", "notes.txt", "txt", b"x"), range(8)
+            ))
+
+        assert sum(created for _, created in results) == 1
+        assert len({job_id for job_id, _ in results}) == 1
+        with sqlite3.connect(store.path) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0] == 1
+
+    def test_failed_upload_is_replaced(self, store):
+        failed_id, _ = store.create_document_job("clinic", "hash-1", "notes.txt", "txt", b"x")
+        _, attempt = store.claim_next()
+        store.fail_job(failed_id, attempt, "boom")
+
+        job_id, created = store.create_document_job("clinic", "hash-1", "notes.txt", "txt", b"x")
+
+        assert created and job_id != failed_id
+        assert store.create_document_job("clinic", "hash-1", "notes.txt", "txt", b"x") == (job_id, False)
+        assert store.create_document_job("other", "hash-1", "notes.txt", "txt", b"x")[1] is True